@@ -1,94 +1,312 @@
-import json
-import time
-import itertools
 from arduinomanager.ArduinosManager import ArduinosManager
+from cluster.ClusterCoordinator import ClusterCoordinator
+from control.ControlServer import ControlServer
 from media.MediaManager import MediaManager
 from events.events import Event, SensorEvent
+from events.scenario import load_scenario
 import events.actions
-from events.actions import Action
+from events.actions import Action, ArduinoAction, SoundAction, LedAction, LedAnimationAction
+from leds.FrameBuffer import parse_color
+from leds.LedManager import LedManager
+from runtime.runtime import set_runtime
+from runtime.ThreadRuntime import ThreadRuntime
+from runtime.AsyncRuntime import AsyncRuntime
+from runtime.FileWatcher import FileWatcher
+from runtime.logs import get_logger
+from runtime.tracing import tracer
 from sensors.sensors import *
+from sensors.filters import build_filters
+from sensors.history import HistoryStore
+# pylint: disable=no-name-in-module
+from parameters import RUNTIME, SERIAL_READER, HOTPLUG_INTERVAL, SCENARIO_CACHE, HOT_RELOAD, \
+    TRACING, TRACE_FILE, TRACE_INTERVAL, MEDIA_BACKEND, RECORD_FILE, REPLAY_FILE, REPLAY_SPEED, \
+    LEDS_FILE, LEDS_ARDUINO, CLUSTER_ROLE, CLUSTER_ADDRESS, CONTROL_ADDRESS, HISTORY_SIZE, HISTORY_DIRECTORY, \
+    HISTORY_INTERVAL, HISTORY_SEGMENT_SIZE, HISTORY_SEGMENTS
 
 __all__ = ['Sketch']
 
+logger = get_logger("sketch")
+
 
 class Sketch:
     """docstring for Sketch."""
 
-    def __init__(self, json_file=None):
+    def __init__(self, json_file=None, runtime=RUNTIME, media_backend=MEDIA_BACKEND, record=RECORD_FILE,
+                 replay=REPLAY_FILE, replay_speed=REPLAY_SPEED,
+                 coordinator=CLUSTER_ADDRESS if CLUSTER_ROLE == "coordinator" else None, control=CONTROL_ADDRESS):
         self.actions = {}
         self.events = {}
         self.sensors = {}
-        self.arduinos_manager = ArduinosManager()
+        self.graph = None
+        self.json_file = json_file
+        self._watcher = None
+        # Routing table from sensor names to their data_received method
+        self._sensor_routes = {}
+        # With the "asyncio" runtime, serial I/O, event delays and fades all run on one event loop
+        if runtime == "asyncio":
+            self.runtime = AsyncRuntime()
+            self.runtime.start()
+            reader = self.runtime.serial_reader
+        else:
+            self.runtime = ThreadRuntime()
+            reader = SERIAL_READER
+        set_runtime(self.runtime)
+        # Latency measurements from the serial data to the outputs
+        tracer.enabled = TRACING
+        if TRACING and TRACE_FILE:
+            tracer.start_dumping(TRACE_FILE, TRACE_INTERVAL)
+        self.arduinos_manager = ArduinosManager(reader=reader)
         self.arduinos_manager.set_callback(self.data_received)
-        self.mediamanager = MediaManager()
+        self.arduinos_manager.set_sensor_callback(self.sensor_data_received)
+        self.mediamanager = MediaManager(media_backend)
+        # Coordinator of a cluster, listening on `coordinator` for the nodes owning other Arduinos and channels
+        self.cluster = None
+        if coordinator:
+            self.cluster = ClusterCoordinator(self.arduinos_manager, coordinator)
+            self.cluster.start()
+        # Last values of the sensors, written to HISTORY_DIRECTORY if set
+        self.history = None
+        if HISTORY_SIZE:
+            self.history = HistoryStore(HISTORY_SIZE, HISTORY_DIRECTORY, HISTORY_INTERVAL, HISTORY_SEGMENT_SIZE,
+                                        HISTORY_SEGMENTS)
+            self.history.start()
+        # LEDs of the map, driven by one Arduino
+        self.leds = LedManager(LEDS_FILE, self.arduinos_manager, LEDS_ARDUINO) if LEDS_FILE else None
         if json_file:
             self.load_from_json(json_file)
+            if HOT_RELOAD:
+                self.start_watching()
 
         events.actions.sketch = self
+        # HTTP and WebSocket server showing the state of the sketch
+        self.control = None
+        if control:
+            self.control = ControlServer(self, control)
+            self.control.start()
+        if record:
+            self.arduinos_manager.start_recording(record)
+        # Replay recorded data instead of connecting to the Arduinos
+        self.replay_player = None
+        if replay:
+            self.replay_player = self.arduinos_manager.replay(replay, replay_speed)
+            return
         self.arduinos_manager.autodiscover()
-        time.sleep(2)
+        if HOTPLUG_INTERVAL:
+            self.arduinos_manager.start_supervisor(HOTPLUG_INTERVAL)
+
+    @property
+    def arduinos_targets(self):
+        """Identities of all the Arduinos targeted by the actions of the sketch"""
+        targets = set()
+        for action in self.actions.values():
+            if isinstance(action, ArduinoAction) and action.arduino_target is not None:
+                targets.update([action.arduino_target] if isinstance(action.arduino_target, str) else action.arduino_target)
+            elif isinstance(action, LedAction) and self.leds is not None:
+                targets.add(self.leds.arduino)
+        return targets
+
+    def wait_for_arduinos(self, timeout=None, verbose=True):
+        """
+        Wait until all the Arduinos targeted by the sketch (or all the Arduinos found if the sketch targets none)
+        have identified themselves, or `timeout` seconds have passed. Blocking.
+        Return True if all of them were identified, False otherwise
+        """
+        identified = self.arduinos_manager.wait_for_identities(self.arduinos_targets or None, timeout)
+        if verbose:
+            self.arduinos_manager.report_timings()
+            missing = self.arduinos_targets - set(self.arduinos_manager.arduinos_by_identity)
+            if missing:
+                logger.warning("Arduinos not identified: %s", ", ".join(sorted(missing)), extra={"missing": sorted(missing)})
+        return identified
 
     @property
     def sensor_events(self):
         return {name: event for name, event in self.events.items() if isinstance(event, SensorEvent)}
 
     def load_from_json(self, json_file):
-        sketck_json = json.load(open(json_file))
+        self.apply_graph(load_scenario(json_file, SCENARIO_CACHE))
+
+    def reload(self, json_file=None, verbose=True):
+        """
+        Load the sketch again and apply the changes, keeping the Arduinos connections, the media channels,
+        and the pending and listening events. The current sketch is kept if the new one is invalid.
+        """
+        json_file = json_file or self.json_file
+        try:
+            graph = load_scenario(json_file, SCENARIO_CACHE)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.error("Sketch %s not reloaded: %s", json_file, error, extra={"sketch": json_file})
+            return False
+        return self._apply_reloaded(json_file, graph, verbose)
+
+    def _apply_reloaded(self, json_file, graph, verbose=True):
+        try:
+            self.apply_graph(graph)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            # KeyError and TypeError: an action missing an option, or a value of the wrong type
+            logger.error("Sketch %s not reloaded: %s", json_file, error, extra={"sketch": json_file})
+            return False
+        if verbose:
+            logger.info("Sketch %s reloaded", json_file, extra={"sketch": json_file})
+        return True
+
+    def start_watching(self, json_file=None):
+        """
+        Reload the sketch every time its file is modified. Non blocking.
+        """
+        json_file = json_file or self.json_file
+        self._watcher = FileWatcher(json_file, lambda: self._load_modified(json_file))
+        self._watcher.start()
+
+    def _load_modified(self, json_file):
+        """
+        Read and compile the modified sketch and parse its sounds from the thread of the watcher, then apply it
+        from the runtime: reading files there would delay the events due meanwhile
+        """
+        try:
+            graph = load_scenario(json_file, SCENARIO_CACHE)
+            # apply_graph then finds them parsed
+            self.mediamanager.preload({
+                action['options']['filename'] for action in graph.actions
+                if action['type'] == 'sound_action' and action['action'] == 'play_sound'
+                and 'filename' in action.get('options', {})
+            })
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.error("Sketch %s not reloaded: %s", json_file, error, extra={"sketch": json_file})
+            return
+        self.runtime.call_soon(self._apply_reloaded, json_file, graph)
+
+    def stop_watching(self):
+        if self._watcher:
+            self._watcher.stop()
+            self._watcher = None
+
+    def apply_graph(self, graph):
+        """
+        Build the sensors, channels, actions and events of a compiled sketch. Objects whose definition
+        did not change since the previous graph are kept. Nothing is changed if building an object fails.
+        """
+        old_graph = self.graph
+        old_sensors = {sensor['name']: sensor for sensor in old_graph.sensors} if old_graph else {}
+        old_channels = {channel['name']: channel for channel in old_graph.media_channels} if old_graph else {}
+        old_actions = {action['id']: action for action in old_graph.actions} if old_graph else {}
+        old_events = {event['id']: event for event in old_graph.events} if old_graph else {}
 
         # Load sensors
-        for sensor in sketck_json['sensors']:
-            if sensor['type'] == "distance":
-                self.sensors[sensor['name']] = DistanceSensor(sensor['name'])
-            elif sensor['type'] == "movement":
-                self.sensors[sensor['name']] = MovementSensor(sensor['name'])
-            elif sensor['type'] == "color":
-                self.sensors[sensor['name']] = ColorSensor(sensor['name'])
+        sensors = {}
+        for sensor in graph.sensors:
+            if old_sensors.get(sensor['name']) == sensor:
+                sensors[sensor['name']] = self.sensors[sensor['name']]
+            else:
+                sensor_class = SENSOR_CLASSES[sensor['type']]
+                filters = build_filters(sensor.get('filters', ()), len(sensor_class.variables))
+                sensors[sensor['name']] = sensor_class(sensor['name'], filters)
+
+        # Load actions
+        actions = [
+            self.actions[action['id']] if old_actions.get(action['id']) == action else Action.from_json(action)
+            for action in graph.actions
+        ]
+
+        # Check the LEDs targeted now, rather than when the actions are fired
+        for action in actions:
+            if isinstance(action, LedAction):
+                if self.leds is None:
+                    raise ValueError(f"Action {action.id} uses the LEDs, but no LEDS_FILE is set")
+                if isinstance(action, LedAnimationAction):
+                    self.leds.make_animation(action.action, **action.parameters)
+                    continue
+                self.leds.positions(**action.target)
+                if 'color' in action.parameters:
+                    parse_color(action.parameters['color'])
+
+        for sound_channel in graph.media_channels:
+            if sound_channel.get('node') and self.cluster is None:
+                raise ValueError(f"Channel {sound_channel['name']} is played by node {sound_channel['node']}, "
+                                 f"but this Pi is not the coordinator of a cluster")
+
+        # The channels removed must not be used by the sound actions left
+        channel_names = {sound_channel['name'] for sound_channel in graph.media_channels}
+        for action in actions:
+            if isinstance(action, SoundAction) and 'channel' in action.parameters \
+                    and action.parameters['channel'] not in channel_names:
+                raise ValueError(f"Action {action.id} uses unknown channel {action.parameters['channel']!r}")
+
+        # Parse the sounds now, so that playing them does not wait for it
+        self.mediamanager.preload({
+            action.parameters['filename'] for action in actions
+            if isinstance(action, SoundAction) and action.action == 'play_sound'
+        })
+
+        # Load events and sensors events
+        events = []
+        for index, event in enumerate(graph.events):
+            kept = old_events.get(event['id']) == event
+            if index < graph.nbr_plain_events:
+                events.append(self.events[event['id']] if kept else Event(event))
+            elif kept and sensors[event['sensor']] is self.sensors.get(event['sensor']):
+                events.append(self.events[event['id']])
+            else:
+                events.append(SensorEvent(event, sensors[event['sensor']], event['condition']))
+        events_by_id = {event.id: event for event in events}
 
         # Load sound channels
-        for sound_channel in sketck_json['media_channels']:
-            self.mediamanager.add_channel(sound_channel['name'])
+        for sound_channel in graph.media_channels:
+            if old_channels.get(sound_channel['name']) == sound_channel:
+                continue
+            old_channel = old_channels.get(sound_channel['name'])
+            if old_channel is not None and old_channel.get('node') == sound_channel.get('node'):
+                self.mediamanager[sound_channel['name']].reset_playlist()
+            else:
+                if old_channel is not None:
+                    self.mediamanager.remove_channel(sound_channel['name'])
+                node = sound_channel.get('node')
+                self.mediamanager.add_channel(sound_channel['name'], self.cluster.backend(node) if node else None)
             for sound_filename in sound_channel['content']:
                 self.mediamanager[sound_channel['name']].add_media(sound_filename)
+        for name in old_channels.keys() - {sound_channel['name'] for sound_channel in graph.media_channels}:
+            self.mediamanager.remove_channel(name)
 
-        # Load actions
-        for action in sketck_json['actions']:
-            self.actions[action['id']] = Action.from_json(action)
-
-        # Load events
-        for event in sketck_json['events']:
-            self.events[event['id']] = Event(event)
-
-        # Load sensors events
-        for sensor_event in sketck_json['sensor_events']:
-            self.events[sensor_event['id']] = SensorEvent(sensor_event, self.sensors[sensor_event['sensor']])
-            self.events[sensor_event['id']].set_condition(sensor_event['condition'])
-
-        # Binding actions to events and events to each other
-        for event in itertools.chain(sketck_json['events'], sketck_json['sensor_events']):
-            if 'start_actions' in event:
-                for action_id in event['start_actions']:
-                    self.events[event['id']].add_action(self.actions[action_id])
-            if 'stop_actions' in event:
-                for action_id in event['stop_actions']:
-                    self.events[event['id']].stop_action(self.actions[action_id])
-            if 'events' in event:
-                for child_event in event['events']:
-                    self.events[event['id']].add_event(self.events[child_event])
-            if 'start_listening' in event:
-                for sensor_event in event['start_listening']:
-                    self.events[event['id']].start_listening_events.append(self.events[sensor_event])
-            if 'stop_listening' in event:
-                for sensor_event in event['stop_listening']:
-                    self.events[event['id']].stop_listening_events.append(self.events[sensor_event])
-
-        # Binding each event to the next one
-        for event in itertools.chain(sketck_json['events'], sketck_json['sensor_events']):
-            if event['next']:
-                self.events[event['id']].next = self.events[event['next']]
+        # Sensor events currently listening, and pending next events
+        listening = [event.id for event in self.sensor_events.values() if event in event.sensor.listeners]
+        pending = [(event.id, event.cancel()) for event in self.events.values() if event.is_pending]
+        for event in self.sensor_events.values():
+            event.stop_listening()
 
-        # Setting first event
-        self.first_event = sketck_json['first_event']
+        # Binding actions to events, events to each other and each event to the next one
+        for index, event in enumerate(events):
+            event.start_actions = [actions[action] for action in graph.start_actions[index]]
+            event.stop_actions = [actions[action] for action in graph.stop_actions[index]]
+            event.events = [events[child] for child in graph.children[index]]
+            event.start_listening_events = [events[sensor_event] for sensor_event in graph.start_listening[index]]
+            event.stop_listening_events = [events[sensor_event] for sensor_event in graph.stop_listening[index]]
+            event.next = events[graph.next[index]] if graph.next[index] >= 0 else None
+
+        self.graph = graph
+        self.sensors = sensors
+        if self.history is not None:
+            for sensor in sensors.values():
+                if sensor.history is None:
+                    self.history.attach(sensor)
+        self._sensor_routes = {name: sensor.data_received for name, sensor in self.sensors.items()}
+        # Animations of the actions removed or changed would otherwise run forever
+        for action in set(self.actions.values()) - set(actions):
+            if isinstance(action, LedAnimationAction):
+                action.stop()
+        self.actions = {action.id: action for action in actions}
+        self.events = events_by_id
+
+        # Restoring listening and pending events on the new events
+        for event_id in listening:
+            if event_id in events_by_id:
+                events_by_id[event_id].start_listening()
+        for event_id, remaining in pending:
+            if event_id in events_by_id:
+                for delay in remaining:
+                    events_by_id[event_id].schedule_next(delay)
 
+        # Setting first event
+        self.first_event = events[graph.first_event].id
 
     def data_received(self, data):
         data_parsed = data.split(" ")
@@ -96,16 +314,34 @@ class Sketch:
             self.sensor_data_received(data_parsed[1], data_parsed[2:])
 
     def sensor_data_received(self, sensor, data):
-        self.sensors[sensor].data_received(data)
+        route = self._sensor_routes.get(sensor)
+        if route is not None:
+            tracer.mark("sensor_dispatch", sensor)
+            route(data)
 
-    def send(self, *args, arduino=None):
+    def send(self, *args, arduino=None, key=None):
         if arduino is None:
-            self.arduinos_manager.broadcast(*args)
+            self.arduinos_manager.broadcast(*args, key=key)
         else:
-            self.arduinos_manager.send_command(arduino, *args)
+            self.arduinos_manager.send_command(arduino, *args, key=key)
 
     def fire_event(self, event_id):
         self.events[event_id].fire()
 
+    def reset(self):
+        """
+        Cancel all pending events, stop listening to the sensors and stop the LED animations
+        """
+        for event in self.events.values():
+            event.cancel()
+        for event in self.sensor_events.values():
+            event.stop_listening()
+        if self.leds is not None:
+            self.leds.animator.stop_all()
+
     def run(self):
-        self.fire_event(self.first_event)
+        if isinstance(self.runtime, AsyncRuntime):
+            self.runtime.call_soon(self.fire_event, self.first_event)
+            self.runtime.wait()
+        else:
+            self.fire_event(self.first_event)
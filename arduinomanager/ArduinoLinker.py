@@ -5,31 +5,69 @@ Python class for communication with an Arduino via Serial
 import threading
 import time
 import serial
+from arduinomanager import BinaryProtocol
+from arduinomanager.CommandWriter import CommandWriter
+from runtime.logs import get_logger
+from runtime.tracing import tracer
 # pylint: disable=no-name-in-module
-from parameters import BAUDRATE
+from parameters import BAUDRATE, SERIAL_PROTOCOL, WRITE_WINDOW
 
-__all__ = ['ArduinoLinker']
+__all__ = ['ArduinoLinker', 'params_key']
+
+logger = get_logger("arduinos")
+
+
+def params_key(args, key=None):
+    """
+    Key of the command `args` superseding the previous commands with the same key: `key` if given, the command
+    name for the "*_params" commands, None for the other commands
+    """
+    if key is not None:
+        return key
+    return args[0] if args and str(args[0]).endswith("_params") else None
 
 
 class ArduinoLinker():
     """Python class for communication with an Arduino via Serial"""
 
-    def __init__(self, port, baudrate=BAUDRATE, name=None, auto_identification=False, autostart_listening=False):
-        self._serial = serial.Serial(port, baudrate)
+    def __init__(self, port, baudrate=BAUDRATE, name=None, auto_identification=False, autostart_listening=False,
+                 protocol=SERIAL_PROTOCOL, write_window=WRITE_WINDOW):
+        self._serial = self._open_serial(port, baudrate)
         self.name = name
         self.listening = False
         self.lock = threading.RLock()
+        # "binary" to use binary frames if the Arduino supports them, "text" to always use text lines
+        self.protocol = protocol
+        # True once the Arduino has been switched to binary frames
+        self.binary = False
+        # Sensor names, indexed by the ids used in binary frames
+        self.sensor_ids = []
+        # Commands are queued and sent in batches by a thread of the Arduino, unless the window is 0
+        self.writer = CommandWriter(self._write, write_window, name=name, on_error=self._write_failed) \
+            if write_window else None
+        # StreamRecorder the lines received are written to, if any
+        self.recorder = None
 
         self._identity = None
         self._identification_callback = None
         self._data_received_callback = None
+        self._sensor_data_callback = None
+        self._connection_lost_callback = None
         self._listening_thread = None
+        self._reader = None
+        self._buffer = bytearray()
 
         if auto_identification:
             self.ask_identification()
         if autostart_listening:
             self.start_listening()
 
+    def _open_serial(self, port, baudrate):
+        """
+        Open the serial connection
+        """
+        return serial.Serial(port, baudrate)
+
     @property
     def port(self):
         """Port used for the serial connection"""
@@ -56,6 +94,8 @@ class ArduinoLinker():
         """
         Close the serial connection
         """
+        if self.writer is not None:
+            self.writer.close()
         return self._serial.close()
 
     def is_open(self):
@@ -64,18 +104,46 @@ class ArduinoLinker():
         """
         return self._serial.is_open()
 
+    def fileno(self):
+        """
+        File descriptor of the serial connection, used to watch it with a selector
+        """
+        return self._serial.fileno()
+
+    def _write(self, data):
+        with self.lock:
+            return self._serial.write(data)
+
     def send_string(self, command):
         """
         Send a string and a newline character thru the serial connection
         """
-        with self.lock:
-            return self._serial.write((command + "\n").encode())
+        written = self._write((command + "\n").encode())
+        tracer.mark("serial_write", self.name)
+        return written
+
+    def send_bytes(self, data):
+        """
+        Write raw bytes (such as binary frames) thru the serial connection, in a single write.
+        With a writer, they are queued after the commands sent before, so they are never interleaved with them.
+        """
+        if self.writer is not None:
+            return self.writer.put_bytes(data)
+        written = self._write(data)
+        tracer.mark("serial_write", self.name)
+        return written
 
-    def send_command(self, *args):
+    def send_command(self, *args, key=None):
         """
-        Send a command along with its arguments thru the serial connection
+        Send a command along with its arguments thru the serial connection.
+        With a writer, the command is queued and sent with the other commands of the same batch, replacing
+        the command with the same `key` still queued. Without a key, a "*_params" command replaces the
+        previous one of the same name.
         """
-        return self.send_string(("{} "*len(args)).format(*args).rstrip())
+        command = ("{} "*len(args)).format(*args).rstrip()
+        if self.writer is None:
+            return self.send_string(command)
+        return self.writer.put(command, params_key(args, key))
 
     def _readline(self):
         """
@@ -83,12 +151,107 @@ class ArduinoLinker():
         """
         return self._serial.readline().decode().lstrip().rstrip()
 
+    def read_available(self):
+        """
+        Read all the bytes currently available, and handle every complete line or frame received.
+        Called by a SerialReader when the connection is ready for reading. An error in the callbacks
+        is logged, and the next lines or frames are still handled.
+        """
+        self._buffer += self._serial.read(self._serial.in_waiting or 1)
+        tracer.begin()
+        try:
+            if not self.binary:
+                *lines, self._buffer = self._buffer.split(b"\n")
+                for line in lines:
+                    try:
+                        self._line_received(line.decode(errors="replace").strip())
+                    except Exception:  # pylint: disable=broad-except
+                        logger.exception("Error handling the line %r of Arduino %s", line, self.name,
+                                         extra={"arduino": self.name})
+            if self.binary:
+                payloads, self._buffer = BinaryProtocol.decode_frames(self._buffer)
+                for payload in payloads:
+                    try:
+                        self._frame_received(payload)
+                    except Exception:  # pylint: disable=broad-except
+                        logger.exception("Error handling a frame of Arduino %s", self.name,
+                                         extra={"arduino": self.name})
+        finally:
+            tracer.end()
+
+    def _frame_received(self, payload):
+        """
+        Handle a binary frame received from the Arduino
+        """
+        if not payload:
+            return
+        if payload[0] == BinaryProtocol.SENSOR and len(payload) >= 2:
+            sensor_id, values = BinaryProtocol.decode_sensor_data(payload)
+            if sensor_id < len(self.sensor_ids):
+                self._sensor_data_received(self.sensor_ids[sensor_id], values)
+        elif payload[0] == BinaryProtocol.TEXT:
+            self._line_received(payload[1:].decode(errors="replace").strip())
+
+    def _sensor_data_received(self, sensor, values):
+        """
+        Handle the values of a sensor received in a binary frame
+        """
+        if self.recorder:
+            self.recorder.record(self.name, " ".join(map(str, ("sensor", sensor, *values))))
+        if self._sensor_data_callback:
+            self._sensor_data_callback(self.name, sensor, values)
+        elif self._data_received_callback:
+            self._data_received_callback(self.name, " ".join(map(str, ("sensor", sensor, *values))))
+
+    def _line_received(self, line):
+        """
+        Handle a complete line received from the Arduino
+        """
+        if self.recorder:
+            self.recorder.record(self.name, line)
+        if self._identify(line):
+            return
+        if self._data_received_callback:
+            self._data_received_callback(self.name, line)
+
+    def _write_failed(self, _error):
+        """
+        Called by the writer when writing the commands failed: the connection is lost as if reading had failed
+        """
+        if not self.listening:
+            return
+        if self._reader is not None:
+            self._reader.unregister(self)
+        self.connection_lost()
+
+    def connection_lost(self):
+        """
+        Called when the serial connection failed while listening
+        """
+        self.listening = False
+        self._reader = None
+        if self._connection_lost_callback:
+            self._connection_lost_callback(self.name)
+
     def set_data_received_callback(self, callback):
         """
         Set the callback to call when data is received from the Arduino
         """
         self._data_received_callback = callback
 
+    def set_sensor_data_callback(self, callback):
+        """
+        Set the callback to call with the sensor name and its values when a binary sensor frame is received.
+        If not set, binary sensor frames are converted to text lines for the data received callback.
+        """
+        self._sensor_data_callback = callback
+
+    def set_connection_lost_callback(self, callback):
+        """
+        Set the callback to call when the serial connection fails (Arduino unplugged or reset)
+        """
+        self._connection_lost_callback = callback
+
     def set_identification_callback(self, callback):
         """
         Set the callback to call when the arduino has identified itself
@@ -104,10 +267,19 @@ class ArduinoLinker():
     def _identify(self, line):
         """
         Check if `line` is an identification command, and set the `identity` attribute if necessary.
-        Return True if identity was set, False otherwise
+        Return True if `line` was an identification command, False otherwise. Once identified, the other
+        identification commands (answers to the handshake retries) are ignored.
         """
         if line.startswith("identity "):
-            self._identity = line.lstrip("identity ").rstrip()
+            if self._identity is not None:
+                return True
+            identity, *options = line[len("identity "):].split()
+            self._identity = identity
+            # The Arduino supports binary frames, and gives the names of its sensors
+            if options and options[0] == "binary" and self.protocol == "binary":
+                self.sensor_ids = options[1:]
+                self.send_command("binary")
+                self.binary = True
             if self._identification_callback:
                 self._identification_callback(self.name)
             return True
@@ -118,17 +290,27 @@ class ArduinoLinker():
         Listen for data from the Arduino and send them to _callback. Blocking
         """
         while self.listening:
-            if self._data_received_callback and self._serial.in_waiting:
-                line = self._readline()
-                self._identify(line) or self._data_received_callback(self.name, line)
-            else:
-                time.sleep(.01)
+            try:
+                if self._data_received_callback and self._serial.in_waiting:
+                    self.read_available()
+                else:
+                    time.sleep(.01)
+            except (OSError, serial.SerialException):
+                self.connection_lost()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error reading Arduino %s", self.name, extra={"arduino": self.name})
 
-    def start_listening(self):
+    def start_listening(self, reader=None):
         """
-        Start a new thread for listening data from the Arduino. Non blocking.
+        Start listening data from the Arduino. Non blocking.
+        If `reader` (a SerialReader) is given, the connection is watched by the reader's thread,
+        otherwise a new thread is started for this Arduino only.
         """
         self.listening = True
+        if reader is not None:
+            self._reader = reader
+            reader.register(self)
+            return
         self._listening_thread = threading.Thread(target=self.listen, name=f"ListeningThread-{self.name}", daemon=True)
         self._listening_thread.start()
 
@@ -137,9 +319,12 @@ class ArduinoLinker():
         Stop the listening thread
         """
         self.listening = False
+        if self._reader is not None:
+            self._reader.unregister(self)
+            self._reader = None
 
     def __repr__(self):
-        return f"<ArduinoLinker arduino_name={self.name} identity={self.identity}>"
+        return f"<ArduinoLinker arduino_name={self.name} identity={self.identity} binary={self.binary}>"
 
     def __del__(self):
         """
@@ -2,29 +2,69 @@
 Python class for managing all the Arduinos
 """
 
+import itertools
 import threading
-import colorama
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import serial
 import serial.tools.list_ports
-from arduinomanager.ArduinoLinker import ArduinoLinker
+from arduinomanager.ArduinoLinker import ArduinoLinker, params_key
+from arduinomanager.PortWatcher import PortWatcher, list_serial_ports
+from arduinomanager.RemoteLinker import RemoteLinker
+from arduinomanager.ReplayLinker import ReplayLinker, StreamPlayer
+from arduinomanager.SerialReader import SerialReader
+from arduinomanager.StreamRecorder import StreamRecorder, read_stream
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
 # pylint: disable=no-name-in-module
-from parameters import IGNORE_PORTS
+from parameters import IGNORE_PORTS, SERIAL_READER, HANDSHAKE_DELAY, HANDSHAKE_TIMEOUT
 
 __all__ = ['ArduinosManager']
 
+logger = get_logger("arduinos")
+data_logger = get_logger("arduinos.data")
+commands_logger = get_logger("arduinos.commands")
+
 
 class ArduinosManager():
     """Python class for managing all the Arduinos"""
 
-    def __init__(self, autodiscover=False):
+    def __init__(self, autodiscover=False, reader=SERIAL_READER):
         self.arduinos = dict()
+        # Guards `arduinos`, modified by the port watcher, the reader (connections lost) and the cluster threads
+        self._lock = threading.RLock()
         self._callback = None
+        self._sensor_callback = None
+        # Notified every time an Arduino identifies itself
+        self._identified = threading.Condition()
+        # Per-port timings of the last discovery (in seconds since its start)
+        self.timings = {}
+        self._discovery_start = time.monotonic()
+        # Last "*_params" commands sent and their key, by target identity (None for broadcast) and key,
+        # replayed on reconnection
+        self._last_params = defaultdict(dict)
+        self._known_identities = set()
+        # Callbacks called when the Arduino of an identity identifies itself, by identity
+        self._identification_callbacks = defaultdict(list)
+        self._watcher = None
+        self._recorder = None
+        self._player = None
+        # With the "selector" reader, all the serial connections are read from a single thread.
+        # `reader` can also be a reader object, such as the AsyncSerialReader of an AsyncRuntime
+        if reader == "selector":
+            self._reader = SerialReader()
+        elif reader == "thread":
+            self._reader = None
+        else:
+            self._reader = reader
         if autodiscover:
             self.autodiscover()
 
     @property
     def arduinos_list(self):
-        return list(self.arduinos.values())
+        with self._lock:
+            return list(self.arduinos.values())
 
     @property
     def arduinos_by_identity(self):
@@ -36,46 +76,285 @@ class ArduinosManager():
 
     def autodiscover(self, ignore_devices=IGNORE_PORTS, verbose=True):
         """
-        Search for all devices connected to serial port and add them all
+        Search for all devices connected to serial port and add them all.
+        The ports are opened and the handshakes started concurrently. Non blocking: use
+        wait_for_identities to wait for the Arduinos to identify themselves.
         """
         if verbose:
-            print("Detecting connected Arduinos...")
-        for com_port in serial.tools.list_ports.comports():
-            if not com_port.device in ignore_devices:
-                self.add_arduino(com_port.name, com_port.device)
+            logger.info("Detecting connected Arduinos...")
+        self._discovery_start = time.monotonic()
+        com_ports = [com_port for com_port in serial.tools.list_ports.comports() if not com_port.device in ignore_devices]
+        if not com_ports:
+            return 0
+        with ThreadPoolExecutor(max_workers=len(com_ports)) as executor:
+            results = executor.map(self._open_linker, [com_port.name for com_port in com_ports],
+                                   [com_port.device for com_port in com_ports])
+            for com_port, (linker, error) in zip(com_ports, results):
+                if error is not None:
+                    logger.error("Cannot open %s: %s", com_port.device, error, extra={"port": com_port.device})
+                    continue
+                self._add_linker(com_port.name, linker)
         return len(self.arduinos)
 
+    def _open_linker(self, name, port):
+        """
+        Open the serial connection of an Arduino. Return the linker, or the error if the port cannot be opened
+        """
+        try:
+            linker = ArduinoLinker(port, name=name)
+        except (OSError, serial.SerialException) as error:
+            return None, error
+        self.timings[name] = {"port": port, "opened": time.monotonic() - self._discovery_start, "identified": None}
+        return linker, None
+
     def add_arduino(self, name, port, autoidentify=True):
         """
         Add an Arduino
         """
         if name in self.arduinos.keys():
             raise ValueError("An arduino with same name already exists")
-        self.arduinos[name] = ArduinoLinker(port, name=name)
-        self.arduinos[name].set_data_received_callback(self._data_received_callback)
-        self.arduinos[name].set_identification_callback(self._arduino_identified_callback)
-        self.arduinos[name].start_listening()
-        # It seems like it's better to wait a bit after the serial connection has been
-        # initialized, otherwise it doesn't seem to work
+        linker, error = self._open_linker(name, port)
+        if error is not None:
+            raise error
+        self._add_linker(name, linker, autoidentify)
+
+    def _add_linker(self, name, linker, autoidentify=True):
+        """
+        Add the linker of an Arduino, start listening to it and start the handshake
+        """
+        with self._lock:
+            if name in self.arduinos.keys():
+                raise ValueError("An arduino with same name already exists")
+            self.arduinos[name] = linker
+            linker.recorder = self._recorder
+            linker.set_data_received_callback(self._data_received_callback)
+            linker.set_sensor_data_callback(self._sensor_data_received_callback)
+            linker.set_identification_callback(self._arduino_identified_callback)
+            linker.set_connection_lost_callback(self._connection_lost_callback)
+            linker.start_listening(reader=self._reader)
+        # The Arduino resets when the serial connection is opened, so wait a bit
+        # before asking it to identify itself
         if autoidentify:
-            #self.arduinos[name].ask_identification()
-            threading.Timer(2, self.arduinos[name].ask_identification).start()
+            get_runtime().call_later(HANDSHAKE_DELAY, self._handshake, name, time.monotonic() + HANDSHAKE_TIMEOUT)
+
+    def _handshake(self, name, deadline, retry_interval=.5):
+        """
+        Ask an Arduino to identify itself, and ask again every `retry_interval` seconds until it does or `deadline` passes
+        """
+        arduino = self.arduinos.get(name)
+        if arduino is None or arduino.is_identified or time.monotonic() > deadline:
+            return
+        try:
+            arduino.ask_identification()
+        except (OSError, serial.SerialException):
+            return
+        get_runtime().call_later(retry_interval, self._handshake, name, deadline)
+
+    def remove_arduino(self, name):
+        """
+        Stop listening to an Arduino, close its serial connection and remove it
+        """
+        with self._lock:
+            arduino = self.arduinos.pop(name, None)
+        if arduino is None:
+            return
+        arduino.stop_listening()
+        try:
+            arduino.close()
+        except (OSError, serial.SerialException):
+            pass
+
+    def start_supervisor(self, interval=1., ignore_devices=IGNORE_PORTS, list_ports=None):
+        """
+        Watch the serial ports every `interval` seconds: Arduinos unplugged are removed, and Arduinos
+        plugged (or replugged) are added and identified. Non blocking.
+        `list_ports` returns the ports as {name: device}, by default the serial ports but `ignore_devices`.
+        """
+        self._watcher = PortWatcher(self._ports_changed, interval, list_ports or (lambda: list_serial_ports(ignore_devices)))
+        with self._lock:
+            self._watcher.ports = {name: arduino.port for name, arduino in self.arduinos.items()}
+        self._watcher.start()
+
+    def stop_supervisor(self):
+        """
+        Stop watching the serial ports
+        """
+        if self._watcher:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _ports_changed(self, ports, verbose=True):
+        """
+        Callback when the serial ports available changed: remove the Arduinos whose port disappeared,
+        and add the ports without Arduino
+        """
+        with self._lock:
+            for name, arduino in list(self.arduinos.items()):
+                if isinstance(arduino, ReplayLinker):
+                    continue
+                if ports.get(name) != arduino.port:
+                    if verbose:
+                        logger.warning("Arduino %s disconnected", name, extra={"arduino": name})
+                    self.remove_arduino(name)
+            new_ports = {name: port for name, port in ports.items() if name not in self.arduinos}
+        # The ports are opened without the lock, opening one can take a while
+        for name, port in new_ports.items():
+            if verbose:
+                logger.info("New serial port %s", port, extra={"port": port})
+            linker, error = self._open_linker(name, port)
+            if error is not None:
+                logger.error("Cannot open %s: %s", port, error, extra={"port": port})
+                continue
+            try:
+                self._add_linker(name, linker)
+            except ValueError:
+                # Added by another thread meanwhile
+                linker.close()
+
+    def _connection_lost_callback(self, arduino_name, verbose=True):
+        """
+        Callback when the serial connection of an Arduino failed
+        """
+        if verbose:
+            logger.warning("Connection lost with Arduino %s", arduino_name, extra={"arduino": arduino_name})
+        self.remove_arduino(arduino_name)
+        # The port may still be there (Arduino reset): reopen it at the next poll
+        if self._watcher:
+            self._watcher.invalidate()
+
+    def start_recording(self, filename):
+        """
+        Record all the lines received from the Arduinos (current and future ones) to `filename`,
+        compressed if it ends with .gz
+        """
+        self.stop_recording()
+        self._recorder = StreamRecorder(filename)
+        for arduino in self.arduinos_list:
+            arduino.recorder = self._recorder
+
+    def stop_recording(self):
+        """
+        Stop recording the lines received and close the file
+        """
+        if self._recorder:
+            for arduino in self.arduinos_list:
+                arduino.recorder = None
+            self._recorder.close()
+            self._recorder = None
+
+    def replay(self, stream, speed=1., loop=False):
+        """
+        Feed the lines of `stream` (a file written by start_recording, or an iterable of
+        (time, arduino name, line) tuples) through the callbacks, as if they were received from the Arduinos.
+        The Arduinos of the stream are added as ReplayLinkers. `speed` multiplies the rate of the stream,
+        0 to play it as fast as possible. Non blocking: return the StreamPlayer playing the stream.
+        """
+        if isinstance(stream, str):
+            stream = read_stream(stream)
+        self._player = StreamPlayer(stream, self._replay_linker, speed, loop)
+        self._player.start()
+        return self._player
+
+    def _replay_linker(self, name):
+        """
+        Return the ReplayLinker of the Arduino `name`, adding it if necessary
+        """
+        with self._lock:
+            linker = self.arduinos.get(name)
+            if linker is None:
+                self.timings[name] = {"port": f"replay:{name}", "opened": time.monotonic() - self._discovery_start,
+                                      "identified": None}
+                linker = ReplayLinker(name)
+                self._add_linker(name, linker, autoidentify=False)
+        if not isinstance(linker, ReplayLinker):
+            raise ValueError(f"Arduino {name} is connected, its data cannot be replayed")
+        return linker
+
+    def add_remote_arduino(self, node, remote_name, port=None, baudrate=None):
+        """
+        Add the Arduino `remote_name` of a node of the cluster, as a RemoteLinker named "node/remote_name".
+        Return the linker, which is identified once the node gives the identity of the Arduino
+        """
+        name = f"{node.name}/{remote_name}"
+        self.timings[name] = {"port": f"{node.name}:{port or remote_name}",
+                              "opened": time.monotonic() - self._discovery_start, "identified": None}
+        linker = RemoteLinker(name, node, remote_name, port, baudrate)
+        self._add_linker(name, linker, autoidentify=False)
+        return linker
+
+    def wait_for_identities(self, identities=None, timeout=None):
+        """
+        Wait until all the Arduinos in `identities` (or, if None, all the Arduinos added) have identified
+        themselves, or `timeout` seconds have passed. Blocking.
+        Return True if all expected Arduinos were identified, False otherwise
+        """
+        def all_identified():
+            if identities is None:
+                return all(arduino.is_identified for arduino in self.arduinos_list)
+            return set(identities) <= set(self.arduinos_by_identity)
+        with self._identified:
+            return self._identified.wait_for(all_identified, timeout)
+
+    @property
+    def writers_stats(self):
+        """Metrics of the command queue of each Arduino, by name"""
+        with self._lock:
+            arduinos = list(self.arduinos.items())
+        return {name: arduino.writer.stats for name, arduino in arduinos if arduino.writer}
+
+    def report_timings(self):
+        """
+        Log the time taken to open and identify each Arduino during the last discovery
+        """
+        for name, timing in sorted(self.timings.items()):
+            identified = f"identified after {timing['identified']:.2f}s" if timing['identified'] is not None else "not identified"
+            logger.info("%s (%s): opened after %.2fs, %s", name, timing['port'], timing['opened'], identified,
+                        extra={"arduino": name, **timing})
 
     def _data_received_callback(self, arduino_name, data, verbose=True):
         """
         Callback when receiving data from the arduinos
         """
         if verbose:
-            print(f"Data received from {arduino_name}: {colorama.Fore.BLUE}{data}{colorama.Style.RESET_ALL}")
+            data_logger.debug("Data received from %s: %s", arduino_name, data, extra={"arduino": arduino_name})
         if self._callback:
             self._callback(data)
 
+    def _sensor_data_received_callback(self, arduino_name, sensor, values, verbose=True):
+        """
+        Callback when receiving sensor values in a binary frame from the arduinos
+        """
+        if verbose:
+            data_logger.debug("Sensor data received from %s: %s %s", arduino_name, sensor, values,
+                              extra={"arduino": arduino_name, "sensor": sensor, "values": values})
+        if self._sensor_callback:
+            self._sensor_callback(sensor, values)
+        elif self._callback:
+            self._callback(" ".join(map(str, ("sensor", sensor, *values))))
+
     def _arduino_identified_callback(self, arduino_name, verbose=True):
         """
         Callback when an arduino has identified itself
         """
+        arduino = self.arduinos.get(arduino_name)
+        if arduino is None:
+            # Removed meanwhile
+            return
+        if arduino_name in self.timings:
+            self.timings[arduino_name]["identified"] = time.monotonic() - self._discovery_start
         if verbose:
-            print(f"{colorama.Fore.GREEN}Arduino {arduino_name} identified as {self.arduinos[arduino_name].identity}{colorama.Style.RESET_ALL}")
+            logger.info("Arduino %s identified as %s", arduino_name, arduino.identity,
+                        extra={"arduino": arduino_name, "identity": arduino.identity})
+        # Arduino reconnected: restore the parameters it had
+        if arduino.identity in self._known_identities:
+            for args, key in itertools.chain(self._last_params[None].values(),
+                                             self._last_params[arduino.identity].values()):
+                arduino.send_command(*args, key=key)
+        self._known_identities.add(arduino.identity)
+        for callback in self._identification_callbacks.get(arduino.identity, ()):
+            callback()
+        with self._identified:
+            self._identified.notify_all()
 
     def set_callback(self, callback):
         """
@@ -83,34 +362,57 @@ class ArduinosManager():
         """
         self._callback = callback
 
-    def send_command(self, arduinos_target, *args, send_by_identity=True, verbose=True):
+    def add_identification_callback(self, identity, callback):
+        """
+        Call `callback()` every time the Arduino `identity` identifies itself, including after a reconnection
+        """
+        self._identification_callbacks[identity].append(callback)
+
+    def set_sensor_callback(self, callback):
+        """
+        Set callback to call with the sensor name and its values when receiving binary sensor frames
+        """
+        self._sensor_callback = callback
+
+    def send_command(self, arduinos_target, *args, send_by_identity=True, verbose=True, key=None):
         """
-        Send a command to a specific (or some specific) Arduino(s)
+        Send a command to a specific (or some specific) Arduino(s). A command with a `key` (or a "*_params" command,
+        keyed by its name) supersedes the previous one with the same key, and the last one is sent again when
+        the Arduino reconnects
         """
-        arduinos = self.arduinos_by_identity if send_by_identity else self.arduinos
+        arduinos = self.arduinos_by_identity if send_by_identity else dict(self.arduinos)
         if type(arduinos_target) is str:
             arduinos_target = [arduinos_target]
+        key = params_key(args, key)
+        if send_by_identity and key is not None:
+            for arduino in arduinos_target:
+                self._last_params[arduino][key] = (args, key)
         if verbose:
-            print(f"Sending{colorama.Fore.YELLOW}", *args, f"{colorama.Style.RESET_ALL}to {colorama.Fore.BLUE}{', '.join(arduinos_target)}{colorama.Style.RESET_ALL}")
+            commands_logger.debug("Sending %s to %s", " ".join(map(str, args)), ", ".join(arduinos_target),
+                                  extra={"command": args, "targets": arduinos_target})
         for arduino in arduinos_target:
             try:
-                arduinos[arduino].send_command(*args)
+                arduinos[arduino].send_command(*args, key=key)
             except KeyError:
-                print(f"{colorama.Back.RED}Arduino {colorama.Style.BRIGHT}{arduino}{colorama.Style.NORMAL} not identified!{colorama.Style.RESET_ALL}")
+                logger.warning("Arduino %s not identified!", arduino, extra={"identity": arduino})
 
-    def broadcast(self, *args, identified_only=True, verbose=True):
+    def broadcast(self, *args, identified_only=True, verbose=True, key=None):
         """
-        Send a command to all Arduinos
+        Send a command to all Arduinos, superseding the previous one with the same key (see send_command)
         """
+        key = params_key(args, key)
+        if key is not None:
+            self._last_params[None][key] = (args, key)
         if verbose:
-            print(f"{colorama.Fore.BLUE}Broadcasting{colorama.Fore.YELLOW}", *args, colorama.Style.RESET_ALL)
+            commands_logger.debug("Broadcasting %s", " ".join(map(str, args)), extra={"command": args})
         for arduino in self.arduinos_identified if identified_only else self.arduinos_list:
-            arduino.send_command(*args)
+            arduino.send_command(*args, key=key)
 
     def __del__(self):
         """
         Destructor to close all serial connections of all arduinos at object descruction
         """
-        for arduino in self.arduinos:
+        self.stop_supervisor()
+        self.stop_recording()
+        for arduino in self.arduinos_list:
             arduino.close()
-            del arduino
@@ -0,0 +1,59 @@
+"""
+Python class for reading the serial connections of the Arduinos from an asyncio event loop
+"""
+
+import serial
+from runtime.logs import get_logger
+
+__all__ = ['AsyncSerialReader']
+
+logger = get_logger("arduinos")
+
+
+class AsyncSerialReader():
+    """
+    Watch the serial connections of the Arduinos with the reader callbacks of an asyncio event loop.
+    Same interface as SerialReader, but the data is handled on the loop's thread.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._linkers = {}
+
+    @property
+    def linkers(self):
+        """ArduinoLinker objects currently watched by the reader"""
+        return list(self._linkers.values())
+
+    def register(self, linker):
+        """
+        Start watching the serial connection of `linker`
+        """
+        fd = linker.fileno()
+        self._linkers[fd] = linker
+        self._loop.call_soon_threadsafe(self._loop.add_reader, fd, self._read, fd)
+
+    def unregister(self, linker):
+        """
+        Stop watching the serial connection of `linker`
+        """
+        for fd, registered_linker in list(self._linkers.items()):
+            if registered_linker is linker:
+                del self._linkers[fd]
+                self._loop.call_soon_threadsafe(self._loop.remove_reader, fd)
+
+    def _read(self, fd):
+        linker = self._linkers.get(fd)
+        if linker is None:
+            return
+        try:
+            linker.read_available()
+        except (OSError, serial.SerialException):
+            self._linkers.pop(fd, None)
+            self._loop.remove_reader(fd)
+            linker.connection_lost()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error handling the data of Arduino %s", linker.name, extra={"arduino": linker.name})
+
+    def __repr__(self):
+        return f"<AsyncSerialReader linkers={len(self._linkers)}>"
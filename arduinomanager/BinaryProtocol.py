@@ -0,0 +1,98 @@
+"""
+Compact binary framing of the data sent by the Arduinos, used instead of text lines
+when the Arduino supports it.
+
+Frame: START (0xA5) | payload length (1 byte) | payload | checksum (1 byte)
+The checksum is the sum of the length byte and the payload bytes, modulo 256.
+
+Payloads:
+    SENSOR (0x01) | sensor id (1 byte) | values (signed 16 bits integers, little endian)
+    TEXT (0x02) | UTF-8 text, handled like a line of the text protocol
+    LEDS (0x03) | strip id (1 byte) | index of the first LED (1 byte) | colors (3 bytes R, G, B per LED)
+
+Negotiation: when asked to identify itself, an Arduino supporting the binary protocol answers
+"identity NAME binary SENSOR_0 SENSOR_1 ...", the id of each sensor being its position in the list.
+The Raspberry answers "binary" to switch the Arduino to binary frames. Commands sent to the
+Arduino stay in text, except the LEDS frames sent to the Arduinos driving LED strips.
+"""
+
+import struct
+
+__all__ = ['START', 'SENSOR', 'TEXT', 'LEDS', 'MAX_PAYLOAD', 'MAX_LEDS', 'checksum', 'encode_frame',
+           'decode_frames', 'encode_sensor_data', 'decode_sensor_data', 'encode_text', 'encode_leds', 'decode_leds']
+
+START = 0xA5
+SENSOR = 0x01
+TEXT = 0x02
+LEDS = 0x03
+MAX_PAYLOAD = 0xFF
+# Maximum number of LEDs in a LEDS frame
+MAX_LEDS = (MAX_PAYLOAD - 3) // 3
+
+
+def checksum(data) -> int:
+    """Checksum of a frame: sum of its length and payload bytes, modulo 256"""
+    return sum(data) & 0xFF
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """Frame a payload"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload too long ({len(payload)} bytes, maximum is {MAX_PAYLOAD})")
+    body = bytes((len(payload),)) + payload
+    return bytes((START,)) + body + bytes((checksum(body),))
+
+
+def decode_frames(buffer: bytearray):
+    """
+    Extract all the complete and valid frames from `buffer`.
+    Return the list of payloads and the bytes not decoded yet. Invalid bytes and empty frames are skipped.
+    """
+    payloads = []
+    start = 0
+    while True:
+        start = buffer.find(START, start)
+        if start < 0:
+            return payloads, bytearray()
+        end = start + 2 + buffer[start + 1] if start + 1 < len(buffer) else len(buffer)
+        if end >= len(buffer):
+            return payloads, buffer[start:]
+        if checksum(buffer[start + 1:end]) != buffer[end]:
+            start += 1
+            continue
+        # An empty frame (START 00 00) has a valid checksum, but no type
+        if end > start + 2:
+            payloads.append(bytes(buffer[start + 2:end]))
+        start = end + 1
+
+
+def encode_sensor_data(sensor_id: int, values) -> bytes:
+    """Frame the values of a sensor"""
+    return encode_frame(struct.pack(f"<BB{len(values)}h", SENSOR, sensor_id, *values))
+
+
+def decode_sensor_data(payload: bytes):
+    """Return the sensor id and the values of a SENSOR payload"""
+    return payload[1], struct.unpack_from(f"<{(len(payload) - 2) // 2}h", payload, 2)
+
+
+def encode_text(text: str) -> bytes:
+    """Frame a line of text"""
+    return encode_frame(bytes((TEXT,)) + text.encode())
+
+
+def encode_leds(strip: int, start: int, colors: bytes) -> bytes:
+    """
+    Frame the colors (3 bytes per LED) of the LEDs of a strip from index `start`,
+    in as many LEDS frames as necessary
+    """
+    frames = []
+    for offset in range(0, len(colors) // 3, MAX_LEDS):
+        chunk = colors[3 * offset:3 * (offset + MAX_LEDS)]
+        frames.append(encode_frame(bytes((LEDS, strip, start + offset)) + chunk))
+    return b"".join(frames)
+
+
+def decode_leds(payload: bytes):
+    """Return the strip id, the index of the first LED and the colors of a LEDS payload"""
+    return payload[1], payload[2], payload[3:]
@@ -0,0 +1,159 @@
+"""
+Python class for sending the commands to an Arduino in batches
+"""
+
+import threading
+import time
+import serial
+from runtime.logs import get_logger
+from runtime.tracing import tracer
+
+__all__ = ['CommandWriter']
+
+logger = get_logger("arduinos")
+
+
+class CommandWriter():
+    """
+    Outbound queue of the commands for one Arduino, written by a thread of its own, so that a slow
+    serial connection only delays the commands of its Arduino.
+    Commands (and raw bytes, such as binary frames) queued within `window` seconds are sent in a single write,
+    in the order they were queued, and a command queued with a key (such as the "*_params" command of an action)
+    takes the place of the command with the same key still waiting in the queue. If a write fails,
+    `on_error(error)` is called from the writer thread.
+    """
+
+    def __init__(self, write, window=.005, name=None, on_error=None):
+        self._write = write
+        self.name = name
+        self.window = window
+        self.on_error = on_error
+        self._queue = []
+        # Monotonic time at which the first command of the queue was queued
+        self._queued_at = 0.
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        # Metrics
+        self.max_depth = 0
+        self.commands_queued = 0
+        self.commands_dropped = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+    @property
+    def depth(self):
+        """Number of commands waiting to be sent"""
+        return len(self._queue)
+
+    @property
+    def stats(self):
+        """Metrics of the queue, as a dict"""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "commands_queued": self.commands_queued,
+            "commands_dropped": self.commands_dropped,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "errors": self.errors,
+        }
+
+    def put(self, command: str, key=None):
+        """
+        Queue a command. If `key` is given, a queued command with the same key is replaced by this one,
+        keeping its place in the queue. Non blocking.
+        """
+        self._put((command + "\n").encode(), key)
+
+    def put_bytes(self, data: bytes):
+        """
+        Queue raw bytes, written as they are after the commands queued before. Non blocking.
+        """
+        self._put(bytes(data), None)
+
+    def _put(self, data, key):
+        with self._condition:
+            if self._closed:
+                return
+            # The start of the trace is kept to measure the latency until the command is written
+            item = (key, data, tracer.current())
+            self.commands_queued += 1
+            if key is not None:
+                for index, (other, _data, _trace) in enumerate(self._queue):
+                    if other == key:
+                        self._queue[index] = item
+                        self.commands_dropped += 1
+                        return
+            if not self._queue:
+                self._queued_at = time.monotonic()
+            self._queue.append(item)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"CommandWriterThread-{self.name}", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        """
+        Write the queued commands a window after the first one was queued, until closed. Blocking
+        """
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                while not self._closed:
+                    remaining = self._queued_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # The serial connection may be closed while being written
+                if not self._closed:
+                    logger.exception("Error writing to Arduino %s", self.name, extra={"arduino": self.name})
+
+    def flush(self):
+        """
+        Send all the queued commands in a single write. Blocking
+        """
+        with self._condition:
+            queue, self._queue = self._queue, []
+        if not queue:
+            return
+        data = b"".join(item for _key, item, _trace in queue)
+        try:
+            self._write(data)
+        except (OSError, serial.SerialException) as error:
+            if self._closed:
+                return
+            self.errors += 1
+            logger.error("Cannot write to Arduino %s: %s", self.name, error, extra={"arduino": self.name})
+            if self.on_error:
+                self.on_error(error)
+            return
+        self.writes += 1
+        self.bytes_written += len(data)
+        for _key, _data, trace in queue:
+            if trace is not None:
+                tracer.mark("serial_write", self.name, trace)
+
+    def close(self):
+        """
+        Stop the writer thread. The commands not sent yet are dropped
+        """
+        with self._condition:
+            self._closed = True
+            self._queue = []
+            self._condition.notify()
+
+    def __len__(self):
+        return self.depth
+
+    def __repr__(self):
+        return f"<CommandWriter depth={self.depth} writes={self.writes}>"
@@ -0,0 +1,81 @@
+"""
+Python class for watching serial ports appearing and disappearing
+"""
+
+import threading
+import serial.tools.list_ports
+from runtime.logs import get_logger
+
+__all__ = ['PortWatcher']
+
+logger = get_logger("arduinos")
+
+
+def list_serial_ports(ignore_devices=()):
+    """
+    Return the serial ports currently available, as a dict {name: device}
+    """
+    return {com_port.name: com_port.device for com_port in serial.tools.list_ports.comports()
+            if com_port.device not in ignore_devices}
+
+
+class PortWatcher():
+    """
+    Poll the serial ports available (from sysfs) and call `callback(ports)` with the dict {name: device}
+    of the ports every time the set of ports changes
+    """
+
+    def __init__(self, callback, interval=1., list_ports=list_serial_ports):
+        self.callback = callback
+        self.interval = interval
+        self.list_ports = list_ports
+        self.ports = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True if the ports are being watched"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self):
+        """
+        List the ports, and call the callback if they changed since the last poll
+        """
+        ports = self.list_ports()
+        if ports != self.ports:
+            self.ports = ports
+            self.callback(ports)
+
+    def invalidate(self):
+        """
+        Force the callback to be called at the next poll, even if the ports did not change
+        """
+        self.ports = None
+
+    def watch(self):
+        """
+        Poll the ports every `interval` seconds until stopped. Blocking.
+        An error while polling is logged, and the ports are polled again at the next interval.
+        """
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error while watching the serial ports")
+                # Call the callback again at the next poll, the changes may not have been all handled
+                self.invalidate()
+
+    def start(self):
+        """
+        Start watching the ports in a new thread. Non blocking.
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.watch, name="PortWatcherThread", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the ports
+        """
+        self._stop_event.set()
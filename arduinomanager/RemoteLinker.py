@@ -0,0 +1,60 @@
+"""
+Python class standing for an Arduino connected to another node of the cluster
+"""
+
+from arduinomanager.ReplayLinker import ReplayLinker
+
+__all__ = ['RemoteLinker']
+
+
+class RemoteLinker(ReplayLinker):
+    """
+    Arduino connected to the serial port `remote_name` of a node of the cluster. The lines and sensor
+    values read by the node are fed to it, and the commands sent to it are forwarded to the node,
+    which queues them for the Arduino like its own commands.
+    """
+
+    def __init__(self, name, node, remote_name, port=None, baudrate=None):
+        self.node = node
+        self.remote_name = remote_name
+        self._port = port
+        self._baudrate = baudrate
+        super().__init__(name)
+
+    @property
+    def port(self):
+        return f"{self.node.name}:{self._port or self.remote_name}"
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    def _write(self, data):
+        self.node.send_bytes(self.remote_name, data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def send_command(self, *args, key=None):
+        """
+        Forward a command along with its arguments to the node
+        """
+        self.node.send_command(self.remote_name, args, key)
+
+    def set_identity(self, identity, binary=False):
+        """
+        Set the identity the Arduino gave to its node, and whether it sends binary frames
+        """
+        self._identity = identity
+        self.binary = binary
+        if self._identification_callback:
+            self._identification_callback(self.name)
+
+    def feed_sensor(self, sensor, values):
+        """
+        Handle the values of a sensor as if they had been received from the Arduino in a binary frame
+        """
+        if self.listening:
+            self._sensor_data_received(sensor, values)
+
+    def __repr__(self):
+        return f"<RemoteLinker arduino_name={self.name} node={self.node.name} identity={self.identity}>"
@@ -0,0 +1,142 @@
+"""
+Python class standing for an Arduino whose data is replayed from a stream instead of read from serial
+"""
+
+import threading
+import time
+from arduinomanager.ArduinoLinker import ArduinoLinker
+
+__all__ = ['ReplayLinker', 'StreamPlayer']
+
+
+class ReplayLinker(ArduinoLinker):
+    """
+    ArduinoLinker without serial connection. The lines fed to it go through the same callbacks as the lines
+    read from an Arduino, and the commands sent to it are counted and discarded.
+    """
+
+    def __init__(self, name, write_window=0):
+        self.bytes_written = 0
+        # Lines are fed as text, so the Arduino is never switched to binary frames
+        super().__init__(None, name=name, protocol="text", write_window=write_window)
+
+    def _open_serial(self, port, baudrate):
+        return None
+
+    @property
+    def port(self):
+        return f"replay:{self.name}"
+
+    @property
+    def baudrate(self):
+        return None
+
+    def close(self):
+        self.listening = False
+
+    def is_open(self):
+        return True
+
+    def fileno(self):
+        raise OSError("A replayed Arduino has no file descriptor")
+
+    def _write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def feed(self, line):
+        """
+        Handle `line` as if it had been received from the Arduino
+        """
+        if self.listening:
+            self._line_received(line)
+
+    def start_listening(self, reader=None):
+        self.listening = True
+
+    def stop_listening(self):
+        self.listening = False
+
+    def __repr__(self):
+        return f"<ReplayLinker arduino_name={self.name} identity={self.identity}>"
+
+    def __del__(self):
+        pass
+
+
+class StreamPlayer():
+    """
+    Feed the (time, arduino name, line) tuples of `stream` to the ReplayLinker of each Arduino, `speed` times
+    faster than they were recorded (0 for as fast as possible), from a new thread.
+    The thread is not a daemon, so the program keeps running until the stream has been played.
+    """
+
+    def __init__(self, stream, get_linker, speed=1., loop=False, on_done=None):
+        self.stream = stream
+        self.get_linker = get_linker
+        self.speed = speed
+        self.loop = loop
+        self.on_done = on_done
+        self.lines_played = 0
+        self.elapsed = 0.
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True if the stream is being played"""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def rate(self):
+        """Number of lines played per second"""
+        return self.lines_played / self.elapsed if self.elapsed else 0.
+
+    def play(self):
+        """
+        Play the stream. Blocking.
+        """
+        # A stream can only be iterated once, so keep it to play it again
+        records = list(self.stream) if self.loop else self.stream
+        start = time.monotonic()
+        offset = 0.
+        while True:
+            last_timestamp = 0.
+            for timestamp, arduino_name, line in records:
+                if self._stop_event.is_set():
+                    break
+                last_timestamp = timestamp
+                if self.speed:
+                    delay = start + (offset + timestamp) / self.speed - time.monotonic()
+                    if delay > 0 and self._stop_event.wait(delay):
+                        break
+                self.get_linker(arduino_name).feed(line)
+                self.lines_played += 1
+            offset += last_timestamp
+            if not self.loop or self._stop_event.is_set() or not records:
+                break
+        self.elapsed = time.monotonic() - start
+        if self.on_done:
+            self.on_done()
+
+    def start(self):
+        """
+        Play the stream from a new thread. Non blocking.
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.play, name="StreamPlayerThread")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop playing the stream
+        """
+        self._stop_event.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the whole stream has been played. Blocking.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
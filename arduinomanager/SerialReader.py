@@ -0,0 +1,97 @@
+"""
+Python class for reading the serial connections of several Arduinos from a single thread
+"""
+
+import os
+import selectors
+import threading
+import serial
+from runtime.logs import get_logger
+
+__all__ = ['SerialReader']
+
+logger = get_logger("arduinos")
+
+
+class SerialReader():
+    """
+    Multiplex the serial connections of several Arduinos with a selector (epoll on Linux).
+    The reading thread only wakes up when bytes are available on one of the connections.
+    An error in the callbacks of a linker is logged, and does not stop the reading of the other ones.
+    """
+
+    def __init__(self, name="SerialReaderThread"):
+        self.name = name
+        self.running = False
+        self._selector = selectors.DefaultSelector()
+        self._thread = None
+        # Pipe used to wake up the selector when stopping
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+    @property
+    def linkers(self):
+        """ArduinoLinker objects currently watched by the reader"""
+        return [key.data for key in self._selector.get_map().values() if key.data is not None]
+
+    def register(self, linker):
+        """
+        Start watching the serial connection of `linker`, and start the reading thread if necessary
+        """
+        self._selector.register(linker.fileno(), selectors.EVENT_READ, linker)
+        if not self.running:
+            self.start()
+
+    def unregister(self, linker):
+        """
+        Stop watching the serial connection of `linker`
+        """
+        try:
+            self._selector.unregister(linker.fileno())
+        except (KeyError, ValueError, OSError, serial.SerialException):
+            pass
+
+    def run(self):
+        """
+        Wait for data on all registered connections and dispatch it to the linkers. Blocking
+        """
+        while self.running:
+            for key, _events in self._selector.select():
+                if key.data is None:
+                    os.read(self._wakeup_read, 512)
+                    continue
+                linker = key.data
+                try:
+                    self._read(key.fd, linker)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error handling the data of Arduino %s", linker.name,
+                                     extra={"arduino": linker.name})
+
+    def _read(self, fd, linker):
+        try:
+            linker.read_available()
+        except (OSError, serial.SerialException):
+            try:
+                self._selector.unregister(fd)
+            except (KeyError, ValueError):
+                # Already unregistered by the callbacks
+                pass
+            linker.connection_lost()
+
+    def start(self):
+        """
+        Start the reading thread. Non blocking.
+        """
+        self.running = True
+        self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the reading thread
+        """
+        self.running = False
+        os.write(self._wakeup_write, b"\0")
+
+    def __repr__(self):
+        return f"<SerialReader linkers={len(self.linkers)} running={self.running}>"
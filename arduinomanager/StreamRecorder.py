@@ -0,0 +1,75 @@
+"""
+Recording of the lines received from the Arduinos, and streams of lines to replay
+"""
+
+import gzip
+import threading
+import time
+
+__all__ = ['StreamRecorder', 'read_stream', 'synthetic_stream']
+
+
+def _open(filename, mode):
+    """Open a stream file as text, compressed with gzip if its name ends with .gz"""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+
+class StreamRecorder():
+    """
+    Write the lines received from the Arduinos to a file, one `time<TAB>arduino<TAB>line` per line,
+    `time` being the number of seconds since the recording started
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lines_recorded = 0
+        self._file = _open(filename, "w")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def record(self, arduino_name, line):
+        """
+        Record a line received from an Arduino now
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(f"{time.monotonic() - self._start:.6f}\t{arduino_name}\t{line}\n")
+            self.lines_recorded += 1
+
+    def close(self):
+        """
+        Stop recording and close the file
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __repr__(self):
+        return f"<StreamRecorder filename={self.filename} lines_recorded={self.lines_recorded}>"
+
+
+def read_stream(filename):
+    """
+    Read a file written by a StreamRecorder, and yield its (time, arduino name, line) tuples
+    """
+    with _open(filename, "r") as file:
+        for record in file:
+            timestamp, arduino_name, line = record.rstrip("\n").split("\t", 2)
+            yield float(timestamp), arduino_name, line
+
+
+def synthetic_stream(arduino_name, sensor, values, rate=100., duration=10., identity=None):
+    """
+    Yield (time, arduino name, line) tuples of `sensor` data sent `rate` times per second for `duration` seconds.
+    `values(t)` returns the list of values at time `t`. The stream starts with the identity of the Arduino,
+    if given.
+    """
+    if identity is not None:
+        yield 0., arduino_name, f"identity {identity}"
+    for index in range(int(rate * duration)):
+        timestamp = index / rate
+        yield timestamp, arduino_name, " ".join(map(str, ("sensor", sensor, *values(timestamp))))
@@ -0,0 +1,3 @@
+"""
+Benchmarks of the hot paths of the engine, run without hardware: python3 -m benchmarks --help
+"""
@@ -0,0 +1,73 @@
+"""
+Run the benchmarks of the engine hot paths and report their throughput, latency and allocations.
+
+    python3 -m benchmarks                                  # all the benchmarks
+    python3 -m benchmarks eval_condition broadcast         # some of them
+    python3 -m benchmarks --output results.json            # save the results
+    python3 -m benchmarks --baseline results.json          # fail if a benchmark regressed
+
+Run from the root of the project, so that parameters.env is found.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Use the stand-in VLC module unless asked otherwise, so that the benchmarks run anywhere without audio output
+if "--vlc" not in sys.argv:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs"))
+
+# pylint: disable=wrong-import-position
+from benchmarks.engine import BENCHMARKS
+from benchmarks.harness import measure, compare
+
+COLUMNS = ("name", "throughput", "p50_ns", "p99_ns", "max_ns", "bytes_per_sample", "retained_per_sample")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks", description="Benchmarks of the engine hot paths")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"benchmarks to run, among {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("-n", "--samples", type=int, default=100000, help="number of samples per benchmark")
+    parser.add_argument("-o", "--output", help="file where the results are written as JSON")
+    parser.add_argument("-b", "--baseline", help="results of a previous run to compare with")
+    parser.add_argument("-t", "--tolerance", type=float, default=.2,
+                        help="relative degradation from the baseline reported as a regression (default 0.2)")
+    parser.add_argument("--vlc", action="store_true", help="use the real VLC module instead of the stand-in")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r} (choose among {', '.join(BENCHMARKS)})")
+
+    # Only warnings, so that logging does not weigh on the samples
+    logging.getLogger("alice").setLevel(logging.WARNING)
+
+    results = []
+    print("  ".join(f"{column:>19}" for column in COLUMNS))
+    for name in args.benchmarks or BENCHMARKS:
+        case = BENCHMARKS[name]()
+        try:
+            result = measure(name, case, args.samples)
+        finally:
+            if case.close:
+                case.close()
+        results.append(result)
+        print("  ".join(f"{result[column]:>19}" for column in COLUMNS), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({result["name"]: result for result in results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
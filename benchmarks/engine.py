@@ -0,0 +1,170 @@
+"""
+Benchmark cases of the engine hot paths: sensor data parsing and routing, condition evaluation,
+event fan-out, broadcast to many Arduinos through ptys, and volume fades
+"""
+
+import json
+import os
+import pty
+import selectors
+import tempfile
+import threading
+from benchmarks.harness import BenchmarkCase, ManualRuntime
+from runtime.runtime import set_runtime
+
+__all__ = ['BENCHMARKS']
+
+
+def _sketch_json(nbr_sensors, nbr_events_per_sensor):
+    """Sketch with distance sensors, each listened to by sensor events whose conditions stay false"""
+    sensors = [{"name": f"d{index}", "type": "distance"} for index in range(nbr_sensors)]
+    sensor_events = [
+        {"id": f"s{index}_{event}", "name": f"near {index} {event}", "delay": 0, "sensor": f"d{index}",
+         "condition": f"distance < {-1 - event}"}
+        for index in range(nbr_sensors) for event in range(nbr_events_per_sensor)
+    ]
+    return {
+        "sensors": sensors,
+        "media_channels": [],
+        "actions": [],
+        "events": [{"id": "start", "name": "start", "delay": 0,
+                    "start_listening": [event["id"] for event in sensor_events]}],
+        "sensor_events": sensor_events,
+        "first_event": "start",
+    }
+
+
+def data_received(nbr_sensors=16, nbr_events_per_sensor=4):
+    """Sketch.data_received: parse a text line, route it to its sensor and evaluate the conditions listening"""
+    from Sketch import Sketch
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        json.dump(_sketch_json(nbr_sensors, nbr_events_per_sensor), file)
+    # Replaying an empty stream: no Arduino is searched for
+    sketch = Sketch(file.name, media_backend="null", replay=[])
+    os.unlink(file.name)
+    runtime = ManualRuntime()
+    set_runtime(runtime)
+    sketch.run()
+    lines = [f"sensor d{index % nbr_sensors} {index % 300}" for index in range(1000)]
+    iterator = iter(())
+
+    def sample():
+        nonlocal iterator
+        line = next(iterator, None)
+        if line is None:
+            iterator = iter(lines)
+            line = next(iterator)
+        sketch.data_received(line)
+
+    return BenchmarkCase(sample, runtime.cancel_all)
+
+
+def eval_condition():
+    """SensorEvent.eval_condition of a compound condition on a color sensor"""
+    from events.events import SensorEvent
+    from sensors.sensors import ColorSensor
+    sensor = ColorSensor("c0")
+    event = SensorEvent({"id": "s0", "name": "red", "delay": 0}, sensor,
+                        "red > 200 and green < 50 and blue < 50 or (red + green + blue) / 3 > 250")
+    sensor.data_received(["120", "80", "60"])
+    return BenchmarkCase(event.eval_condition)
+
+
+def event_fanout(nbr_children=100):
+    """Event.fire of an event with many child events, each scheduling its next event"""
+    from events.events import Event
+    runtime = ManualRuntime()
+    set_runtime(runtime)
+    parent = Event({"id": "parent", "name": "parent", "delay": 0})
+    following = Event({"id": "following", "name": "following", "delay": 0})
+    for index in range(nbr_children):
+        child = Event({"id": f"child{index}", "name": f"child {index}", "delay": 1000})
+        child.next = following
+        parent.add_event(child)
+    return BenchmarkCase(parent.fire, runtime.cancel_all)
+
+
+def _drain(fds, stop_event):
+    """Read and discard everything written to the pty masters, so that the writes never block"""
+    selector = selectors.DefaultSelector()
+    for fd in fds:
+        selector.register(fd, selectors.EVENT_READ)
+    while not stop_event.is_set():
+        for key, _events in selector.select(.1):
+            try:
+                os.read(key.fd, 65536)
+            except OSError:
+                selector.unregister(key.fd)
+    selector.close()
+
+
+def broadcast(nbr_arduinos=16):
+    """ArduinosManager.broadcast of a command to many Arduinos, pty stand-ins for their serial ports"""
+    from arduinomanager.ArduinoLinker import ArduinoLinker
+    from arduinomanager.ArduinosManager import ArduinosManager
+    runtime = ManualRuntime()
+    set_runtime(runtime)
+    manager = ArduinosManager(reader="thread")
+    masters = []
+    for index in range(nbr_arduinos):
+        master, slave = pty.openpty()
+        masters.append(master)
+        manager.arduinos[f"pty{index}"] = ArduinoLinker(os.ttyname(slave), name=f"pty{index}")
+        os.close(slave)
+    stop_event = threading.Event()
+    drain_thread = threading.Thread(target=_drain, args=(masters, stop_event), name="PtyDrainThread", daemon=True)
+    drain_thread.start()
+
+    def after_batch():
+        # Send the batches still queued by the writers, rather than waiting for their threads
+        runtime.cancel_all()
+        for arduino in manager.arduinos_list:
+            if arduino.writer:
+                arduino.writer.flush()
+
+    def close():
+        for arduino in manager.arduinos_list:
+            arduino.close()
+        stop_event.set()
+        drain_thread.join()
+        for master in masters:
+            os.close(master)
+
+    return BenchmarkCase(lambda: manager.broadcast("led", 255, 0, 0, identified_only=False, verbose=False),
+                         after_batch, close)
+
+
+def fades(nbr_channels=16):
+    """MediaManager.set_volume with a fade on every channel, then one tick of the volume automation"""
+    from media.MediaManager import MediaManager
+    from media.VolumeAutomation import automation
+    runtime = ManualRuntime()
+    set_runtime(runtime)
+    mediamanager = MediaManager("vlc")
+    channels = [f"channel{index}" for index in range(nbr_channels)]
+    for channel in channels:
+        mediamanager.add_channel(channel)
+    volumes = iter(())
+
+    def sample():
+        nonlocal volumes
+        volume = next(volumes, None)
+        if volume is None:
+            volumes = iter(range(0, 100, 7))
+            volume = next(volumes)
+        for channel in channels:
+            mediamanager.set_volume(channel, volume, 10.)
+        # pylint: disable=protected-access
+        automation._tick()
+
+    return BenchmarkCase(sample, runtime.cancel_all)
+
+
+# Benchmark cases by name, each function returning a BenchmarkCase
+BENCHMARKS = {
+    "data_received": data_received,
+    "eval_condition": eval_condition,
+    "event_fanout": event_fanout,
+    "broadcast": broadcast,
+    "fades": fades,
+}
@@ -0,0 +1,161 @@
+"""
+Measurement of the throughput, latency and allocations of a function called once per sample
+"""
+
+import gc
+import heapq
+import itertools
+import time
+import tracemalloc
+from collections import namedtuple
+from runtime.Handle import Handle
+from runtime.tracing import LatencyHistogram
+
+__all__ = ['BenchmarkCase', 'ManualRuntime', 'measure', 'compare']
+
+BenchmarkCase = namedtuple('BenchmarkCase', ['sample', 'after_batch', 'close'], defaults=(None, None))
+BenchmarkCase.__doc__ = """
+`sample()` is called once per sample. `after_batch()` is called after every batch of samples, outside of
+the measures, to release what the samples accumulated. `close()` releases the case.
+"""
+
+
+class ManualRuntime():
+    """
+    Runtime whose delayed calls are only run when asked, so that the benchmarks measure the calls made
+    synchronously on the sample path, and not the ones made later by a scheduler thread
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        handle = Handle(callback, args, kwargs, time.monotonic() + delay)
+        heapq.heappush(self._heap, (handle.when, next(self._counter), handle))
+        return handle
+
+    def call_soon(self, callback, *args, **kwargs):
+        return self.call_later(0, callback, *args, **kwargs)
+
+    def run_steps(self, steps):
+        return self.call_soon(self._next_step, steps)
+
+    def _next_step(self, steps):
+        delay = next(steps, None)
+        if delay is not None:
+            self.call_later(delay, self._next_step, steps)
+
+    def pending(self):
+        return [handle for _when, _count, handle in sorted(self._heap) if not (handle.cancelled or handle.done)]
+
+    def run_due(self):
+        """
+        Run the calls which are due. Return the number of calls run
+        """
+        now = time.monotonic()
+        run = 0
+        while self._heap and self._heap[0][0] <= now:
+            _when, _count, handle = heapq.heappop(self._heap)
+            if not (handle.cancelled or handle.done):
+                handle()
+                run += 1
+        return run
+
+    def cancel_all(self):
+        for _when, _count, handle in self._heap:
+            handle.cancel()
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def measure(name, case, samples=100000, batch=1000, allocation_samples=2000):
+    """
+    Call `case.sample()` `samples` times and return a dict with the throughput (samples per second),
+    the latency percentiles (in nanoseconds), and the memory allocated per sample (in bytes, measured
+    in a separate pass with tracemalloc since tracing slows the samples down)
+    """
+    sample, after_batch = case.sample, case.after_batch
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+    # Warm up caches and lazily created objects
+    for _ in range(min(batch, samples)):
+        sample()
+    if after_batch:
+        after_batch()
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    elapsed = 0
+    try:
+        done = 0
+        while done < samples:
+            count = min(batch, samples - done)
+            for _ in range(count):
+                start = clock()
+                sample()
+                end = clock()
+                histogram.record(end - start)
+                elapsed += end - start
+            done += count
+            if after_batch:
+                after_batch()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # Allocations: peak memory above the starting point while running one sample, and memory kept after it
+    allocated, retained = 0, 0
+    allocation_samples = min(allocation_samples, samples)
+    tracemalloc.start()
+    try:
+        start_memory, _peak = tracemalloc.get_traced_memory()
+        for index in range(allocation_samples):
+            before, _peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            sample()
+            _current, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+            if after_batch and (index + 1) % batch == 0:
+                after_batch()
+        end_memory, _peak = tracemalloc.get_traced_memory()
+        retained = end_memory - start_memory
+    finally:
+        tracemalloc.stop()
+    if after_batch:
+        after_batch()
+
+    summary = histogram.summary()
+    return {
+        "name": name,
+        "samples": samples,
+        "throughput": round(samples / (elapsed / 1e9)) if elapsed else 0,
+        "p50_ns": summary["p50"],
+        "p99_ns": summary["p99"],
+        "max_ns": summary["max"],
+        "bytes_per_sample": round(allocated / allocation_samples, 1) if allocation_samples else 0,
+        "retained_per_sample": round(retained / allocation_samples, 1) if allocation_samples else 0,
+    }
+
+
+def compare(results, baseline, tolerance=.2):
+    """
+    Compare `results` to `baseline` (results of a previous run, by name). Return the list of regressions:
+    throughput lower, p99 latency higher or allocations higher than the baseline by more than `tolerance`
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["name"])
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['name']}: throughput {result['throughput']}/s < {reference['throughput']}/s")
+        if result["p99_ns"] > reference["p99_ns"] * (1 + tolerance):
+            regressions.append(f"{result['name']}: p99 {result['p99_ns']} ns > {reference['p99_ns']} ns")
+        # A few bytes of noise are expected from tracemalloc itself
+        if result["bytes_per_sample"] > reference["bytes_per_sample"] * (1 + tolerance) + 16:
+            regressions.append(f"{result['name']}: {result['bytes_per_sample']} bytes per sample"
+                               f" > {reference['bytes_per_sample']}")
+    return regressions
@@ -0,0 +1,127 @@
+"""
+Stand-in for the python-vlc module, implementing what MediaPlayer and MediaCache use without any audio output
+"""
+
+# pylint: disable=invalid-name,too-few-public-methods
+
+
+class PlaybackMode:
+    default = 0
+    loop = 1
+    repeat = 2
+
+
+class EventType:
+    MediaPlayerPlaying = 1
+    MediaPlayerLengthChanged = 2
+    MediaPlayerPaused = 3
+    MediaPlayerStopped = 4
+    MediaPlayerEndReached = 5
+
+
+class EventManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks[event_type] = (callback, args)
+
+    def event_detach(self, event_type):
+        self.callbacks.pop(event_type, None)
+
+
+class Media:
+    def __init__(self, mrl):
+        self.mrl = mrl
+
+    def parse(self):
+        pass
+
+    def get_duration(self):
+        return 0
+
+
+class MediaList:
+    def __init__(self):
+        self.medias = []
+
+    def add_media(self, media):
+        self.medias.append(media if isinstance(media, Media) else Media(media))
+
+    def count(self):
+        return len(self.medias)
+
+    def item_at_index(self, index):
+        return self.medias[index]
+
+
+class MediaPlayer:
+    def __init__(self):
+        self.volume = 100
+        self.muted = False
+        self.playing = False
+        self.media = None
+        self._event_manager = EventManager()
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+        return 0
+
+    def audio_get_volume(self):
+        return self.volume
+
+    def audio_toggle_mute(self):
+        self.muted = not self.muted
+
+    def audio_set_mute(self, mute):
+        self.muted = mute
+
+    def is_playing(self):
+        return int(self.playing)
+
+    def get_length(self):
+        return -1
+
+    def get_time(self):
+        return -1
+
+    def get_media(self):
+        return self.media
+
+    def event_manager(self):
+        return self._event_manager
+
+
+class MediaListPlayer:
+    def __init__(self):
+        self.player = MediaPlayer()
+        self.medialist = None
+        self.mode = PlaybackMode.default
+
+    def set_media_list(self, medialist):
+        self.medialist = medialist
+
+    def get_media_player(self):
+        return self.player
+
+    def set_playback_mode(self, mode):
+        self.mode = mode
+
+    def play(self):
+        self.player.playing = True
+
+    def play_item_at_index(self, index):
+        self.player.media = self.medialist.item_at_index(index)
+        self.player.playing = True
+
+    def pause(self):
+        self.player.playing = False
+
+    def stop(self):
+        self.player.playing = False
+
+    def next(self):
+        pass
+
+    def previous(self):
+        pass
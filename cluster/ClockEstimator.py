@@ -0,0 +1,58 @@
+"""
+Estimation of the offset between the monotonic clocks of the coordinator and of a node
+"""
+
+from collections import deque
+
+__all__ = ['ClockEstimator']
+
+
+class ClockEstimator:
+    """
+    NTP-style estimation from ping/pong exchanges: the coordinator sends its time `t0`, the node answers
+    with its time `t1`, received by the coordinator at `t2`. Assuming the network delay is the same both
+    ways, the node's clock is ahead by `t1 - (t0 + t2) / 2`, with an error below half the round trip.
+    The estimate is the one of the exchange with the shortest round trip among the last `window` ones,
+    the others having been delayed by the network or the scheduling of the processes.
+    """
+
+    def __init__(self, window: int = 8):
+        self.samples = deque(maxlen=window)
+        self.offset = None
+        self.round_trip = None
+
+    @property
+    def synchronized(self):
+        """True once the offset has been estimated"""
+        return self.offset is not None
+
+    def add_sample(self, t0: float, t1: float, t2: float):
+        """
+        Add the exchange sent at `t0`, answered at `t1` (node's clock) and received at `t2`
+        """
+        round_trip = t2 - t0
+        if round_trip < 0:
+            return
+        self.samples.append((round_trip, t1 - (t0 + t2) / 2))
+        self.round_trip, self.offset = min(self.samples)
+
+    def to_node(self, timestamp: float) -> float:
+        """Convert a time of the coordinator's clock to the node's clock"""
+        return timestamp + (self.offset or 0.)
+
+    def from_node(self, timestamp: float) -> float:
+        """Convert a time of the node's clock to the coordinator's clock"""
+        return timestamp - (self.offset or 0.)
+
+    def reset(self):
+        """
+        Forget the estimate, after the node reconnected (its process may have restarted)
+        """
+        self.samples.clear()
+        self.offset = None
+        self.round_trip = None
+
+    def __repr__(self):
+        if self.offset is None:
+            return "<ClockEstimator not synchronized>"
+        return f"<ClockEstimator offset={self.offset * 1000:.3f}ms round_trip={self.round_trip * 1000:.3f}ms>"
@@ -0,0 +1,297 @@
+"""
+Coordinator of the cluster: runs the sketch, and drives the Arduinos and channels of the other nodes
+"""
+
+import socket
+import threading
+import time
+import weakref
+from cluster.ClockEstimator import ClockEstimator
+from cluster.ClusterProtocol import listen, Connection, MessageWriter
+from media.RemoteBackend import RemoteBackend
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
+from runtime.tracing import tracer
+# pylint: disable=no-name-in-module
+from parameters import CLUSTER_ADDRESS, CLUSTER_LATENCY, CLUSTER_SYNC_INTERVAL
+
+__all__ = ['ClusterCoordinator', 'NodeConnection']
+
+logger = get_logger("cluster")
+
+# Sync intervals without any message (pongs included) after which a connection is considered lost
+STALE_INTERVALS = 3
+
+
+class NodeConnection:
+    """
+    Node of the cluster, as seen by the coordinator. Its Arduinos are RemoteLinkers of the coordinator's
+    ArduinosManager, and its channels are played by its RemoteBackend. The messages are queued to a
+    MessageWriter, so that sending never blocks (a node too slow to read them is disconnected), and they
+    are dropped while the node is not connected; the players are created again on the node when it connects.
+    """
+
+    def __init__(self, name, coordinator):
+        self.name = name
+        self.coordinator = coordinator
+        self.connection = None
+        self._writer = None
+        self.clock = ClockEstimator()
+        self.backend = RemoteBackend(self)
+        # RemoteLinkers of the Arduinos of the node, by their name on the node
+        self.linkers = {}
+        self._ping_handle = None
+        self._warned = False
+        # Guards `connection`, attached and detached by the threads of the connections
+        self._lock = threading.Lock()
+        # Monotonic time of the last message received
+        self._last_received = 0.
+        # Metrics
+        self.messages_dropped = 0
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def send(self, message, deadline=True, stamp=None):
+        """
+        Send `message` to the node. With `deadline`, the node runs it at the coordinator's current time plus
+        the latency of the cluster (converted to the node's clock), so that the delays between the messages
+        sent to all the nodes are kept whatever the network delays. With `stamp`, the time at which the message
+        is actually sent is set to that key. Non blocking.
+        """
+        writer = self._writer
+        if writer is None:
+            self.messages_dropped += 1
+            if not self._warned:
+                logger.warning("Node %s not connected, messages dropped", self.name, extra={"node": self.name})
+                self._warned = True
+            return
+        if deadline and self.coordinator.latency and self.clock.synchronized:
+            message["at"] = self.clock.to_node(time.monotonic() + self.coordinator.latency)
+        if not writer.put(message, stamp=stamp):
+            # The reading thread detaches the node
+            self.messages_dropped += 1
+
+    def send_command(self, arduino, args, key=None):
+        message = {"type": "command", "arduino": arduino, "args": list(args)}
+        if key is not None:
+            message["key"] = key
+        self.send(message)
+
+    def send_bytes(self, arduino, data):
+        self.send({"type": "bytes", "arduino": arduino, "data": bytes(data).hex()})
+
+    def send_media(self, player, method, args):
+        self.send({"type": "media", "player": player, "method": method, "args": list(args)})
+
+    def attach(self, connection) -> bool:
+        """
+        Start using `connection`, opened by the node. Return False, without using it, if the node
+        is still connected by another connection which is alive
+        """
+        with self._lock:
+            previous = self.connection
+            if previous is not None:
+                if time.monotonic() - self._last_received < STALE_INTERVALS * self.coordinator.sync_interval:
+                    return False
+                # The node restarted before its previous connection was found lost
+                previous.close()
+                self._writer.close()
+            self.clock.reset()
+            self.connection = connection
+            self._writer = MessageWriter(connection, name=f"Node {self.name}")
+            self._last_received = time.monotonic()
+        if previous is not None:
+            self._detach_linkers()
+        self._warned = False
+        logger.info("Node %s connected", self.name, extra={"node": self.name})
+        self.backend.resync()
+        # Burst of pings to estimate the clock offset right away, then one every sync interval
+        for _ in range(self.clock.samples.maxlen):
+            self.ping()
+        self._schedule_ping()
+        return True
+
+    def detach(self, connection):
+        """
+        Stop using `connection`, closed or lost: the Arduinos of the node are removed
+        """
+        with self._lock:
+            if connection is not self.connection:
+                return
+            self.connection = None
+            self._writer.close()
+            self._writer = None
+        if self._ping_handle:
+            self._ping_handle.cancel()
+            self._ping_handle = None
+        self._detach_linkers()
+        logger.warning("Node %s disconnected", self.name, extra={"node": self.name})
+
+    def _detach_linkers(self):
+        for linker in self.linkers.values():
+            self.coordinator.arduinos_manager.remove_arduino(linker.name)
+        self.linkers = {}
+
+    def ping(self):
+        # The time of the ping is the time it is actually sent, not queued
+        self.send({"type": "ping", "t0": None}, deadline=False, stamp="t0")
+
+    def _schedule_ping(self):
+        self._ping_handle = get_runtime().call_later(self.coordinator.sync_interval, self._ping_again)
+
+    def _ping_again(self):
+        if self.connection is not None:
+            self.ping()
+            self._schedule_ping()
+
+    def handle(self, message):
+        """
+        Handle a message received from the node
+        """
+        self._last_received = time.monotonic()
+        kind = message["type"]
+        if kind == "data" or kind == "sensor":
+            linker = self.linkers.get(message.get("arduino"))
+            if linker is None:
+                return
+            # Latencies are traced from the time the node read the data
+            if "t" in message and self.clock.synchronized:
+                tracer.begin(int(self.clock.from_node(message["t"]) * 1e9))
+                tracer.mark("cluster_receive", self.name)
+            try:
+                if kind == "data":
+                    linker.feed(message["line"])
+                else:
+                    linker.feed_sensor(message["sensor"], message["values"])
+            finally:
+                tracer.end()
+        elif kind == "pong":
+            self.clock.add_sample(message["t0"], message["t1"], time.monotonic())
+        elif kind == "arduino":
+            linker = self.linkers.get(message["arduino"])
+            if linker is None:
+                linker = self.coordinator.arduinos_manager.add_remote_arduino(
+                    self, message["arduino"], message.get("port"), message.get("baudrate"))
+                self.linkers[message["arduino"]] = linker
+            linker.set_identity(message["identity"], message.get("binary", False))
+        elif kind == "arduino_removed":
+            linker = self.linkers.pop(message["arduino"], None)
+            if linker is not None:
+                self.coordinator.arduinos_manager.remove_arduino(linker.name)
+        elif kind == "transition":
+            player = self.backend.players.get(message["player"])
+            if player is not None:
+                reported = self.clock.from_node(message["t"]) if "t" in message else time.monotonic()
+                player.transition(message["playing"], message["length"], message["position"], reported)
+        else:
+            logger.warning("Unknown message %r from node %s", kind, self.name, extra={"node": self.name})
+
+    def __repr__(self):
+        return f"<NodeConnection node={self.name} connected={self.connected} arduinos={len(self.linkers)} {self.clock}>"
+
+
+class ClusterCoordinator:
+    """
+    Accept the connections of the nodes on `address` ("host:port", or the path of a Unix socket).
+    The messages sent to the nodes are run by them `latency` seconds after they were sent, and the offset
+    of the clock of each node is estimated every `sync_interval` seconds.
+    """
+
+    def __init__(self, arduinos_manager, address=CLUSTER_ADDRESS, latency=CLUSTER_LATENCY,
+                 sync_interval=CLUSTER_SYNC_INTERVAL):
+        self.arduinos_manager = arduinos_manager
+        self.address = address
+        self.latency = latency
+        self.sync_interval = sync_interval
+        # Nodes by name, including the nodes not connected yet that channels are bound to
+        self.nodes = {}
+        self._lock = threading.Lock()
+        self._socket = None
+        self._thread = None
+        self._connections = weakref.WeakSet()
+
+    def node(self, name) -> NodeConnection:
+        """
+        Return the node `name`, connected or not
+        """
+        with self._lock:
+            if name not in self.nodes:
+                self.nodes[name] = NodeConnection(name, self)
+            return self.nodes[name]
+
+    def backend(self, name) -> RemoteBackend:
+        """
+        Audio backend of the channels played by the node `name`
+        """
+        return self.node(name).backend
+
+    def start(self):
+        """
+        Start accepting the connections of the nodes. Non blocking. Raise OSError if the address is not available
+        """
+        self._socket = listen(self.address)
+        self._thread = threading.Thread(target=self._accept, name="ClusterCoordinatorThread", daemon=True)
+        self._thread.start()
+        logger.info("Waiting for the nodes on %s", self.address, extra={"address": self.address})
+
+    def stop(self):
+        """
+        Stop accepting connections, and close the connections of the nodes
+        """
+        if self._socket is not None:
+            sock, self._socket = self._socket, None
+            # Wakes up the accepting thread
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        for connection in list(self._connections):
+            connection.close()
+
+    def _accept(self):
+        while self._socket is not None:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                break
+            connection = Connection(sock)
+            self._connections.add(connection)
+            threading.Thread(target=self._serve, args=(connection,), name="ClusterNodeThread", daemon=True).start()
+
+    def _serve(self, connection):
+        """
+        Handle the messages of a node until its connection is closed. The first message gives its name
+        """
+        messages = iter(connection)
+        hello = next(messages, None)
+        if hello is None or hello["type"] != "hello" or not hello.get("node"):
+            connection.close()
+            return
+        node = self.node(hello["node"])
+        if not node.attach(connection):
+            # Another process with the same name, or the node restarted before its connection was found lost
+            logger.error("Node %s already connected, new connection rejected", node.name, extra={"node": node.name})
+            connection.close()
+            return
+        try:
+            for message in messages:
+                try:
+                    node.handle(message)
+                except (KeyError, TypeError, ValueError) as error:
+                    logger.error("Malformed message from node %s: %s", node.name, error, extra={"node": node.name})
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error handling a message from node %s", node.name, extra={"node": node.name})
+        finally:
+            node.detach(connection)
+
+    @property
+    def clocks(self):
+        """Clock estimate of each node connected, by name"""
+        return {name: node.clock for name, node in self.nodes.items() if node.connected}
+
+    def __repr__(self):
+        connected = sum(node.connected for node in self.nodes.values())
+        return f"<ClusterCoordinator address={self.address} nodes={connected}/{len(self.nodes)}>"
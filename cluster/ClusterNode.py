@@ -0,0 +1,265 @@
+"""
+Node of the cluster: owns the Arduinos and plays the channels of one Pi, for the coordinator running the sketch
+"""
+
+import threading
+import time
+from collections import deque
+from arduinomanager.ArduinosManager import ArduinosManager
+from cluster.ClusterProtocol import connect, MessageWriter
+from media.AudioBackend import get_backend
+from runtime.logs import get_logger
+# pylint: disable=no-name-in-module
+from parameters import CLUSTER_ADDRESS, CLUSTER_NODE, MEDIA_BACKEND, HOTPLUG_INTERVAL
+
+__all__ = ['ClusterNode', 'NodeArduinosManager']
+
+logger = get_logger("cluster")
+
+# Methods of the players the coordinator can call
+PLAYER_METHODS = {
+    "set_volume", "set_mute", "toggle_mute", "reset_playlist", "play", "stop", "pause", "next", "previous",
+    "play_item_at_index", "set_loop",
+}
+
+
+class NodeArduinosManager(ArduinosManager):
+    """ArduinosManager forwarding the data and the identities of its Arduinos to the coordinator"""
+
+    def __init__(self, node, **kwargs):
+        self.node = node
+        super().__init__(**kwargs)
+
+    def _data_received_callback(self, arduino_name, data, verbose=True):
+        super()._data_received_callback(arduino_name, data, verbose)
+        self.node.send({"type": "data", "arduino": arduino_name, "line": data, "t": time.monotonic()})
+
+    def _sensor_data_received_callback(self, arduino_name, sensor, values, verbose=True):
+        super()._sensor_data_received_callback(arduino_name, sensor, values, verbose)
+        self.node.send({"type": "sensor", "arduino": arduino_name, "sensor": sensor, "values": list(values),
+                        "t": time.monotonic()})
+
+    def _arduino_identified_callback(self, arduino_name, verbose=True):
+        super()._arduino_identified_callback(arduino_name, verbose)
+        self.node.send_arduino(arduino_name)
+
+    def remove_arduino(self, name):
+        if name in self.arduinos:
+            self.node.send({"type": "arduino_removed", "arduino": name})
+        super().remove_arduino(name)
+
+
+class ClusterNode:
+    """
+    Connect to the coordinator on `address` as the node `name`, and keep connecting again when the connection
+    is lost. The commands of the coordinator are run in order, at the time it asked for (on this node's clock),
+    by a thread of the node, so that slow commands (such as loading a media) never delay the runtime's scheduler.
+    """
+
+    def __init__(self, name=CLUSTER_NODE, address=CLUSTER_ADDRESS, media_backend=MEDIA_BACKEND, retry_interval=1.):
+        self.name = name
+        self.address = address
+        self.retry_interval = retry_interval
+        self.arduinos_manager = NodeArduinosManager(self)
+        self.backend = get_backend(media_backend)
+        # Players of the coordinator's channels, by id, and medias parsed, by filename
+        self.players = {}
+        self.medias = {}
+        self.connection = None
+        self._writer = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        # Calls waiting for their time, in order, and the thread running them
+        self._queue = deque()
+        self._queue_condition = threading.Condition()
+        self._queue_thread = None
+        self._last_time = 0.
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def start(self, autodiscover=True):
+        """
+        Connect the Arduinos of this node and the coordinator. Non blocking.
+        """
+        if autodiscover:
+            self.arduinos_manager.autodiscover()
+            if HOTPLUG_INTERVAL:
+                self.arduinos_manager.start_supervisor(HOTPLUG_INTERVAL)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="ClusterNodeThread")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._queue_condition:
+            self._queue_condition.notify()
+        if self.connection is not None:
+            self.connection.close()
+
+    def wait(self):
+        """
+        Wait until the node is stopped. Blocking.
+        """
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        """
+        Connect to the coordinator and handle its messages, until stopped. Blocking.
+        """
+        warned = False
+        while not self._stop_event.is_set():
+            try:
+                connection = connect(self.address, timeout=self.retry_interval)
+            except OSError as error:
+                if not warned:
+                    logger.warning("Cannot connect to the coordinator on %s: %s", self.address, error,
+                                   extra={"address": self.address})
+                    warned = True
+                self._stop_event.wait(self.retry_interval)
+                continue
+            warned = False
+            self._writer = MessageWriter(connection, name="Coordinator")
+            self.connection = connection
+            logger.info("Connected to the coordinator on %s", self.address, extra={"address": self.address})
+            self.send({"type": "hello", "node": self.name})
+            for name, arduino in list(self.arduinos_manager.arduinos.items()):
+                if arduino.is_identified:
+                    self.send_arduino(name)
+            for message in connection:
+                try:
+                    self._handle(message)
+                except (KeyError, TypeError, ValueError) as error:
+                    logger.error("Malformed message from the coordinator: %s", error)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error handling a message from the coordinator")
+            self.connection = None
+            self._writer.close()
+            if not self._stop_event.is_set():
+                logger.warning("Connection to the coordinator lost", extra={"address": self.address})
+
+    def send(self, message, stamp=None):
+        """
+        Send `message` to the coordinator, if connected. Non blocking: the messages are queued to a MessageWriter.
+        With `stamp`, the time at which the message is actually sent is set to that key.
+        """
+        if self.connection is None:
+            return
+        self._writer.put(message, stamp=stamp)
+
+    def send_arduino(self, name):
+        """
+        Give the identity of the Arduino `name` to the coordinator
+        """
+        arduino = self.arduinos_manager.arduinos.get(name)
+        if arduino is None or not arduino.is_identified:
+            return
+        self.send({"type": "arduino", "arduino": name, "identity": arduino.identity, "binary": arduino.binary,
+                   "port": arduino.port, "baudrate": arduino.baudrate})
+
+    def _handle(self, message):
+        kind = message["type"]
+        if kind == "ping":
+            # Answered right away, the clock estimation relies on it
+            self.send({"type": "pong", "t0": message["t0"], "t1": None}, stamp="t1")
+        elif kind == "command":
+            self._call_at(message.get("at"), self._command, message["arduino"], message["args"], message.get("key"))
+        elif kind == "bytes":
+            self._call_at(message.get("at"), self._bytes, message["arduino"], bytes.fromhex(message["data"]))
+        elif kind == "media":
+            self._call_at(message.get("at"), self._media, message["player"], message["method"], message["args"])
+        else:
+            logger.warning("Unknown message %r from the coordinator", kind)
+
+    def _call_at(self, when, callback, *args):
+        """
+        Call `callback(*args)` at monotonic time `when` (now if None), after the calls received before it
+        """
+        now = time.monotonic()
+        with self._queue_condition:
+            self._last_time = max(self._last_time, when if when is not None else now)
+            self._queue.append((self._last_time, callback, args))
+            if self._queue_thread is None:
+                self._queue_thread = threading.Thread(target=self._run_queue, name="ClusterNodeQueueThread", daemon=True)
+                self._queue_thread.start()
+            self._queue_condition.notify()
+
+    def _run_queue(self):
+        """
+        Run the calls of the queue at their time, until the node is stopped. Blocking
+        """
+        while True:
+            with self._queue_condition:
+                while not self._stop_event.is_set():
+                    delay = self._queue[0][0] - time.monotonic() if self._queue else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._queue_condition.wait(delay)
+                if self._stop_event.is_set():
+                    self._queue_thread = None
+                    return
+                _, callback, args = self._queue.popleft()
+            try:
+                callback(*args)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error running a command of the coordinator")
+
+    def _command(self, arduino, args, key=None):
+        if arduino not in self.arduinos_manager.arduinos:
+            logger.warning("Arduino %s not connected to node %s", arduino, self.name, extra={"arduino": arduino})
+            return
+        # Sent by name: the coordinator keeps the last parameters sent, and restores them itself
+        self.arduinos_manager.send_command(arduino, *args, send_by_identity=False, key=key)
+
+    def _bytes(self, arduino, data):
+        linker = self.arduinos_manager.arduinos.get(arduino)
+        if linker is None:
+            return
+        try:
+            linker.send_bytes(data)
+        except OSError as error:
+            logger.error("Cannot write to %s: %s", arduino, error, extra={"arduino": arduino})
+
+    def _media(self, player_id, method, args):
+        if method == "create":
+            if player_id in self.players:
+                self.players[player_id].stop()
+            player = self.players[player_id] = self.backend.create_player()
+            player.set_transition_callback(lambda playing: self._transition(player_id, playing))
+            return
+        player = self.players.get(player_id)
+        if player is None:
+            return
+        if method == "close":
+            player.set_transition_callback(None)
+            player.stop()
+            del self.players[player_id]
+        elif method == "add_media":
+            filename = args[0]
+            try:
+                if filename not in self.medias:
+                    self.medias[filename], _ = self.backend.parse(filename)
+            except (OSError, ValueError) as error:
+                logger.error("Cannot load %s: %s", filename, error, extra={"filename": filename})
+                return
+            player.add_media(self.medias[filename])
+        elif method in PLAYER_METHODS:
+            getattr(player, method)(*args)
+        else:
+            logger.warning("Unknown player method %r", method)
+
+    def _transition(self, player_id, playing):
+        # Called from a backend thread, which must not call the backend back
+        self._call_at(None, self._report_transition, player_id, playing)
+
+    def _report_transition(self, player_id, playing):
+        player = self.players.get(player_id)
+        if player is None:
+            return
+        self.send({"type": "transition", "player": player_id, "playing": playing, "length": player.length(),
+                   "position": player.position(), "t": time.monotonic()})
+
+    def __repr__(self):
+        return f"<ClusterNode node={self.name} connected={self.connected} arduinos={len(self.arduinos_manager.arduinos)}>"
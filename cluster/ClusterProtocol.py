@@ -0,0 +1,191 @@
+"""
+Messages exchanged between the coordinator and the nodes of a cluster: one JSON object per line,
+over a TCP connection ("host:port") or a Unix socket (path)
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from runtime.logs import get_logger
+
+__all__ = ['Connection', 'MessageWriter', 'parse_address', 'connect', 'listen']
+
+logger = get_logger("cluster")
+
+
+def parse_address(address: str):
+    """
+    Return the socket family and address of "host:port", or of the path of a Unix socket
+    """
+    if "/" in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    try:
+        return socket.AF_INET, (host or "localhost", int(port))
+    except ValueError as error:
+        raise ValueError(f"Malformed cluster address {address!r}, expected host:port or a socket path") from error
+
+
+def connect(address: str, timeout=None):
+    """
+    Open a connection to the coordinator listening on `address`. Raise OSError if it cannot be reached
+    """
+    family, address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    sock.settimeout(None)
+    return Connection(sock)
+
+
+def listen(address: str):
+    """
+    Return a socket listening on `address` for the connections of the nodes
+    """
+    family, address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        # Socket left by a previous run
+        if os.path.exists(address):
+            os.unlink(address)
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen()
+    return sock
+
+
+class Connection:
+    """
+    Connection to a peer of the cluster. Messages are dicts with a "type", sent by any thread
+    (one write per message) and read by iterating on the connection until it is closed.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        if sock.family != socket.AF_UNIX:
+            # Messages are small and latency matters more than throughput
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = sock.makefile('rb')
+        self._lock = threading.Lock()
+        self.closed = False
+        # Metrics
+        self.messages_sent = 0
+        self.messages_received = 0
+
+    def send(self, message: dict):
+        """
+        Send `message`. Raise OSError if the connection is lost
+        """
+        data = json.dumps(message, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self.socket.sendall(data)
+            self.messages_sent += 1
+
+    def __iter__(self):
+        """
+        Yield the messages received, until the connection is closed or lost. Malformed lines are skipped
+        """
+        while not self.closed:
+            try:
+                line = self._file.readline()
+            except (OSError, ValueError):
+                break
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and "type" in message:
+                self.messages_received += 1
+                yield message
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._file.close()
+        self.socket.close()
+
+
+class MessageWriter:
+    """
+    Outbound queue of the messages of a Connection, sent by a thread of its own so that a peer which stops
+    reading never blocks the threads sending to it. If more than `max_queued` messages are waiting, or if
+    sending fails, the connection is closed, which ends the iteration of its messages.
+    """
+
+    def __init__(self, connection, max_queued=1024, name=None):
+        self.connection = connection
+        self.max_queued = max_queued
+        self.name = name
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"ClusterWriterThread-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, message: dict, stamp=None) -> bool:
+        """
+        Queue `message`. If `stamp` is given, the monotonic time at which the message is sent is set to
+        its key `stamp`. Return False if the message was dropped. Non blocking.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.max_queued:
+                self._closed = True
+                self._condition.notify()
+                overflow = True
+            else:
+                self._queue.append((message, stamp))
+                self._condition.notify()
+                overflow = False
+        if overflow:
+            logger.error("%s does not read its messages, connection closed", self.name, extra={"node": self.name})
+            self.connection.close()
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                message, stamp = self._queue.popleft()
+            if stamp is not None:
+                message[stamp] = time.monotonic()
+            try:
+                self.connection.send(message)
+            except OSError:
+                # The reading thread finds the connection lost
+                self.close()
+                self.connection.close()
+                return
+
+    def close(self):
+        """
+        Stop the writing thread. The messages not sent yet are dropped
+        """
+        with self._condition:
+            self._closed = True
+            self._queue.clear()
+            self._condition.notify()
+
+    def __len__(self):
+        return len(self._queue)
@@ -0,0 +1,315 @@
+"""
+HTTP and WebSocket server to watch the live state of a sketch and fire its events by hand
+"""
+
+import asyncio
+import hmac
+import json
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+from control.WebSocket import WebSocket, ConnectionClosed, accept_key
+from control.snapshot import take_snapshot, diff, merge
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
+# pylint: disable=no-name-in-module
+from parameters import CONTROL_ADDRESS, CONTROL_INTERVAL, CONTROL_TOKEN
+
+__all__ = ['ControlServer']
+
+logger = get_logger("control")
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+# Parts of the snapshot served by GET /<part>
+PARTS = ("sensors", "events", "arduinos", "channels", "nodes", "leds", "history", "scheduler", "latencies")
+
+
+class _Client:
+    """WebSocket client, with the changes not sent yet"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+
+class ControlServer:
+    """
+    Server on `address` ("host:port"), running its own event loop in its own thread:
+      GET  /state (or /sensors, /events, /arduinos, /channels...)  state of the sketch, as JSON
+      GET  /history/<sensor>?window=<seconds>                       min, max and mean of the values of a sensor
+      POST /events/<id>/fire                                        fire an event
+      GET  /ws                                                      WebSocket streaming the state
+    The state is read from snapshots taken at most every `interval` seconds, never from the serial data path.
+    The WebSocket sends the whole state, then the changes every `interval` seconds; a client too slow
+    to read them gets them merged into fewer messages. Clients can fire events with {"fire": "<id>"}.
+    The requests which can fire events (POST and the WebSocket) are refused when they come from a page
+    of another site (their Origin is not the server's), and without `token` if one is given.
+    """
+
+    def __init__(self, sketch, address=CONTROL_ADDRESS, interval=CONTROL_INTERVAL, token=CONTROL_TOKEN):
+        self.sketch = sketch
+        self.token = token or None
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.interval = interval
+        self.loop = None
+        self.clients = set()
+        self._snapshot = None
+        self._snapshot_time = 0.
+        # Last snapshot whose changes were given to the WebSocket clients
+        self._sent = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+        # Metrics
+        self.requests = 0
+        self.requests_refused = 0
+        self.snapshots = 0
+
+    def start(self):
+        """
+        Start serving from a new thread. Non blocking. Raise OSError if the address is not available
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="ControlServerThread", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise self._error
+        logger.info("Control server on http://%s:%d/", self.host, self.port,
+                    extra={"host": self.host, "port": self.port})
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as error:
+            self._error = error
+            self._started.set()
+            return
+        # Port chosen by the system if 0 was given
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self.loop.create_task(self._broadcast())
+        self.loop.run_forever()
+        self._server.close()
+        self.loop.run_until_complete(self._server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def snapshot(self) -> dict:
+        """
+        Snapshot of the state of the sketch, taken again if older than the interval
+        """
+        now = time.monotonic()
+        if self._snapshot is None or now - self._snapshot_time >= self.interval:
+            self._snapshot = take_snapshot(self.sketch)
+            self._snapshot_time = now
+            self.snapshots += 1
+        return self._snapshot
+
+    def fire_event(self, event_id) -> bool:
+        """
+        Fire the event `event_id` from the runtime, as the sketch does. Return False if there is no such event
+        """
+        if event_id not in self.sketch.events:
+            return False
+        logger.info("Event %s fired from the control server", event_id, extra={"event": event_id})
+        get_runtime().call_soon(self.sketch.fire_event, event_id)
+        return True
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        self.requests += 1
+        lines = request.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            await self._respond(writer, 400, {"error": "Malformed request"})
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        path = [unquote(part) for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        websocket = path == ["ws"] and headers.get("upgrade", "").lower() == "websocket"
+        if websocket or method == "POST":
+            reason = self._refusal(headers, query)
+            if reason:
+                self.requests_refused += 1
+                logger.warning("%s %s refused: %s", method, url.path, reason,
+                               extra={"method": method, "path": url.path, "reason": reason})
+                await self._respond(writer, 403, {"error": reason})
+                return
+        if websocket:
+            await self._websocket(reader, writer, headers)
+            return
+        try:
+            status, body = self._route(method, path, query)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error answering %s %s", method, target, extra={"method": method, "target": target})
+            status, body = 500, {"error": "Internal server error"}
+        await self._respond(writer, status, body)
+
+    def _refusal(self, headers, query):
+        """
+        Reason to refuse a request which can fire events, or None. Browsers send the Origin of the page
+        making the request: any other site than the server itself is refused. Clients which are not
+        browsers send none. If a token is set, it must be given in the Authorization header or the query
+        """
+        origin = headers.get("origin")
+        if origin is not None and urlsplit(origin).netloc != headers.get("host"):
+            return f"Origin {origin} not allowed"
+        if self.token is not None:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer":
+                token = query.get("token", [""])[0]
+            if not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+                return "Missing or wrong token"
+        return None
+
+    def _route(self, method, path, query):
+        """
+        Status and JSON body of the response to an HTTP request
+        """
+        if method == "GET":
+            if path in ([], ["state"]):
+                return 200, self.snapshot()
+            if len(path) == 1 and path[0] in PARTS:
+                return 200, self.snapshot().get(path[0])
+            if len(path) == 2 and path[0] == "history":
+                return self._history(path[1], query)
+            return 404, {"error": f"Unknown path /{'/'.join(path)}"}
+        if method == "POST":
+            if len(path) == 3 and path[0] == "events" and path[2] == "fire":
+                if self.fire_event(path[1]):
+                    return 202, {"fired": path[1]}
+                return 404, {"error": f"Unknown event {path[1]!r}"}
+            return 404, {"error": f"Unknown path /{'/'.join(path)}"}
+        return 405, {"error": f"Method {method} not allowed"}
+
+    def _history(self, name, query):
+        history = self.sketch.history
+        if history is None or name not in history.histories:
+            return 404, {"error": f"No history for sensor {name!r}"}
+        try:
+            window = float(query["window"][0]) if "window" in query else None
+        except ValueError:
+            return 400, {"error": f"Malformed window {query['window'][0]!r}"}
+        return 200, history[name].stats(window)
+
+    @staticmethod
+    async def _respond(writer, status, body):
+        data = json.dumps(body).encode()
+        writer.write((
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _websocket(self, reader, writer, headers):
+        if "sec-websocket-key" not in headers:
+            await self._respond(writer, 400, {"error": "Missing Sec-WebSocket-Key"})
+            return
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept_key(headers['sec-websocket-key'])}\r\n\r\n"
+        ).encode())
+        client = _Client(WebSocket(reader, writer))
+        # The changes broadcast next are relative to the last snapshot broadcast: start from it
+        if self._sent is None:
+            self._sent = self.snapshot()
+        client.pending = {"type": "state", "state": merge({}, self._sent)}
+        client.ready.set()
+        self.clients.add(client)
+        sender = self.loop.create_task(self._send(client))
+        try:
+            while True:
+                error = self._command(await client.websocket.receive())
+                if error:
+                    await client.websocket.send(json.dumps({"type": "error", "error": error}))
+        except ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+            await client.websocket.close()
+
+    def _command(self, text):
+        """
+        Run a command received from a WebSocket client. Return an error message if it failed
+        """
+        try:
+            event_id = json.loads(text)["fire"]
+        except (ValueError, KeyError, TypeError):
+            return f"Malformed command {text!r}"
+        if not self.fire_event(event_id):
+            return f"Unknown event {event_id!r}"
+        return None
+
+    async def _send(self, client):
+        """
+        Send the changes of a client as fast as it reads them
+        """
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                message, client.pending = client.pending, {}
+                await client.websocket.send(json.dumps(message))
+        except ConnectionClosed:
+            pass
+
+    async def _broadcast(self):
+        """
+        Every interval, take a snapshot and give its changes to the WebSocket clients
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.clients:
+                continue
+            try:
+                self._give_changes()
+            except Exception:  # pylint: disable=broad-except
+                # Tried again with the next snapshot
+                logger.exception("Error broadcasting the state")
+
+    def _give_changes(self):
+        snapshot = self.snapshot()
+        changes = diff(self._sent, snapshot)
+        # The time always changes
+        if changes.keys() <= {"time"}:
+            return
+        self._sent = snapshot
+        for client in list(self.clients):
+            if "state" in client.pending:
+                merge(client.pending["state"], changes)
+            else:
+                merge(client.pending.setdefault("changes", {}), changes)
+                client.pending["type"] = "changes"
+            client.ready.set()
+
+    def __repr__(self):
+        return f"<ControlServer http://{self.host}:{self.port}/ clients={len(self.clients)}>"
@@ -0,0 +1,121 @@
+"""
+Server side of the WebSocket protocol (RFC 6455) over asyncio streams, for text messages
+"""
+
+import base64
+import hashlib
+import struct
+
+__all__ = ['WebSocket', 'accept_key', 'ConnectionClosed']
+
+# Defined by the RFC, to compute the accept key of the handshake
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+TEXT, BINARY, CLOSE, PING, PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+# Messages from the clients are small commands
+MAX_MESSAGE = 1 << 16
+
+
+class ConnectionClosed(Exception):
+    """Raised when the client closed the WebSocket or the connection was lost"""
+
+
+def accept_key(key: str) -> str:
+    """
+    Value of the Sec-WebSocket-Accept header answering the Sec-WebSocket-Key `key`
+    """
+    return base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+
+
+class WebSocket:
+    """
+    WebSocket over the asyncio streams of a connection whose handshake has been done.
+    Messages are sent unmasked (server side) and fragments received are reassembled.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    @staticmethod
+    def frame(opcode: int, payload: bytes) -> bytes:
+        """
+        Encode an unmasked final frame
+        """
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        return header + payload
+
+    async def send(self, text: str):
+        """
+        Send a text message, waiting until the client is reading fast enough
+        """
+        if self.closed:
+            raise ConnectionClosed()
+        try:
+            self.writer.write(self.frame(TEXT, text.encode()))
+            await self.writer.drain()
+        except (ConnectionError, OSError) as error:
+            self.closed = True
+            raise ConnectionClosed() from error
+
+    async def _read_frame(self):
+        try:
+            first, second = await self.reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            if length > MAX_MESSAGE:
+                raise ConnectionClosed()
+            mask = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(length)
+        except (ConnectionError, OSError, EOFError) as error:
+            # IncompleteReadError is an EOFError
+            raise ConnectionClosed() from error
+        if mask:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        return bool(first & 0x80), first & 0x0F, payload
+
+    async def receive(self) -> str:
+        """
+        Wait for the next text message, answering the pings meanwhile. Raise ConnectionClosed when the client closes
+        """
+        fragments = []
+        while True:
+            final, opcode, payload = await self._read_frame()
+            if opcode == CLOSE:
+                await self.close()
+                raise ConnectionClosed()
+            if opcode == PING:
+                self.writer.write(self.frame(PONG, payload))
+                continue
+            if opcode == PONG:
+                continue
+            fragments.append(payload)
+            if sum(map(len, fragments)) > MAX_MESSAGE:
+                raise ConnectionClosed()
+            if final:
+                return b"".join(fragments).decode(errors="replace")
+
+    async def close(self):
+        """
+        Send a close frame and close the connection
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.writer.write(self.frame(CLOSE, b""))
+            await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        self.writer.close()
@@ -0,0 +1,115 @@
+"""
+Snapshots of the live state of a sketch, read without locks nor hooks in the serial data path
+"""
+
+import time
+from events.events import SensorEvent
+from runtime.tracing import tracer
+
+__all__ = ['take_snapshot', 'diff', 'merge']
+
+
+def take_snapshot(sketch) -> dict:
+    """
+    State of `sketch` as JSON-serializable dicts: sensor values, events (listening or pending),
+    Arduinos with their command queue metrics, media channels, scheduler drift, cluster nodes, history writes
+    and latencies.
+    Only reads attributes which are replaced or updated in place by the other threads, so it can be
+    taken from any thread.
+    """
+    events = {}
+    for event in list(sketch.events.values()):
+        state = {"name": event.name, "pending": event.is_pending}
+        if isinstance(event, SensorEvent):
+            state["sensor"] = event.sensor.name
+            state["listening"] = event in event.sensor.listeners
+        events[event.id] = state
+    snapshot = {
+        "time": time.time(),
+        "sensors": {
+            name: dict(zip(sensor.variables, sensor.values.tolist()))
+            for name, sensor in list(sketch.sensors.items())
+        },
+        "events": events,
+        "arduinos": {
+            name: {
+                "port": arduino.port,
+                "identity": arduino.identity,
+                "binary": arduino.binary,
+                "queue": arduino.writer.stats if arduino.writer else None,
+            }
+            for name, arduino in list(sketch.arduinos_manager.arduinos.items())
+        },
+        "channels": {
+            name: {
+                "volume": player.volume,
+                "target_volume": player.target_volume,
+                "playing": player.is_playing(),
+                "queue_length": player.queue_length,
+            }
+            for name, player in list(sketch.mediamanager.players.items())
+        },
+    }
+    stats = getattr(sketch.runtime, 'stats', None)
+    if stats is not None:
+        snapshot["scheduler"] = {"count": stats.count, "mean": stats.mean, "max": stats.max}
+    if sketch.cluster is not None:
+        snapshot["nodes"] = {
+            name: {
+                "connected": node.connected,
+                "clock_offset": node.clock.offset,
+                "round_trip": node.clock.round_trip,
+                "messages_dropped": node.messages_dropped,
+            }
+            for name, node in list(sketch.cluster.nodes.items())
+        }
+    if sketch.leds is not None:
+        snapshot["leds"] = {
+            "animations": len(sketch.leds.animator),
+            "frames": sketch.leds.animator.frames,
+            "frames_skipped": sketch.leds.animator.frames_skipped,
+            "writes": sketch.leds.writes,
+        }
+    if sketch.history is not None:
+        snapshot["history"] = {
+            "samples_written": sketch.history.samples_written,
+            "samples_lost": sketch.history.samples_lost,
+            "writes": sketch.history.writes,
+        }
+    if tracer.enabled:
+        snapshot["latencies"] = tracer.snapshot()
+    return snapshot
+
+
+def diff(old: dict, new: dict) -> dict:
+    """
+    Changes from the snapshot `old` to `new`: the values changed or added, nested like the snapshots,
+    and None for the keys removed
+    """
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif value != old[key]:
+            changes[key] = value
+    for key in old.keys() - new.keys():
+        changes[key] = None
+    return changes
+
+
+def merge(changes: dict, more: dict) -> dict:
+    """
+    Combine the changes `more`, found after `changes`, into `changes`. The dicts of `more` are copied
+    """
+    for key, value in more.items():
+        if not isinstance(value, dict):
+            changes[key] = value
+        elif isinstance(changes.get(key), dict):
+            merge(changes[key], value)
+        else:
+            changes[key] = merge({}, value)
+    return changes
@@ -1,10 +1,13 @@
 from pydispatch import Dispatcher, DictProperty
-import colorama
+from runtime.logs import get_logger
+from runtime.tracing import tracer
 
-__all__ = ['Action', 'ArduinoAction', 'SoundAction', 'sketch']
+__all__ = ['Action', 'ArduinoAction', 'SoundAction', 'LedAction', 'LedAnimationAction', 'sketch']
 
 sketch = None
 
+logger = get_logger("actions")
+
 
 class Action(Dispatcher):
     """base class for all actions"""
@@ -22,11 +25,16 @@ class Action(Dispatcher):
             return SoundAction(action_json=action_json)
         if action_json['type'] == 'arduino_action':
             return ArduinoAction(action_json=action_json)
+        if action_json['type'] == 'led_action':
+            return LedAction(action_json=action_json)
+        if action_json['type'] == 'led_animation':
+            return LedAnimationAction(action_json=action_json)
         raise ValueError(f"Unknown action type {action_json['type']}")
 
     def fire(self, *args, verbose=True, **kwargs):
         if verbose:
-            print(f"Action {colorama.Fore.RED}{self.name}{colorama.Style.RESET_ALL}, id {self.id} fired")
+            logger.debug("Action %s, id %s fired", self.name, self.id, extra={"action": self.id})
+        tracer.mark("action_fire", self.id)
 
     def __call__(self, *args, **kwargs):
         return self.fire(*args, **kwargs)
@@ -38,7 +46,7 @@ class ArduinoAction(Action):
 
     def __init__(self, action_json):
         super().__init__(action_json)
-        self.params_order = action_json['options_order']
+        self.params_order = list(action_json['options_order'])
         if 'arduino' in self.params_order:
             self.params_order.remove('arduino')
         self.arduino_target = self.parameters['arduino'] if 'arduino' in self.parameters else None
@@ -53,7 +61,9 @@ class ArduinoAction(Action):
         sketch.send(self.action, *self.parameters_list, arduino=self.arduino_target)
 
     def update_params(self):
-        sketch.send(self.action + "_params", *self.parameters_list, arduino=self.arduino_target)
+        # Supersedes the parameters sent before by this action only, not by the other actions with the same command
+        sketch.send(self.action + "_params", *self.parameters_list, arduino=self.arduino_target,
+                    key=f"{self.action}_params {self.id}")
 
     def stop(self):
         sketch.send(self.action + "_stop", arduino=self.arduino_target)
@@ -87,7 +97,8 @@ class SoundAction(Action):
             sketch.mediamanager.set_volume(
                 self.parameters['channel'],
                 self.parameters['volume'],
-                self.parameters['fade_time'] if 'fade_time' in self.parameters else 0
+                self.parameters['fade_time'] if 'fade_time' in self.parameters else 0,
+                self.parameters['curve'] if 'curve' in self.parameters else "linear"
             )
 
         # set_loop_mode
@@ -118,3 +129,49 @@ class SoundAction(Action):
                     sound_filename=self.parameters['filename'],
                     volume=volume,
                 )
+
+
+class LedAction(Action):
+    """Class for the actions on the LEDs of the map (light a city, a region or a range of LEDs...)"""
+
+    def __init__(self, action_json):
+        super().__init__(action_json)
+
+    @property
+    def target(self):
+        """City, region and range of positions of the LEDs targeted by the action"""
+        return {key: self.parameters[key] for key in ('city', 'region', 'start', 'stop') if key in self.parameters}
+
+    def fire(self):
+        super().fire()
+
+        # set_leds
+        if self.action == 'set_leds':
+            sketch.leds.set(self.parameters['color'], **self.target)
+
+        # clear_leds
+        elif self.action == 'clear_leds':
+            sketch.leds.set((0, 0, 0), **self.target)
+
+    def stop(self):
+        sketch.leds.set((0, 0, 0), **self.target)
+
+
+class LedAnimationAction(LedAction):
+    """Class for the LED animations (fade, pulse, chase, wave), `action` being the name of the animation"""
+
+    def __init__(self, action_json):
+        super().__init__(action_json)
+        self.animation = None
+
+    def fire(self):
+        Action.fire(self)
+        # Firing the action again restarts the animation
+        if self.animation is not None:
+            sketch.leds.animator.stop(self.animation)
+        self.animation = sketch.leds.animate(self.action, **self.parameters)
+
+    def stop(self):
+        if self.animation is not None:
+            sketch.leds.animator.stop(self.animation)
+            self.animation = None
@@ -0,0 +1,54 @@
+import ast
+
+__all__ = ['Condition']
+
+
+class Condition:
+    """Sensor event condition, parsed and compiled once"""
+
+    # Syntax allowed in conditions: boolean logic, comparisons and arithmetic on numbers and sensor values
+    ALLOWED_NODES = (
+        ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+        ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+        ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+        ast.IfExp, ast.Name, ast.Load, ast.Constant,
+    )
+
+    def __init__(self, source: str, names=()):
+        self.source = source
+        self.names = tuple(names)
+        self._code = self.compile(source, self.names)
+
+    @classmethod
+    def compile(cls, source: str, names=()):
+        """
+        Parse `source`, check that it only uses allowed syntax and names, and return the compiled code.
+        Raise ValueError if the condition is malformed or not allowed.
+        """
+        try:
+            tree = ast.parse(str(source).strip(), mode='eval')
+        except SyntaxError as error:
+            raise ValueError(f"Malformed condition {source!r}: {error.msg}") from error
+        for node in ast.walk(tree):
+            if not isinstance(node, cls.ALLOWED_NODES):
+                raise ValueError(f"Condition {source!r} uses forbidden syntax {type(node).__name__}")
+            if isinstance(node, ast.Name) and node.id not in names:
+                raise ValueError(f"Condition {source!r} uses unknown name {node.id!r} (allowed: {', '.join(names)})")
+            # Sensor values are numbers: strings would only allow comparisons that are always false,
+            # and repeating them ("a" * 10 ** 9) on every sample
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f"Condition {source!r} uses forbidden constant {node.value!r}")
+        return compile(tree, f"<condition {source}>", 'eval')
+
+    def __call__(self, variables: dict) -> bool:
+        """
+        Evaluate the condition with the values of `variables`. A condition whose arithmetic fails
+        (division by a value that is 0, overflow) is false
+        """
+        try:
+            return bool(eval(self._code, {"__builtins__": {}}, variables))  # pylint: disable=eval-used
+        except ArithmeticError:
+            return False
+
+    def __repr__(self):
+        return f"<Condition {self.source!r}>"
@@ -1,9 +1,14 @@
-import threading
-import colorama
-from sensors.sensors import DistanceSensor, MovementSensor, ColorSensor
+import time
+from collections import deque
+from events.conditions import Condition
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
+from runtime.tracing import tracer
 
 __all__ = ['Event', 'SensorEvent']
 
+logger = get_logger("events")
+
 
 class Event():
     """Base class for events"""
@@ -14,6 +19,11 @@ class Event():
         self.name = event_json['name']
         self.delay = event_json['delay']
         self.next = None
+        # Handles of the next event scheduled, one per firing not elapsed yet, in order of firing
+        self._next_handles = deque()
+        # Handle of the firing which elapses last. Replaced rather than modified, so that
+        # other threads (such as the control server) can read it
+        self._last_handle = None
         self.start_actions = []
         self.stop_actions = []
         self.events = []
@@ -31,17 +41,52 @@ class Event():
 
     def fire(self, *args, verbose=False, **kwargs):
         if verbose:
-            print(f"Event {colorama.Fore.CYAN}{self.name}{colorama.Style.RESET_ALL}, id {self.id} fired")
+            logger.debug("Event %s, id %s fired", self.name, self.id, extra={"event": self.id})
+        tracer.mark("event_fire", self.id)
         [action.fire(*args, **kwargs) for action in self.start_actions]
         [action.stop(*args, **kwargs) for action in self.stop_actions]
         [event(*args, **kwargs) for event in self.events]
         [event.start_listening() for event in self.start_listening_events]
         [event.stop_listening() for event in self.stop_listening_events]
-        if self.next:
-            threading.Timer(self.delay, self.next).start()
+        self.schedule_next(self.delay)
 
     emit = fire
 
+    @property
+    def is_pending(self):
+        """True if the next event is scheduled and has not been fired yet. Can be read from any thread"""
+        handle = self._last_handle
+        return handle is not None and not (handle.done or handle.cancelled)
+
+    def schedule_next(self, delay):
+        """
+        Fire the next event in `delay` seconds
+        """
+        if self.next:
+            handles = self._next_handles
+            # The firings elapsed are the first ones
+            while handles and (handles[0].done or handles[0].cancelled):
+                handles.popleft()
+            handle = get_runtime().call_later(delay, self.next)
+            handles.append(handle)
+            last = self._last_handle
+            if last is None or last.done or last.cancelled or handle.when >= last.when:
+                self._last_handle = handle
+
+    def cancel(self):
+        """
+        Cancel the firings of the next event still pending.
+        Return the times (in seconds) that were left before each of them, in order
+        """
+        handles, self._next_handles = self._next_handles, deque()
+        self._last_handle = None
+        now = time.monotonic()
+        remaining = []
+        for handle in sorted(handles, key=lambda handle: handle.when):
+            if handle.cancel():
+                remaining.append(max(0, handle.when - now))
+        return remaining
+
     def __call__(self, *args, **kwargs):
         return self.fire(*args, **kwargs)
 
@@ -52,33 +97,33 @@ class SensorEvent(Event):
     def __init__(self, event_json, sensor, condition="0"):
         super().__init__(event_json)
         self.sensor = sensor
-        self.condition = condition
-        # self.condition = event_json['condition']
+        self.condition = None
+        self.set_condition(condition)
 
-    def new_data_received(self, _instance, new_data, old_data, _property):
-        if self.eval_condition(new_data, old_data):
+    def sensor_updated(self, _sensor):
+        if self.eval_condition():
             self.fire()
 
-    def eval_condition(self, new_data, old_data):
-        # TODO: sensor condition evaluation
-        variables = {}
-        if isinstance(self.sensor, DistanceSensor):
-            variables = {"distance": self.sensor.distance}
-        elif isinstance(self.sensor, MovementSensor):
-            variables = {"movement": self.sensor.movement}
-        elif isinstance(self.sensor, ColorSensor):
-            variables = {"red": self.sensor.red, "green": self.sensor.green, "blue": self.sensor.blue}
-
-        if eval(self.condition, variables):
+    def eval_condition(self):
+        result = self.condition(self.sensor.variables_values)
+        tracer.mark("condition", self.id)
+        if result:
             self.stop_listening()
             return True
         return False
 
     def set_condition(self, cond):
-        self.condition = cond
+        """
+        Compile the condition, only allowing the variables of the sensor.
+        Raise ValueError if the condition is malformed or not allowed.
+        """
+        try:
+            self.condition = Condition(cond, self.sensor.variables)
+        except ValueError as error:
+            raise ValueError(f"Sensor event {self.id}: {error}") from error
 
     def start_listening(self):
-        self.sensor.bind(values=self.new_data_received)
+        self.sensor.subscribe(self)
 
     def stop_listening(self):
-        self.sensor.unbind(self)
+        self.sensor.unsubscribe(self)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import namedtuple
+from sensors.filters import build_filters
+from sensors.sensors import SENSOR_CLASSES
+
+__all__ = ['ScenarioError', 'ScenarioGraph', 'FrozenDict', 'compile_scenario', 'load_scenario']
+
+# Incremented when the compiled form changes, to invalidate cached scenarios
+FORMAT_VERSION = 3
+
+# Keys that each item of the lists of a scenario must have
+REQUIRED_KEYS = {
+    'sensors': ('name', 'type'),
+    'media_channels': ('name', 'content'),
+    'actions': ('id', 'name', 'type', 'action'),
+    'events': ('id', 'name', 'delay'),
+    'sensor_events': ('id', 'name', 'delay', 'sensor', 'condition'),
+}
+
+
+class ScenarioError(ValueError):
+    """Raised when a scenario is invalid, with the list of all the problems found"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__("Invalid scenario:\n  " + "\n  ".join(self.errors))
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict, for the JSON objects of a ScenarioGraph: the actions and events built from a graph keep
+    references to them, and reloading a sketch compares them with the ones of the new graph.
+    Unlike types.MappingProxyType, it can be pickled to the cache and serialized to JSON
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def _freeze(value):
+    """Copy of the JSON `value` with its objects as FrozenDicts and its lists as tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+ScenarioGraph = namedtuple('ScenarioGraph', [
+    'sensors',           # JSON of the sensors (as FrozenDicts and tuples, like all the JSON of the graph)
+    'media_channels',    # JSON of the media channels
+    'actions',           # JSON of the actions, indexed by action index
+    'events',            # JSON of the events then of the sensor events, indexed by event index
+    'nbr_plain_events',  # Number of events which are not sensor events (they come first)
+    'action_index',      # {action id: action index}
+    'event_index',       # {event id: event index}
+    'start_actions',     # For each event, indices of the actions to start
+    'stop_actions',      # For each event, indices of the actions to stop
+    'children',          # For each event, indices of the events fired with it
+    'start_listening',   # For each event, indices of the sensor events to start listening to
+    'stop_listening',    # For each event, indices of the sensor events to stop listening to
+    'next',              # For each event, index of the next event, or -1
+    'first_event',       # Index of the first event
+])
+ScenarioGraph.__doc__ = """Immutable, validated scenario, where events and actions reference each other by index"""
+
+
+def _indices(errors, index, ids, what, context):
+    """Convert `ids` to indices, recording an error for every unknown id"""
+    indices = []
+    for item_id in ids:
+        if item_id in index:
+            indices.append(index[item_id])
+        else:
+            errors.append(f"{context} references unknown {what} {item_id!r}")
+    return tuple(indices)
+
+
+def _find_cycle(children):
+    """
+    Return a list of event indices forming a cycle in `children`, or None.
+    Depth-first search with an explicit stack, so that long chains of child events do not hit the recursion limit
+    """
+    visiting, visited = set(), set()
+    for root in range(len(children)):
+        if root in visited:
+            continue
+        # Path from the root to the current event, and the children of each event of the path left to visit
+        path, stack = [root], [iter(children[root])]
+        visiting.add(root)
+        while stack:
+            for child in stack[-1]:
+                if child in visiting:
+                    return path[path.index(child):] + [child]
+                if child not in visited:
+                    visiting.add(child)
+                    path.append(child)
+                    stack.append(iter(children[child]))
+                    break
+            else:
+                stack.pop()
+                event = path.pop()
+                visiting.discard(event)
+                visited.add(event)
+    return None
+
+
+def _check_items(errors, sketch_json):
+    """Record an error for every list of the scenario which is not a list of objects with the required keys"""
+    for key, required in REQUIRED_KEYS.items():
+        if not isinstance(sketch_json[key], list):
+            errors.append(f"{key!r} must be a list")
+            continue
+        for position, item in enumerate(sketch_json[key]):
+            if not isinstance(item, dict):
+                errors.append(f"Item {position} of {key!r} must be an object")
+                continue
+            missing = [required_key for required_key in required if required_key not in item]
+            if missing:
+                name = item.get('id', item.get('name', position))
+                errors.append(f"Missing {', '.join(map(repr, missing))} in item {name!r} of {key!r}")
+
+
+def compile_scenario(sketch_json) -> ScenarioGraph:
+    """
+    Validate the JSON of a scenario and compile it to a ScenarioGraph.
+    Raise ScenarioError listing all the problems found.
+    """
+    if not isinstance(sketch_json, dict):
+        raise ScenarioError(["The scenario must be an object"])
+    errors = []
+    for key in ('sensors', 'media_channels', 'actions', 'events', 'sensor_events', 'first_event'):
+        if key not in sketch_json:
+            errors.append(f"Missing {key!r}")
+    if errors:
+        raise ScenarioError(errors)
+    _check_items(errors, sketch_json)
+    if errors:
+        raise ScenarioError(errors)
+
+    sensor_names = set()
+    for sensor in sketch_json['sensors']:
+        if sensor['type'] not in SENSOR_CLASSES:
+            errors.append(f"Sensor {sensor['name']!r} has unknown type {sensor['type']!r}")
+        else:
+            try:
+                build_filters(sensor.get('filters', ()), len(SENSOR_CLASSES[sensor['type']].variables))
+            except ValueError as error:
+                errors.append(f"Sensor {sensor['name']!r} has an invalid filter: {error}")
+        sensor_names.add(sensor['name'])
+
+    actions = tuple(sketch_json['actions'])
+    events = tuple(sketch_json['events']) + tuple(sketch_json['sensor_events'])
+    nbr_plain_events = len(sketch_json['events'])
+    action_index, event_index = {}, {}
+    for index, action in enumerate(actions):
+        if action['id'] in action_index:
+            errors.append(f"Duplicate action id {action['id']!r}")
+        action_index[action['id']] = index
+    for index, event in enumerate(events):
+        if event['id'] in event_index:
+            errors.append(f"Duplicate event id {event['id']!r}")
+        event_index[event['id']] = index
+    sensor_event_index = {event['id']: index for index, event in enumerate(events) if index >= nbr_plain_events}
+
+    for event in events[nbr_plain_events:]:
+        if event['sensor'] not in sensor_names:
+            errors.append(f"Sensor event {event['id']!r} references unknown sensor {event['sensor']!r}")
+
+    start_actions, stop_actions, children, start_listening, stop_listening, next_events = [], [], [], [], [], []
+    for event in events:
+        context = f"Event {event['id']!r}"
+        start_actions.append(_indices(errors, action_index, event.get('start_actions', ()), "action", context))
+        stop_actions.append(_indices(errors, action_index, event.get('stop_actions', ()), "action", context))
+        children.append(_indices(errors, event_index, event.get('events', ()), "event", context))
+        start_listening.append(_indices(errors, sensor_event_index, event.get('start_listening', ()), "sensor event", context))
+        stop_listening.append(_indices(errors, sensor_event_index, event.get('stop_listening', ()), "sensor event", context))
+        next_event = event.get('next')
+        if next_event and next_event not in event_index:
+            errors.append(f"{context} references unknown next event {next_event!r}")
+        next_events.append(event_index.get(next_event, -1) if next_event else -1)
+
+    if sketch_json['first_event'] not in event_index:
+        errors.append(f"Unknown first event {sketch_json['first_event']!r}")
+
+    # Child events are fired synchronously with their parent, so a cycle would never end.
+    # Cycles through `next` are fine: they are delayed loops.
+    cycle = _find_cycle(children)
+    if cycle:
+        errors.append("Cycle in child events: " + " -> ".join(repr(events[index]['id']) for index in cycle))
+
+    if errors:
+        raise ScenarioError(errors)
+
+    return ScenarioGraph(
+        sensors=_freeze(sketch_json['sensors']),
+        media_channels=_freeze(sketch_json['media_channels']),
+        actions=_freeze(actions),
+        events=_freeze(events),
+        nbr_plain_events=nbr_plain_events,
+        action_index=FrozenDict(action_index),
+        event_index=FrozenDict(event_index),
+        start_actions=tuple(start_actions),
+        stop_actions=tuple(stop_actions),
+        children=tuple(children),
+        start_listening=tuple(start_listening),
+        stop_listening=tuple(stop_listening),
+        next=tuple(next_events),
+        first_event=event_index[sketch_json['first_event']],
+    )
+
+
+def load_scenario(json_file, cache_directory=None) -> ScenarioGraph:
+    """
+    Load and compile the scenario in `json_file`.
+    If `cache_directory` is given, the compiled scenario is cached there, keyed by the hash of the file,
+    so that loading the same file again skips parsing and validation. Only the last version of each file is kept.
+    """
+    with open(json_file, 'rb') as file:
+        content = file.read()
+    cache_file = None
+    if cache_directory:
+        digest = hashlib.sha256(content).hexdigest()
+        # Prefix of the cached versions of this file
+        prefix = f"scenario-{hashlib.sha256(os.path.abspath(json_file).encode()).hexdigest()[:16]}-"
+        cache_file = os.path.join(cache_directory, f"{prefix}{FORMAT_VERSION}-{digest}.pickle")
+        try:
+            with open(cache_file, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    graph = compile_scenario(json.loads(content))
+    if cache_file:
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            with open(cache_file + ".tmp", 'wb') as file:
+                pickle.dump(graph, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(cache_file + ".tmp", cache_file)
+            for filename in os.listdir(cache_directory):
+                if filename.startswith(prefix) and filename != os.path.basename(cache_file):
+                    os.remove(os.path.join(cache_directory, filename))
+        except OSError:
+            pass
+    return graph
@@ -1,4 +1,4 @@
-import threading
+from runtime.runtime import get_runtime
 
 __all__ = ['Timeline']
 
@@ -7,11 +7,17 @@ class Timeline:
     """docstring for Timeline."""
 
     def __init__(self):
-        self.events_timers = []
+        self.timed_events = []
+        self.handles = []
 
     def add_timed_event(self, time: float, event, *args, **kwargs):
-        self.events_timers.append(threading.Timer(time, event, args=args, kwargs=kwargs))
+        self.timed_events.append((time, event, args, kwargs))
 
     def run(self):
-        for timer in self.events_timers:
-            timer.start()
+        runtime = get_runtime()
+        self.handles = [runtime.call_later(time, event, *args, **kwargs) for time, event, args, kwargs in self.timed_events]
+
+    def cancel(self):
+        for handle in self.handles:
+            handle.cancel()
+        self.handles = []
@@ -0,0 +1,148 @@
+"""
+LED animations, computed for all their LEDs at once on the frame being rendered
+"""
+
+import math
+from abc import ABC, abstractmethod
+from leds.FrameBuffer import parse_color
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['Animation', 'Fade', 'Pulse', 'Chase', 'Wave', 'EASINGS', 'BLENDS', 'ANIMATIONS']
+
+
+# Easing functions, from the progress (0 to 1) to the intensity (0 to 1), applied element-wise
+EASINGS = {
+    "linear": lambda x: x,
+    "ease_in": lambda x: x * x,
+    "ease_out": lambda x: 1 - (1 - x) * (1 - x),
+    "ease_in_out": lambda x: x * x * (3 - 2 * x),
+    "sine": lambda x: .5 - .5 * numpy.cos(math.pi * x),
+}
+
+# Blend modes, combining the colors under a layer (`under`) with the colors of the layer (`over`)
+# applied with the intensity `alpha`
+BLENDS = {
+    "normal": lambda under, over, alpha: under + (over - under) * alpha,
+    "add": lambda under, over, alpha: numpy.minimum(255, under + over * alpha),
+    "max": lambda under, over, alpha: numpy.maximum(under, over * alpha),
+    "multiply": lambda under, over, alpha: under * (1 - alpha + alpha * over / 255),
+}
+
+
+class Animation(ABC):
+    """
+    Base class for animations: a layer of `color` over the LEDs at `positions`, whose intensity varies
+    over each cycle of `duration` seconds. The animation plays `repeat` cycles (0 for forever), layers with
+    a higher `layer` being rendered over the others, and ends with the colors under it unless `persist`,
+    in which case its last frame is kept.
+    """
+
+    def __init__(self, positions, color="#ffffff", duration=1., easing="linear", blend="normal", opacity=1.,
+                 layer=0, repeat=1, persist=False):
+        if numpy is None:
+            raise RuntimeError("The LED animations need NumPy")
+        self.positions = numpy.asarray(positions, dtype=numpy.intp)
+        self.color = numpy.array(parse_color(color), dtype=numpy.float32)
+        self.duration = float(duration)
+        if self.duration <= 0:
+            raise ValueError(f"Animation duration must be positive, not {duration!r}")
+        if easing not in EASINGS:
+            raise ValueError(f"Unknown easing {easing!r} (allowed: {', '.join(EASINGS)})")
+        if blend not in BLENDS:
+            raise ValueError(f"Unknown blend mode {blend!r} (allowed: {', '.join(BLENDS)})")
+        self.easing = easing
+        self.blend = blend
+        self.opacity = float(opacity)
+        self.layer = int(layer)
+        self.repeat = int(repeat)
+        self.persist = bool(persist)
+        self.start_time = None
+        # Index of each LED along the animation, for the animations moving along the LEDs
+        self._indices = numpy.arange(len(self.positions), dtype=numpy.float32)
+
+    def start(self, now: float):
+        self.start_time = now
+
+    def progress(self, now: float):
+        """
+        Progress (0 to 1) in the current cycle at monotonic time `now`, and True if the animation is finished
+        """
+        cycles = max(0., now - self.start_time) / self.duration
+        if self.repeat and cycles >= self.repeat:
+            return 1., True
+        return cycles % 1, False
+
+    @abstractmethod
+    def intensity(self, progress: float):
+        """
+        Intensity (0 to 1) of the layer for each LED, or for all of them, at `progress` in the cycle
+        """
+
+    def render(self, now: float, frame):
+        """
+        Blend the layer into `frame`, a float (LEDs, 3) array. Return True if the animation is finished
+        """
+        progress, finished = self.progress(now)
+        alpha = numpy.clip(EASINGS[self.easing](numpy.asarray(self.intensity(progress), dtype=numpy.float32)), 0, 1)
+        alpha = alpha * self.opacity
+        if alpha.ndim:
+            alpha = alpha[:, None]
+        frame[self.positions] = BLENDS[self.blend](frame[self.positions], self.color, alpha)
+        return finished
+
+    def __repr__(self):
+        return f"<{type(self).__name__} leds={len(self.positions)} duration={self.duration} layer={self.layer}>"
+
+
+class Fade(Animation):
+    """Fade from the colors under the layer to `color`, kept at the end (unless `persist` is false)"""
+
+    def __init__(self, positions, persist=True, **options):
+        super().__init__(positions, persist=persist, **options)
+
+    def intensity(self, progress):
+        return progress
+
+
+class Pulse(Animation):
+    """Rise to `color` during the first half of each cycle, and fall back during the second half"""
+
+    def intensity(self, progress):
+        return 1 - abs(2 * progress - 1)
+
+
+class Chase(Animation):
+    """LED of `color` running along the LEDs once per cycle, followed by a tail of `width` LEDs fading out"""
+
+    def __init__(self, positions, width=3, **options):
+        super().__init__(positions, **options)
+        self.width = max(1., float(width))
+
+    def intensity(self, progress):
+        head = progress * (len(self.positions) + self.width)
+        behind = head - self._indices
+        return numpy.where(behind >= 0, numpy.clip(1 - behind / self.width, 0, 1), 0)
+
+
+class Wave(Animation):
+    """Sine wave of `color` of `wavelength` LEDs (all the LEDs by default) moving along the LEDs once per cycle"""
+
+    def __init__(self, positions, wavelength=None, **options):
+        super().__init__(positions, **options)
+        self.wavelength = float(wavelength) if wavelength else max(1., float(len(self.positions)))
+
+    def intensity(self, progress):
+        return .5 + .5 * numpy.sin(2 * math.pi * (progress - self._indices / self.wavelength))
+
+
+# Animation classes by name, as used in sketches
+ANIMATIONS = {
+    "fade": Fade,
+    "pulse": Pulse,
+    "chase": Chase,
+    "wave": Wave,
+}
@@ -0,0 +1,132 @@
+"""
+Frame scheduler rendering the LED animations at a fixed rate
+"""
+
+import threading
+import time
+from runtime.logs import get_logger
+# pylint: disable=no-name-in-module
+from parameters import LEDS_FPS
+
+__all__ = ['Animator']
+
+logger = get_logger("leds")
+
+
+class Animator:
+    """
+    Render the running animations over the base colors of a LedManager `rate` times per second,
+    from a thread of its own so that rendering never delays the runtime's scheduler, and send the LEDs
+    changed. Frames due while the serial connection is still busy sending the previous ones (given its
+    baudrate) are skipped rather than queued. The thread stops as soon as no animation is running.
+    """
+
+    def __init__(self, leds, rate: float = LEDS_FPS):
+        self.leds = leds
+        self.rate = rate
+        self.animations = []
+        self._thread = None
+        self._ticking = False
+        self._next_frame = 0.
+        # Monotonic time when the serial connection has sent everything written so far
+        self._link_free_at = 0.
+        # The frame without the animations stopped must still be rendered
+        self._pending_frame = False
+        # Metrics
+        self.frames = 0
+        self.frames_skipped = 0
+
+    @property
+    def running(self):
+        """True if frames are being rendered"""
+        return self._ticking
+
+    def start(self, animation):
+        """
+        Start playing `animation`
+        """
+        with self.leds.lock:
+            animation.start(time.monotonic())
+            self.animations.append(animation)
+            # Stable sort: layers are rendered in their order, then in the order they were started
+            self.animations.sort(key=lambda other: other.layer)
+            self._start_ticking()
+
+    def stop(self, animation):
+        """
+        Stop playing `animation`, the colors under it are shown again
+        """
+        with self.leds.lock:
+            if animation in self.animations:
+                self.animations.remove(animation)
+                self._pending_frame = True
+                self._start_ticking()
+
+    def stop_all(self):
+        with self.leds.lock:
+            if self.animations:
+                self.animations = []
+                self._pending_frame = True
+                self._start_ticking()
+
+    def _start_ticking(self):
+        if not self._ticking:
+            self._ticking = True
+            self._next_frame = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="LedAnimatorThread", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """
+        Render the frames until no animation is running. Blocking
+        """
+        try:
+            while True:
+                now = time.monotonic()
+                with self.leds.lock:
+                    if now >= self._link_free_at:
+                        self._render(now)
+                    else:
+                        self.frames_skipped += 1
+                    if not self.animations and not self._pending_frame:
+                        self._ticking = False
+                        return
+                    # Frames are due at fixed times; the ones missed are dropped rather than rendered late
+                    self._next_frame = max(self._next_frame + 1 / self.rate, now)
+                time.sleep(self._next_frame - now)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("LED animations stopped after an error")
+            with self.leds.lock:
+                # They would fail again on every frame
+                self.animations = []
+                self._pending_frame = False
+        finally:
+            # Otherwise no animation could be started again. A new thread may already be rendering
+            with self.leds.lock:
+                if self._thread is threading.current_thread():
+                    self._ticking = False
+
+    def _render(self, now):
+        frame = self.leds.base.astype('float32')
+        finished = [animation for animation in self.animations if animation.render(now, frame)]
+        for animation in finished:
+            self.animations.remove(animation)
+            # The last frame of the animation, over the base colors, becomes the base colors
+            if animation.persist:
+                base = self.leds.base.astype('float32')
+                animation.render(now, base)
+                self.leds.base[animation.positions] = base[animation.positions].round()
+        bytes_written = self.leds.bytes_written
+        self.leds.render(frame)
+        self._pending_frame = False
+        self.frames += 1
+        baudrate = self.leds.baudrate
+        if baudrate:
+            # 10 bits per byte on the wire (start and stop bits)
+            self._link_free_at = max(now, self._link_free_at) + (self.leds.bytes_written - bytes_written) * 10 / baudrate
+
+    def __len__(self):
+        return len(self.animations)
+
+    def __repr__(self):
+        return f"<Animator animations={len(self.animations)} frames={self.frames} skipped={self.frames_skipped}>"
@@ -0,0 +1,111 @@
+"""
+Colors of the LEDs, with the ranges changed since they were last sent
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['FrameBuffer', 'parse_color']
+
+
+def parse_color(color):
+    """
+    Convert a color given as "#rrggbb" or [r, g, b] to a (r, g, b) tuple.
+    Raise ValueError if the color is malformed
+    """
+    if isinstance(color, str):
+        text = color.lstrip("#")
+        if len(text) != 6:
+            raise ValueError(f"Malformed color {color!r}, expected #rrggbb")
+        try:
+            return tuple(int(text[index:index + 2], 16) for index in (0, 2, 4))
+        except ValueError as error:
+            raise ValueError(f"Malformed color {color!r}, expected #rrggbb") from error
+    try:
+        red, green, blue = (int(component) for component in color)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Malformed color {color!r}, expected [r, g, b]") from error
+    if not all(0 <= component <= 255 for component in (red, green, blue)):
+        raise ValueError(f"Color {color!r} has components out of 0-255")
+    return red, green, blue
+
+
+class FrameBuffer:
+    """
+    RGB colors of the LEDs of a LedMap, as a (LEDs, 3) uint8 array. Each strip keeps the range of
+    positions written since the last time it was sent; only the LEDs whose color actually changed
+    in that range are sent.
+    """
+
+    def __init__(self, led_map):
+        if numpy is None:
+            raise RuntimeError("The LEDs need NumPy")
+        self.led_map = led_map
+        self.pixels = numpy.zeros((len(led_map), 3), dtype=numpy.uint8)
+        # Colors last sent to the Arduino
+        self._sent = self.pixels.copy()
+        # For each strip, [first, last + 1] positions written since the last send, or None
+        self._dirty = [None] * len(led_map.strips)
+
+    def _mark(self, positions):
+        """Extend the dirty ranges of the strips of `positions`"""
+        leds, dirty = self.led_map.leds, self._dirty
+        for position in positions:
+            strip = leds[position].strip
+            if dirty[strip] is None:
+                dirty[strip] = [position, position + 1]
+            elif position < dirty[strip][0]:
+                dirty[strip][0] = position
+            elif position >= dirty[strip][1]:
+                dirty[strip][1] = position + 1
+
+    def set(self, positions, color):
+        """
+        Set the LEDs at `positions` to `color` (an (r, g, b) tuple, or an array of one color per position)
+        """
+        if not len(positions):
+            return
+        self.pixels[positions] = color
+        self._mark(positions)
+
+    def get(self, positions):
+        """Colors of the LEDs at `positions`, as an array"""
+        return self.pixels[positions]
+
+    def fill(self, color):
+        """Set all the LEDs to `color`"""
+        self.set(list(range(len(self.pixels))), color)
+
+    @property
+    def is_dirty(self):
+        """True if some LEDs were written since the last send"""
+        return any(dirty is not None for dirty in self._dirty)
+
+    def changes(self):
+        """
+        Return the ranges of LEDs changed since the last call, as (strip id, index of the first LED, colors bytes),
+        and consider them sent. Each strip has at most one range, from its first to its last LED changed.
+        """
+        changes = []
+        for strip_id, dirty in enumerate(self._dirty):
+            if dirty is None:
+                continue
+            self._dirty[strip_id] = None
+            first, last = dirty
+            changed = numpy.flatnonzero(numpy.any(self.pixels[first:last] != self._sent[first:last], axis=1))
+            if not len(changed):
+                continue
+            first, last = first + changed[0], first + changed[-1] + 1
+            self._sent[first:last] = self.pixels[first:last]
+            strip = self.led_map.strips[strip_id]
+            changes.append((strip_id, int(first - strip.offset), self.pixels[first:last].tobytes()))
+        return changes
+
+    def invalidate(self):
+        """
+        Consider that the Arduino lost the colors (reset or reconnected): all the LEDs are sent again
+        """
+        self._sent[:] = ~self.pixels
+        self._dirty = [[strip.offset, strip.offset + strip.length] for strip in self.led_map.strips]
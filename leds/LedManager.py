@@ -0,0 +1,173 @@
+"""
+LEDs of the exhibit, driven by an Arduino from a framebuffer
+"""
+
+import threading
+import serial
+from arduinomanager import BinaryProtocol
+from leds.Animation import ANIMATIONS
+from leds.Animator import Animator
+from leds.FrameBuffer import FrameBuffer, parse_color
+from leds.LedMap import LedMap
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
+# pylint: disable=no-name-in-module
+from parameters import WRITE_WINDOW, LEDS_FPS
+
+__all__ = ['LedManager']
+
+logger = get_logger("leds")
+
+
+class LedManager:
+    """
+    Set the colors of the LEDs by city, by region or by position range. The changes made within `window`
+    seconds are sent together to the Arduino `arduino` (identity), in a single write: LEDS binary frames
+    if the Arduino uses the binary protocol, "leds STRIP INDEX RRGGBB..." commands otherwise. They are queued
+    to the command writer of the Arduino, which writes them from its own thread, after the commands queued
+    before. All the LEDs are sent again every time the Arduino identifies itself.
+    """
+
+    def __init__(self, led_map, arduinos_manager, arduino, window=WRITE_WINDOW, retry_interval=1., fps=LEDS_FPS):
+        self.led_map = led_map if isinstance(led_map, LedMap) else LedMap.load(led_map)
+        self.framebuffer = FrameBuffer(self.led_map)
+        # Colors set by set() and by the animations persisting, under the animations running
+        self.base = self.framebuffer.pixels.copy()
+        self.animator = Animator(self, fps)
+        self._all_positions = list(range(len(self.led_map)))
+        self.arduinos_manager = arduinos_manager
+        self.arduino = arduino
+        self.window = window
+        # Interval (in seconds) between two attempts to send the LEDs while the Arduino is not identified
+        self.retry_interval = retry_interval
+        self._missing = False
+        self.lock = threading.RLock()
+        self._show_handle = None
+        # A reset or reconnected Arduino has lost the colors sent before
+        arduinos_manager.add_identification_callback(arduino, self.invalidate)
+        # Metrics
+        self.writes = 0
+        self.bytes_written = 0
+
+    def positions(self, city=None, region=None, start=None, stop=None):
+        """
+        Positions of the LEDs of a city, of a region, or from position `start` to `stop` (excluded).
+        Raise ValueError if the city or region is unknown
+        """
+        try:
+            return self.led_map.positions(city, region, start, stop)
+        except KeyError as error:
+            raise ValueError(f"Unknown {'city' if city is not None else 'region'} {error}") from error
+
+    def set(self, color, city=None, region=None, start=None, stop=None):
+        """
+        Set the LEDs of a city, of a region or of a range of positions (all the LEDs if none is given) to `color`,
+        given as "#rrggbb" or [r, g, b]
+        """
+        self.set_positions(self.positions(city, region, start, stop), parse_color(color))
+
+    def set_positions(self, positions, colors):
+        """
+        Set the LEDs at `positions` to `colors`: an (r, g, b) tuple, or an array of one color per position
+        """
+        with self.lock:
+            self.base[positions] = colors
+            # While animations run, the animator renders the base colors with the next frame
+            if not self.animator.running:
+                self.framebuffer.set(positions, colors)
+                self._schedule_show()
+
+    def make_animation(self, animation, city=None, region=None, start=None, stop=None, **options):
+        """
+        Create the animation `animation` ("fade", "pulse", "chase" or "wave") of the LEDs of a city, of a region
+        or of a range of positions (all the LEDs if none is given), without starting it.
+        Raise ValueError if the animation or its options are invalid
+        """
+        if animation not in ANIMATIONS:
+            raise ValueError(f"Unknown animation {animation!r} (allowed: {', '.join(ANIMATIONS)})")
+        try:
+            return ANIMATIONS[animation](self.positions(city, region, start, stop), **options)
+        except TypeError as error:
+            raise ValueError(f"Invalid options for animation {animation!r}: {error}") from error
+
+    def animate(self, animation, **options):
+        """
+        Create and start an animation (see make_animation), and return it
+        """
+        animation = self.make_animation(animation, **options)
+        self.animator.start(animation)
+        return animation
+
+    def render(self, frame):
+        """
+        Show `frame`, the colors of all the LEDs as a float (LEDs, 3) array, now. Called by the animator
+        """
+        with self.lock:
+            self.framebuffer.set(self._all_positions, frame.round().astype('uint8'))
+            self.show()
+
+    @property
+    def baudrate(self):
+        """Baudrate of the serial connection of the Arduino, or None if unknown"""
+        linker = self.arduinos_manager.arduinos_by_identity.get(self.arduino)
+        return linker.baudrate if linker is not None else None
+
+    def fill(self, color):
+        self.set(color)
+
+    def clear(self):
+        self.set((0, 0, 0))
+
+    def _schedule_show(self):
+        if not self.window:
+            self.show()
+        elif self._show_handle is None:
+            self._show_handle = get_runtime().call_later(self.window, self.show)
+
+    def show(self):
+        """
+        Send the LEDs changed to the Arduino now
+        """
+        with self.lock:
+            self._show_handle = None
+            if not self.framebuffer.is_dirty:
+                return
+            linker = self.arduinos_manager.arduinos_by_identity.get(self.arduino)
+            if linker is None:
+                # Everything will be sent once the Arduino is there
+                self.framebuffer.invalidate()
+                if not self._missing:
+                    logger.warning("Arduino %s not identified, LEDs not sent", self.arduino,
+                                   extra={"identity": self.arduino})
+                self._missing = True
+                self._show_handle = get_runtime().call_later(self.retry_interval, self.show)
+                return
+            self._missing = False
+            changes = self.framebuffer.changes()
+            if not changes:
+                return
+            try:
+                if linker.binary:
+                    data = b"".join(BinaryProtocol.encode_leds(strip, start, colors) for strip, start, colors in changes)
+                    linker.send_bytes(data)
+                    self.bytes_written += len(data)
+                else:
+                    for strip, start, colors in changes:
+                        linker.send_command("leds", strip, start, colors.hex())
+                        self.bytes_written += len(f"leds {strip} {start} {colors.hex()}\n")
+            except (OSError, serial.SerialException) as error:
+                self.framebuffer.invalidate()
+                logger.error("LEDs not sent to %s: %s", self.arduino, error, extra={"identity": self.arduino})
+                return
+            self.writes += 1
+
+    def invalidate(self):
+        """
+        Send all the LEDs again, after the Arduino was reset or reconnected
+        """
+        with self.lock:
+            self.framebuffer.invalidate()
+            self._schedule_show()
+
+    def __repr__(self):
+        return f"<LedManager arduino={self.arduino} leds={len(self.led_map)} writes={self.writes}>"
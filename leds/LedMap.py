@@ -0,0 +1,79 @@
+"""
+Map of the LEDs of the exhibit, loaded from leds.json
+"""
+
+import json
+from collections import namedtuple
+
+__all__ = ['Led', 'Strip', 'LedMap']
+
+# LED of the map: `position` is its index in the whole map (and in the framebuffer),
+# `index` its index on its strip
+Led = namedtuple('Led', ['city', 'region', 'strip', 'index', 'position'])
+
+# LED strip: its LEDs are positions `offset` to `offset + length` of the map
+Strip = namedtuple('Strip', ['id', 'region', 'offset', 'length'])
+
+
+class LedMap:
+    """
+    LEDs indexed by city, by region and by position. leds.json lists [city, region, index] triples;
+    consecutive LEDs of a region with increasing indices form a strip, and a region whose indices
+    start again from 0 continues on another strip.
+    """
+
+    def __init__(self, entries):
+        self.leds = []
+        self.strips = []
+        self.by_city = {}
+        self.by_region = {}
+        for position, (city, region, index) in enumerate(entries):
+            strip = self.strips[-1] if self.strips else None
+            if strip is None or strip.region != region or index != strip.length:
+                if index != 0:
+                    raise ValueError(f"LED {city or position!r} of {region} should be the first of its strip (index 0), not {index}")
+                strip = Strip(len(self.strips), region, position, 0)
+                self.strips.append(strip)
+            self.strips[-1] = strip._replace(length=strip.length + 1)
+            led = Led(city, region, strip.id, index, position)
+            self.leds.append(led)
+            # Some LEDs have no city
+            if city:
+                if city in self.by_city:
+                    raise ValueError(f"City {city!r} has several LEDs")
+                self.by_city[city] = position
+            self.by_region.setdefault(region, []).append(position)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load the map from a JSON file
+        """
+        with open(filename, encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    @property
+    def regions(self):
+        """Names of the regions"""
+        return list(self.by_region)
+
+    def positions(self, city=None, region=None, start=None, stop=None):
+        """
+        Positions of the LEDs of a city, of a region, or from position `start` to `stop` (excluded).
+        Raise KeyError if the city or region is unknown
+        """
+        if city is not None:
+            return [self.by_city[city]]
+        if region is not None:
+            return self.by_region[region]
+        return list(range(len(self.leds)))[start:stop]
+
+    def strip_of(self, position):
+        """Strip of the LED at `position`"""
+        return self.strips[self.leds[position].strip]
+
+    def __len__(self):
+        return len(self.leds)
+
+    def __repr__(self):
+        return f"<LedMap leds={len(self.leds)} strips={len(self.strips)} regions={len(self.by_region)}>"
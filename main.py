@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 import sys
 import os
-import time
 from Sketch import Sketch
+from cluster.ClusterNode import ClusterNode
 from parameters import PARAMETERS
+from runtime.logs import setup_logging
 
 
 # Setting working directory
 if 'WORKING_DIRECTORY' in PARAMETERS:
     os.chdir(PARAMETERS['WORKING_DIRECTORY'])
 
+setup_logging(PARAMETERS['LOG_LEVEL'], PARAMETERS['LOG_LEVELS'], PARAMETERS['LOG_JSONL'], rate=PARAMETERS['LOG_RATE'])
+
+# Node of a cluster: no sketch, the Arduinos and channels of this Pi are driven by the coordinator
+if PARAMETERS['CLUSTER_ROLE'] == "node":
+    node = ClusterNode()
+    node.start()
+    node.wait()
+    sys.exit(0)
+
 if len(sys.argv) <= 1 and 'SKETCH' not in PARAMETERS:
     print(f"Usage: {sys.argv[0]} json_sketch_file.json")
     sys.exit(1)
@@ -23,6 +33,6 @@ if not os.path.isfile(json_sketch_file):
     sys.exit(2)
 
 sketch = Sketch(json_sketch_file)
-print(f"Waiting {PARAMETERS['DELAY']} seconds before launching sketch...", end="\n\n")
-time.sleep(PARAMETERS['DELAY'])
+print(f"Waiting up to {PARAMETERS['DELAY']} seconds for the Arduinos before launching sketch...", end="\n\n")
+sketch.wait_for_arduinos(timeout=PARAMETERS['DELAY'])
 sketch.run()
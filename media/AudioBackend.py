@@ -0,0 +1,140 @@
+"""
+Interface of the audio backends doing the actual playback under MediaPlayer
+"""
+
+import importlib
+import threading
+from abc import ABC, abstractmethod
+
+__all__ = ['AudioBackend', 'BackendPlayer', 'get_backend', 'BACKENDS']
+
+
+class AudioBackend(ABC):
+    """
+    Base class for audio backends: a backend parses the medias, and creates the players playing them.
+    One backend is shared by all the players of the program. A backend not implementing all the abstract
+    methods cannot be instantiated.
+    """
+
+    @abstractmethod
+    def parse(self, filename: str):
+        """
+        Parse the media `filename`, and return it along with its duration in seconds (0 if unknown)
+        """
+
+    @abstractmethod
+    def create_player(self):
+        """
+        Return a new BackendPlayer
+        """
+
+    def close(self):
+        """
+        Release the resources of the backend
+        """
+
+
+class BackendPlayer(ABC):
+    """
+    Playback of a playlist by an audio backend. Volumes, fades and autofades are handled above it by MediaPlayer
+    """
+
+    @abstractmethod
+    def set_volume(self, volume: int) -> bool:
+        """Set the volume, from 0 to 100. Return True if it was set"""
+
+    @abstractmethod
+    def set_mute(self, muted: bool):
+        """Mute or unmute the playback"""
+
+    @abstractmethod
+    def toggle_mute(self):
+        """Mute the playback if not muted, unmute it otherwise"""
+
+    @abstractmethod
+    def add_media(self, media):
+        """Add a media (as returned by AudioBackend.parse) or a filename at the end of the playlist"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of medias in the playlist"""
+
+    @abstractmethod
+    def item_at_index(self, index):
+        """Media at `index` in the playlist"""
+
+    @abstractmethod
+    def reset_playlist(self):
+        """Stop the playback and empty the playlist"""
+
+    @abstractmethod
+    def play(self):
+        """Play, or resume, the current media"""
+
+    @abstractmethod
+    def stop(self):
+        """Stop the playback"""
+
+    @abstractmethod
+    def pause(self):
+        """Pause the playback"""
+
+    @abstractmethod
+    def next(self):
+        """Play the next media of the playlist"""
+
+    @abstractmethod
+    def previous(self):
+        """Play the previous media of the playlist"""
+
+    @abstractmethod
+    def play_item_at_index(self, index: int):
+        """Play the media at `index` in the playlist"""
+
+    @abstractmethod
+    def is_playing(self) -> bool:
+        """True if a media is playing"""
+
+    @abstractmethod
+    def set_loop(self, loopmode: str):
+        """"loop" to play the playlist again and again, "repeat" to play the current media again and again"""
+
+    @abstractmethod
+    def length(self) -> float:
+        """Duration of the current media in seconds, 0 if unknown"""
+
+    @abstractmethod
+    def position(self) -> float:
+        """Position in the current media in seconds"""
+
+    @abstractmethod
+    def set_transition_callback(self, callback):
+        """
+        Call `callback(True)` when a media starts playing or its length becomes known, and `callback(False)`
+        when the playback pauses, stops or reaches the end. The callback may be called from any thread.
+        None to stop calling it.
+        """
+
+
+# Backend classes by name, as (module, class) imported when the backend is first used
+BACKENDS = {
+    "vlc": ("media.VLCBackend", "VLCBackend"),
+    "mixer": ("media.MixerBackend", "MixerBackend"),
+    "null": ("media.NullBackend", "NullBackend"),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str) -> AudioBackend:
+    """
+    Return the backend `name` ("vlc", "mixer" or "null"), creating it the first time
+    """
+    with _backends_lock:
+        if name not in _backends:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown audio backend {name!r} (allowed: {', '.join(BACKENDS)})")
+            module, class_name = BACKENDS[name]
+            _backends[name] = getattr(importlib.import_module(module), class_name)()
+        return _backends[name]
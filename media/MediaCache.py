@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from media.MediaPlayer import MediaPlayer
+
+__all__ = ['MediaCache']
+
+
+class MediaCache:
+    """
+    Parsed medias and their durations, and a pool of at most `max_players` one-shot players reused
+    from one sound to another. Used from the runtime and from the event loop, so the pool is locked.
+    """
+
+    def __init__(self, backend, max_players: int = 8):
+        # Audio backend parsing the medias and playing them
+        self.backend = backend
+        self.max_players = max_players
+        self.medias = {}
+        self.durations = {}
+        # Players in the pool, least recently used first, as {id(player): [filename, player, busy_until]}
+        # busy_until being the monotonic time until which the player is playing its media
+        self._players = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_loaded(self, filename: str) -> bool:
+        """True if the media has already been parsed"""
+        return filename in self.medias
+
+    def load(self, filename: str):
+        """Parse a media, if not already done, and return it along with its duration in seconds"""
+        if filename not in self.medias:
+            # Parsed without the lock, which would otherwise wait for the file to be read
+            media, duration = self.backend.parse(filename)
+            with self._lock:
+                self.medias.setdefault(filename, media)
+                self.durations.setdefault(filename, duration)
+        return self.medias[filename], self.durations[filename]
+
+    def preload(self, filenames):
+        """Parse all the medias in `filenames`"""
+        for filename in filenames:
+            self.load(filename)
+
+    @staticmethod
+    def _is_idle(busy_until: float, player: MediaPlayer) -> bool:
+        return time.monotonic() >= busy_until and not player.is_playing()
+
+    def acquire(self, filename: str):
+        """
+        Return an idle player loaded with the media `filename`, along with the media duration.
+        The player is considered busy for the duration of the media. If all the players of a full pool
+        are busy, the least recently used one is stopped and reused.
+        """
+        media, duration = self.load(filename)
+        with self._lock:
+            return self._acquire(filename, media, duration)
+
+    def _acquire(self, filename, media, duration):
+        idle = [key for key, (_filename, player, busy_until) in self._players.items() if self._is_idle(busy_until, player)]
+        # Prefer an idle player already loaded with the media, then the least recently used idle player
+        loaded = [key for key in idle if self._players[key][0] == filename]
+        if loaded:
+            key = loaded[0]
+            player = self._players[key][1]
+        else:
+            if idle:
+                key = idle[0]
+                player = self._players[key][1]
+            elif len(self._players) < self.max_players:
+                player = MediaPlayer(backend=self.backend)
+                key = id(player)
+            else:
+                key, (_filename, player, _busy_until) = next(iter(self._players.items()))
+                player.stop()
+            player.reset_playlist()
+            player.add_media(media)
+        self._players[key] = [filename, player, time.monotonic() + duration]
+        self._players.move_to_end(key)
+        return player, duration
+
+    def __len__(self):
+        return len(self._players)
@@ -1,23 +1,43 @@
 import threading
-import vlc
+from media.AudioBackend import get_backend
+from media.MediaCache import MediaCache
 from media.MediaPlayer import MediaPlayer
+from runtime.logs import get_logger
+from runtime.runtime import get_runtime
+from runtime.tracing import tracer
+# pylint: disable=no-name-in-module
+from parameters import MEDIA_BACKEND
 
 __all__ = ['MediaManager']
 
+logger = get_logger("media")
+
 
 class MediaManager:
     """docstring for MediaManager."""
 
-    def __init__(self):
+    def __init__(self, backend: str = MEDIA_BACKEND):
         self.players = {}
-
-    def add_channel(self, name: str):
+        # "vlc" (a libVLC player per channel), "mixer" (all the channels mixed in-process)
+        # or "null" (no audio output)
+        self.backend = get_backend(backend)
+        # Parsed sounds and pool of players for play_now
+        self.cache = MediaCache(self.backend)
+
+    def add_channel(self, name: str, backend=None):
+        """
+        Add a channel played by `backend`, the backend of the manager by default (a RemoteBackend plays it on a node)
+        """
         if name in self.players.keys():
             raise ValueError("A channel already exists with that name")
-        self.players[name] = MediaPlayer()
+        self.players[name] = MediaPlayer(backend=backend or self.backend)
+
+    def remove_channel(self, name: str):
+        self.players.pop(name).stop()
 
     def play(self, channel: str):
         self.players[channel].play()
+        tracer.mark("media_play", channel)
 
     def pause(self, channel: str):
         self.players[channel].pause()
@@ -34,19 +54,32 @@ class MediaManager:
     def stop_all(self):
         [channel.stop() for channel in self.players.values()]
 
+    def preload(self, sound_filenames):
+        self.cache.preload(sound_filenames)
+
     def play_now(self, sound_filename, volume: int = 100, other_channels_volume: int = None, fade_time: float = 0):
-        player = MediaPlayer()
+        # A sound not preloaded is parsed from another thread, so that reading it does not block the runtime
+        if not self.cache.is_loaded(sound_filename):
+            threading.Thread(target=self._load_and_play, name="MediaLoaderThread", daemon=True,
+                             args=(sound_filename, volume, other_channels_volume, fade_time)).start()
+            return
+        player, duration = self.cache.acquire(sound_filename)
         player.volume = volume
-        media = vlc.Media(sound_filename)
-        media.parse()
-        duration = media.get_duration() / 1000
-        player.add_media(media)
         if other_channels_volume is not None:
             self.fade_all_channels(other_channels_volume, fade_time, duration)
-        player.play()
+        player.play_item_at_index(0)
+        tracer.mark("media_play", sound_filename)
+
+    def _load_and_play(self, sound_filename, *args):
+        try:
+            self.cache.load(sound_filename)
+        except (OSError, ValueError) as error:
+            logger.error("Cannot load %s: %s", sound_filename, error, extra={"filename": sound_filename})
+            return
+        get_runtime().call_soon(self.play_now, sound_filename, *args)
 
-    def set_volume(self, channel: str, volume: int, fade_time: float = 0):
-        self.players[channel].fade(fade_time, volume)
+    def set_volume(self, channel: str, volume: int, fade_time: float = 0, curve: str = "linear"):
+        self.players[channel].fade(fade_time, volume, curve)
 
     def set_all_volumes(self, volume: int = 100, fade_time: float = 0):
         for channel in self.players:
@@ -55,9 +88,9 @@ class MediaManager:
     reset_all_volumes = set_all_volumes
 
     def fade_channel(self, channel: str, volume: int, fade_time: float, duration: float):
-        previous_volume = self[channel].volume
+        previous_volume = self[channel].target_volume
         self.set_volume(channel, volume, fade_time)
-        threading.Timer(duration, self.set_volume, args=(channel, previous_volume, fade_time)).start()
+        get_runtime().call_later(duration, self.set_volume, channel, previous_volume, fade_time)
 
     def fade_channels(self, channels: list, *args, **kwargs):
         for channel in channels:
@@ -73,7 +106,7 @@ class MediaManager:
             else:
                 player.fade(fade_time, low_volume)
         if duration:
-            threading.Timer(duration, self.set_all_volumes, kwargs={"fade_time":fade_time}).start()
+            get_runtime().call_later(duration, self.set_all_volumes, fade_time=fade_time)
 
     def __getitem__(self, item):
         return self.players[item]
@@ -6,123 +6,124 @@ pygame
 pymedia
 """
 
-import threading
-import time
-import vlc
+from media.AudioBackend import get_backend
+from media.VolumeAutomation import automation
+from runtime.runtime import get_runtime
+# pylint: disable=no-name-in-module
+from parameters import MEDIA_BACKEND
 
 __all__ = ['MediaPlayer']
 
 
 class MediaPlayer:
+    """
+    Playlist with volume, fades and autofades, played by a player of an audio backend (VLC, mixer or null)
+    """
     # pylint: disable=too-many-instance-attributes
-    def __init__(self, autofade: bool = False, fading_time: float = 0):
+    def __init__(self, autofade: bool = False, fading_time: float = 0, backend=None):
         super().__init__()
-        self._medialist = vlc.MediaList()
-        self._medialistplayer = vlc.MediaListPlayer()
-        self._medialistplayer.set_media_list(self._medialist)
-        self._player = self._medialistplayer.get_media_player()
+        self._backend = backend or get_backend(MEDIA_BACKEND)
+        self._player = self._backend.create_player()
 
-        # Setting default volume level to 100
+        # Setting default volume level to 100. The volume is kept here rather than read from the backend,
+        # VLC returning -1 when nothing is playing
+        self._volume = 0
         self.volume = self._old_volume = 100
         # Fading time, in seconds
         self.fading_time = fading_time
         # Auto fading between songs
+        self._autofade_handle = None
+        self._autofadeEnabled = False
         self.autofade = autofade
-        self._autofade_thread = None
+
+    @property
+    def backend(self):
+        """Audio backend playing the medias"""
+        return self._backend
 
     @property
     def volume(self) -> int:
-        return self._player.audio_get_volume()
+        return self._volume
 
     @volume.setter
     def volume(self, volume: int):
+        automation.cancel(self)
         self.set_volume(volume)
 
+    @property
+    def target_volume(self) -> int:
+        """Volume the player is fading to, or its current volume if it is not fading"""
+        return automation.target(self)
+
     def set_volume(self, volume: int) -> bool:
-        return not self._player.audio_set_volume(volume)
+        self._volume = volume
+        return self._player.set_volume(volume)
 
     def toggle_mute(self):
-        self._player.audio_toggle_mute()
+        self._player.toggle_mute()
 
     def mute(self):
-        self._player.audio_set_mute(True)
+        self._player.set_mute(True)
 
     def unmute(self):
-        self._player.audio_set_mute(False)
+        self._player.set_mute(False)
 
-    def add_media(self, filename: str):
-        self._medialist.add_media(filename)
+    def add_media(self, media):
+        self._player.add_media(media)
 
     @property
     def queue_length(self) -> int:
-        return self._medialist.count()
+        return self._player.count()
 
     def __len__(self):
-        return self.queue_length()
+        return self.queue_length
 
     def reset_playlist(self):
-        self._medialist = vlc.MediaList()
-        self._medialistplayer.set_media_list(self._medialist)
+        self._player.reset_playlist()
 
     def play(self):
-        self._medialistplayer.play()
+        self._player.play()
 
     def stop(self):
-        self._medialistplayer.stop()
+        self._player.stop()
 
     def pause(self):
-        self._medialistplayer.pause()
+        self._player.pause()
 
     def next(self):
-        self._medialistplayer.next()
+        self._player.next()
 
     def previous(self):
-        self._medialistplayer.previous()
+        self._player.previous()
 
     def play_item_at_index(self, index):
-        self._medialistplayer.play_item_at_index(index)
+        self._player.play_item_at_index(index)
 
     def is_playing(self) -> bool:
-        return bool(self._player.is_playing())
+        return self._player.is_playing()
 
     def set_loop(self, loopmode: str):
-        if loopmode == "loop":
-            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.loop)
-        elif loopmode == "repeat":
-            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.repeat)
-        else:
-            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.default)
-
-    def _fade(self, fading_time: float, volume: int, verbose: bool = False):
-        if self.volume == volume:
-            return
+        self._player.set_loop(loopmode)
+
+    def fade(self, fading_time: float, volume: int, curve: str = "linear", on_done=None):
+        """
+        Fade the volume to `volume` in `fading_time` seconds, then call `on_done` if given.
+        A new fade (or volume change) cancels the current one.
+        """
         if fading_time == 0:
             self.volume = volume
+            if on_done:
+                on_done()
             return
-        volume_diff = volume - self.volume
-        while self.volume != volume:
-            self.volume += (1 if volume_diff > 0 else -1)
-            if verbose: print(f"Volume = {self.volume}")
-            time.sleep(abs(fading_time / volume_diff))
-        if verbose: print(f"Volume = {self.volume}")
-
-    def fade(self, *args, **kwargs):
-        threading.Thread(target=self._fade, args=args, kwargs=kwargs).start()
+        automation.ramp(self, volume, fading_time, curve, on_done)
 
-    def _fade_and_pause(self, fading_time: float):
-        self._fade(fading_time, 0)
-        self.pause()
+    def fade_and_pause(self, fading_time: float, curve: str = "linear"):
+        self.fade(fading_time, 0, curve, on_done=self.pause)
 
-    def fade_and_pause(self, *args, **kwargs):
-        threading.Thread(target=self._fade_and_pause, args=args, kwargs=kwargs).start()
-
-    def _fade_and_play(self, fading_time: float):
+    def fade_and_play(self, fading_time: float, curve: str = "linear"):
         # p.volume = 0
         self.play()
-        self._fade(fading_time, 100)
-
-    def fade_and_play(self, *args, **kwargs):
-        threading.Thread(target=self._fade_and_play, args=args, kwargs=kwargs).start()
+        self.fade(fading_time, 100, curve)
 
     @property
     def autofade(self) -> bool:
@@ -130,38 +131,65 @@ class MediaPlayer:
 
     @autofade.setter
     def autofade(self, value: bool):
-        if value:
+        if value and not self._autofadeEnabled:
             self._autofadeEnabled = True
             self.start_autofade()
-        else:
+        elif not value and self._autofadeEnabled:
             self._autofadeEnabled = False
-
-    def _autofade(self):
-        while self.autofade:
-            if self._player.get_length() != -1 and self._player.get_time() != -1 and self.is_playing():
-                if (self._player.get_length() - self._player.get_time()) / 1000 < self.fading_time:
-                    self._old_volume = self.volume
-                    self._fade(self.fading_time, 0)
-                elif self._player.get_time() / 1000 < self.fading_time:
-                    self.volume = 0
-                    self._fade(self.fading_time, self._old_volume)
+            self.stop_autofade()
 
     def start_autofade(self):
-        self._autofade_thread = threading.Thread(target=self._autofade)
-        self._autofade_thread.start()
+        """
+        Fade in at the beginning of each media and fade out at its end. The fades are scheduled
+        from the transitions reported by the backend and the media length, so nothing runs between two transitions.
+        """
+        self._player.set_transition_callback(self._autofade_event)
+
+    def stop_autofade(self):
+        self._player.set_transition_callback(None)
+        self._cancel_autofade()
+
+    def _autofade_event(self, started: bool):
+        # Called from a backend thread, which must not call the backend back: handle the event from the runtime
+        get_runtime().call_soon(self._schedule_autofade if started else self._cancel_autofade)
+
+    def _cancel_autofade(self):
+        if self._autofade_handle:
+            self._autofade_handle.cancel()
+            self._autofade_handle = None
+
+    def _schedule_autofade(self):
+        self._cancel_autofade()
+        if not self.autofade or not self.is_playing():
+            return
+        length = self._player.length()
+        position = self._player.position()
+        if length <= 0:
+            return
+        # Beginning of a media: fade in
+        if position < self.fading_time and not automation.is_ramping(self):
+            self.volume = 0
+            self.fade(self.fading_time, self._old_volume)
+        self._autofade_handle = get_runtime().call_later(
+            max(0, length - position - self.fading_time), self._autofade_out
+        )
+
+    def _autofade_out(self):
+        self._autofade_handle = None
+        self._old_volume = self.target_volume
+        self.fade(self.fading_time, 0)
+
+    def play_media(self, media_index, transition_time: float = 0, curve: str = "linear"):
+        old_volume = self.target_volume
 
-    def _play_media(self, media_index, transition_time: float = 0):
-        old_volume = self.volume
-        self._fade(transition_time, 0)
-        self.play_item_at_index(media_index)
-        self._fade(transition_time, 0)
-        self._fade(transition_time, old_volume)
+        def fade_in():
+            self.play_item_at_index(media_index)
+            self.fade(transition_time, old_volume, curve)
 
-    def play_media(self, *args, **kwargs):
-        threading.Thread(target=self._play_media, args=args, kwargs=kwargs).start()
+        self.fade(transition_time, 0, curve, on_done=fade_in)
 
     def __del__(self):
         self.autofade = False
 
     def __getitem__(self, item):
-        return self._medialist.item_at_index(item)
+        return self._player.item_at_index(item)
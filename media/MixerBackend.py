@@ -0,0 +1,352 @@
+"""
+Audio backend decoding WAV medias into memory and mixing all the players in-process with NumPy,
+into a single output stream
+"""
+
+import shutil
+import subprocess
+import threading
+import time
+import wave
+import weakref
+from collections import namedtuple
+from media.AudioBackend import AudioBackend, BackendPlayer
+from runtime.logs import get_logger
+# pylint: disable=no-name-in-module
+from parameters import MIXER_RATE, MIXER_BLOCK
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import sounddevice
+except (ImportError, OSError):
+    sounddevice = None
+
+__all__ = ['MixerBackend', 'MixerPlayer', 'MixerMedia']
+
+logger = get_logger("media")
+
+# Errors of the output stream, after which it is opened again
+OUTPUT_ERRORS = (OSError, ValueError) + ((sounddevice.PortAudioError,) if sounddevice is not None else ())
+# Seconds to wait before opening the output stream again
+RESTART_DELAY = 1.
+
+# Decoded media, `samples` being an int16 array of (frames, 2) at the rate of the mixer
+MixerMedia = namedtuple('MixerMedia', ['filename', 'samples'])
+
+
+class MixerPlayer(BackendPlayer):
+    """Playlist played by reading its decoded medias block by block, when the mixer asks for them"""
+
+    def __init__(self, mixer):
+        self._mixer = mixer
+        self._lock = threading.Lock()
+        self._medias = []
+        self._index = 0
+        # Position in the current media, in frames
+        self._frame = 0
+        self._playing = False
+        self._gain = 1.
+        self._muted = False
+        self._loop = "default"
+        self._transition_callback = None
+
+    def set_volume(self, volume: int) -> bool:
+        self._gain = max(0, volume) / 100
+        return True
+
+    def set_mute(self, muted: bool):
+        self._muted = muted
+
+    def toggle_mute(self):
+        self._muted = not self._muted
+
+    def add_media(self, media):
+        if isinstance(media, str):
+            media, _duration = self._mixer.parse(media)
+        with self._lock:
+            self._medias.append(media)
+
+    def count(self) -> int:
+        return len(self._medias)
+
+    def item_at_index(self, index):
+        return self._medias[index]
+
+    def reset_playlist(self):
+        with self._lock:
+            self._medias = []
+            self._index = 0
+            self._frame = 0
+            self._playing = False
+
+    def play(self):
+        with self._lock:
+            started = bool(self._medias) and not self._playing
+            self._playing = bool(self._medias)
+        if started:
+            self._notify(True)
+
+    def stop(self):
+        with self._lock:
+            stopped = self._playing
+            self._playing = False
+            self._index = 0
+            self._frame = 0
+        if stopped:
+            self._notify(False)
+
+    def pause(self):
+        with self._lock:
+            paused = self._playing
+            self._playing = False
+        if paused:
+            self._notify(False)
+
+    def next(self):
+        self.play_item_at_index(self._index + 1)
+
+    def previous(self):
+        self.play_item_at_index(self._index - 1)
+
+    def play_item_at_index(self, index: int):
+        with self._lock:
+            if not 0 <= index < len(self._medias):
+                return
+            self._index = index
+            self._frame = 0
+            self._playing = True
+        self._notify(True)
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def set_loop(self, loopmode: str):
+        self._loop = loopmode
+
+    def length(self) -> float:
+        medias = self._medias
+        return len(medias[self._index].samples) / self._mixer.rate if self._index < len(medias) else 0.
+
+    def position(self) -> float:
+        return self._frame / self._mixer.rate
+
+    def set_transition_callback(self, callback):
+        self._transition_callback = callback
+
+    def _notify(self, started: bool):
+        if self._transition_callback is not None:
+            self._transition_callback(started)
+
+    def _media_ended(self):
+        """
+        Go to the next media according to the loop mode, with the lock held.
+        Return True if a new media started, False if the playback stopped
+        """
+        self._frame = 0
+        if self._loop == "repeat":
+            return True
+        self._index += 1
+        if self._index < len(self._medias):
+            return True
+        self._index = 0
+        if self._loop == "loop":
+            return True
+        self._playing = False
+        return False
+
+    def mix_into(self, mix):
+        """
+        Add the next block of the playlist, at the volume of the player, to the float32 array `mix` of
+        (frames, 2). Called by the mixer thread.
+        """
+        transitions = []
+        with self._lock:
+            if not self._playing:
+                return
+            gain = 0. if self._muted else self._gain / 32768
+            filled, frames = 0, len(mix)
+            while filled < frames and self._playing:
+                samples = self._medias[self._index].samples
+                chunk = samples[self._frame:self._frame + frames - filled]
+                if gain:
+                    mix[filled:filled + len(chunk)] += chunk * gain
+                filled += len(chunk)
+                self._frame += len(chunk)
+                if self._frame >= len(samples):
+                    transitions.append(self._media_ended())
+                    if not samples.size:
+                        break
+        for started in transitions:
+            self._notify(started)
+
+
+class MixerBackend(AudioBackend):
+    """
+    Backend mixing all its players into one output stream, from one thread, instead of running a libVLC
+    instance per player. The medias must be WAV files, they are decoded once and kept in memory.
+    The output is written with sounddevice if installed, or piped to aplay otherwise.
+    """
+
+    def __init__(self, rate: int = MIXER_RATE, block: int = MIXER_BLOCK):
+        if numpy is None:
+            raise RuntimeError("The mixer audio backend needs NumPy")
+        self.rate = rate
+        # Frames mixed at a time: the latency of volume changes and new sounds is about a block
+        self.block = block
+        self.medias = {}
+        self.underruns = 0
+        # Players, as weak references so that the players released by their owner are dropped
+        self._players = []
+        self._lock = threading.Lock()
+        self._mix = numpy.zeros((block, 2), dtype=numpy.float32)
+        self._running = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def parse(self, filename: str):
+        with self._lock:
+            media = self.medias.get(filename)
+        if media is None:
+            media = MixerMedia(filename, self._decode(filename))
+            with self._lock:
+                self.medias[filename] = media
+        return media, len(media.samples) / self.rate
+
+    def _decode(self, filename):
+        """
+        Read a WAV file, and return its samples as an int16 array of (frames, 2) at the rate of the mixer
+        """
+        try:
+            with wave.open(filename, 'rb') as wav:
+                channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+                data = wav.readframes(wav.getnframes())
+        except (wave.Error, EOFError) as error:
+            raise ValueError(f"The mixer cannot decode {filename} (only WAV files are supported): {error}") from error
+        if width == 1:
+            samples = (numpy.frombuffer(data, numpy.uint8).astype(numpy.int16) - 128) << 8
+        elif width == 2:
+            samples = numpy.frombuffer(data, '<i2')
+        elif width == 4:
+            samples = (numpy.frombuffer(data, '<i4') >> 16).astype(numpy.int16)
+        else:
+            raise ValueError(f"The mixer cannot decode {filename}: unsupported sample width {width}")
+        samples = samples.reshape(-1, channels)
+        samples = numpy.repeat(samples, 2, axis=1) if channels == 1 else samples[:, :2]
+        if rate != self.rate and len(samples):
+            positions = numpy.arange(0, len(samples) - 1, rate / self.rate)
+            samples = numpy.stack([numpy.interp(positions, numpy.arange(len(samples)), samples[:, channel])
+                                   for channel in range(2)], axis=1)
+        return numpy.ascontiguousarray(samples, dtype=numpy.int16)
+
+    def create_player(self):
+        """
+        Return a new MixerPlayer, starting the mixing thread if it is not running
+        """
+        player = MixerPlayer(self)
+        with self._lock:
+            self._players = [reference for reference in self._players if reference() is not None]
+            self._players.append(weakref.ref(player))
+            start = not self._running
+            self._running = True
+        if start:
+            self.start()
+        return player
+
+    def _has_players(self) -> bool:
+        """
+        Drop the players released by their owner. If none remains, stop running and return False
+        """
+        with self._lock:
+            self._players = [reference for reference in self._players if reference() is not None]
+            if not self._players:
+                self._running = False
+            return self._running
+
+    def render(self):
+        """
+        Mix the next block of all the players, and return it as int16 stereo bytes
+        """
+        mix = self._mix
+        mix.fill(0)
+        for reference in self._players:
+            player = reference()
+            if player is not None:
+                player.mix_into(mix)
+        numpy.clip(mix, -1, 1, out=mix)
+        return (mix * 32767).astype(numpy.int16).tobytes()
+
+    def _open_output(self):
+        """
+        Open the output stream. Return the function writing a block to it (blocking until the stream
+        can take it) and the function closing it
+        """
+        if sounddevice is not None:
+            stream = sounddevice.RawOutputStream(samplerate=self.rate, channels=2, dtype='int16', blocksize=self.block)
+            stream.start()
+
+            def write(data):
+                if stream.write(data):
+                    self.underruns += 1
+            return write, stream.close
+        aplay = shutil.which("aplay")
+        if aplay is not None:
+            process = subprocess.Popen([aplay, "-q", "-t", "raw", "-f", "S16_LE", "-c", "2", "-r", str(self.rate)],
+                                       stdin=subprocess.PIPE, bufsize=0)
+
+            def close():
+                process.stdin.close()
+                process.wait()
+            return process.stdin.write, close
+        logger.warning("No audio output found (install sounddevice or aplay), the mixer plays silently")
+        deadline = time.monotonic()
+
+        def wait(_data):
+            nonlocal deadline
+            deadline += self.block / self.rate
+            time.sleep(max(0, deadline - time.monotonic()))
+        return wait, lambda: None
+
+    def run(self):
+        """
+        Mix the players and write the blocks to the output until no player remains, opening the output
+        again if it fails. Blocking
+        """
+        while self._running:
+            try:
+                write, close = self._open_output()
+            except OUTPUT_ERRORS as error:
+                logger.error("Cannot open the audio output: %s", error)
+                self._stop_event.wait(RESTART_DELAY)
+                continue
+            try:
+                while self._running and self._has_players():
+                    write(self.render())
+                return
+            except OUTPUT_ERRORS as error:
+                logger.error("Audio output failed, opening it again: %s", error)
+                self._stop_event.wait(RESTART_DELAY)
+            finally:
+                try:
+                    close()
+                except OUTPUT_ERRORS as error:
+                    logger.warning("Cannot close the audio output: %s", error)
+
+    def start(self):
+        """
+        Start the mixing thread. Non blocking. It stops by itself when no player remains, and is started
+        again by `create_player`.
+        """
+        self._running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="MixerThread", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,110 @@
+"""
+Audio backend without audio output, used to run sketches without audio devices (replays, benchmarks, tests)
+"""
+
+import time
+from collections import namedtuple
+from media.AudioBackend import AudioBackend, BackendPlayer
+
+__all__ = ['NullBackend', 'NullPlayer', 'NullMedia']
+
+NullMedia = namedtuple('NullMedia', ['filename', 'duration'])
+
+
+class NullPlayer(BackendPlayer):
+    """
+    Player which only keeps its state. A media parsed by the backend plays for its duration,
+    a media added by filename plays until stopped.
+    """
+
+    def __init__(self):
+        self._medias = []
+        self._index = 0
+        self._playing = False
+        self._started = 0.
+        self._playing_until = float("inf")
+        self._muted = False
+        self._loop = "default"
+        self._volume = 100
+        self._transition_callback = None
+
+    def set_volume(self, volume: int) -> bool:
+        self._volume = volume
+        return True
+
+    def set_mute(self, muted: bool):
+        self._muted = muted
+
+    def toggle_mute(self):
+        self._muted = not self._muted
+
+    def add_media(self, media):
+        self._medias.append(media)
+
+    def count(self) -> int:
+        return len(self._medias)
+
+    def item_at_index(self, index):
+        return self._medias[index]
+
+    def reset_playlist(self):
+        self._medias = []
+        self._index = 0
+
+    def play(self):
+        self.play_item_at_index(self._index)
+
+    def stop(self):
+        self._set_playing(False)
+        self._index = 0
+
+    def pause(self):
+        self._set_playing(False)
+
+    def next(self):
+        self.play_item_at_index(self._index + 1)
+
+    def previous(self):
+        self.play_item_at_index(self._index - 1)
+
+    def play_item_at_index(self, index: int):
+        if not 0 <= index < len(self._medias):
+            return
+        self._index = index
+        self._started = time.monotonic()
+        media = self._medias[index]
+        self._playing_until = self._started + (media.duration if isinstance(media, NullMedia) else float("inf"))
+        self._set_playing(True)
+
+    def _set_playing(self, playing: bool):
+        self._playing = playing
+        if self._transition_callback is not None:
+            self._transition_callback(playing)
+
+    def is_playing(self) -> bool:
+        return self._playing and time.monotonic() < self._playing_until
+
+    def set_loop(self, loopmode: str):
+        self._loop = loopmode
+
+    def length(self) -> float:
+        if not self._medias:
+            return 0.
+        media = self._medias[self._index]
+        return media.duration if isinstance(media, NullMedia) else 0.
+
+    def position(self) -> float:
+        return time.monotonic() - self._started if self._playing else 0.
+
+    def set_transition_callback(self, callback):
+        self._transition_callback = callback
+
+
+class NullBackend(AudioBackend):
+    """Backend whose players play nothing, and whose medias all last 0 seconds"""
+
+    def parse(self, filename: str):
+        return NullMedia(filename, 0.), 0.
+
+    def create_player(self):
+        return NullPlayer()
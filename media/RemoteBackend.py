@@ -0,0 +1,155 @@
+"""
+Audio backend whose players play on another node of the cluster
+"""
+
+import itertools
+import time
+import weakref
+from media.AudioBackend import AudioBackend, BackendPlayer
+
+__all__ = ['RemoteBackend', 'RemotePlayer']
+
+
+class RemotePlayer(BackendPlayer):
+    """
+    Player forwarding its calls to a player of the node's own backend. The playlist, volume and loop mode
+    are kept here too, to be sent again when the node reconnects; the playback state is the one last
+    reported by the node.
+    """
+
+    def __init__(self, node, player_id):
+        self.node = node
+        self.id = player_id
+        self._medias = []
+        self._volume = 100
+        self._muted = False
+        self._loop = "default"
+        self._playing = False
+        self._length = 0.
+        self._position = 0.
+        self._reported = 0.
+        self._transition_callback = None
+
+    def _call(self, method, *args):
+        self.node.send_media(self.id, method, args)
+
+    def resync(self):
+        """
+        Create the player on the node, with the playlist, volume and loop mode set so far
+        """
+        self._call("create")
+        self._call("set_volume", self._volume)
+        self._call("set_mute", self._muted)
+        for media in self._medias:
+            self._call("add_media", media)
+        self._call("set_loop", self._loop)
+
+    def set_volume(self, volume: int) -> bool:
+        self._volume = volume
+        self._call("set_volume", volume)
+        return True
+
+    def set_mute(self, muted: bool):
+        self._muted = muted
+        self._call("set_mute", muted)
+
+    def toggle_mute(self):
+        self.set_mute(not self._muted)
+
+    def add_media(self, media):
+        # The node parses the media with its own backend
+        self._medias.append(media)
+        self._call("add_media", media)
+
+    def count(self) -> int:
+        return len(self._medias)
+
+    def item_at_index(self, index):
+        return self._medias[index]
+
+    def reset_playlist(self):
+        self._medias = []
+        self._call("reset_playlist")
+
+    def play(self):
+        self._call("play")
+
+    def stop(self):
+        self._playing = False
+        self._call("stop")
+
+    def pause(self):
+        self._playing = False
+        self._call("pause")
+
+    def next(self):
+        self._call("next")
+
+    def previous(self):
+        self._call("previous")
+
+    def play_item_at_index(self, index: int):
+        self._call("play_item_at_index", index)
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def set_loop(self, loopmode: str):
+        self._loop = loopmode
+        self._call("set_loop", loopmode)
+
+    def length(self) -> float:
+        return self._length
+
+    def position(self) -> float:
+        if not self._playing:
+            return self._position
+        return self._position + time.monotonic() - self._reported
+
+    def set_transition_callback(self, callback):
+        self._transition_callback = callback
+
+    def transition(self, playing: bool, length: float, position: float, reported: float):
+        """
+        Update the playback state from a transition reported by the node, at `reported` (coordinator's clock)
+        """
+        self._playing = playing
+        self._length = length
+        self._position = position
+        self._reported = reported
+        if self._transition_callback is not None:
+            self._transition_callback(playing)
+
+
+class RemoteBackend(AudioBackend):
+    """
+    Backend of the channels played by a node of the cluster. The medias are given to the node by filename,
+    relative to its own working directory, and their duration is unknown here.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self._ids = itertools.count()
+        self.players = weakref.WeakValueDictionary()
+
+    def parse(self, filename: str):
+        return filename, 0.
+
+    def create_player(self):
+        player = RemotePlayer(self.node, next(self._ids))
+        self.players[player.id] = player
+        # The player of the node is closed along with this one
+        weakref.finalize(player, self.node.send_media, player.id, "close", ())
+        player.resync()
+        return player
+
+    def resync(self):
+        """
+        Create all the players again on the node, after it (re)connected
+        """
+        for player in list(self.players.values()):
+            player.resync()
+
+    def close(self):
+        for player in list(self.players.values()):
+            player.node.send_media(player.id, "close", ())
@@ -0,0 +1,113 @@
+"""
+Audio backend playing the medias with libVLC, one VLC media list player per MediaPlayer
+"""
+
+import vlc
+from media.AudioBackend import AudioBackend, BackendPlayer
+
+__all__ = ['VLCBackend', 'VLCPlayer']
+
+
+class VLCPlayer(BackendPlayer):
+    """Playlist played by a VLC media list player"""
+
+    # VLC events after which the transition callback is called with True, or with False
+    _START_EVENTS = ("MediaPlayerPlaying", "MediaPlayerLengthChanged")
+    _STOP_EVENTS = ("MediaPlayerPaused", "MediaPlayerStopped", "MediaPlayerEndReached")
+
+    def __init__(self):
+        self._medialist = vlc.MediaList()
+        self._medialistplayer = vlc.MediaListPlayer()
+        self._medialistplayer.set_media_list(self._medialist)
+        self._player = self._medialistplayer.get_media_player()
+        self._transition_callback = None
+
+    def set_volume(self, volume: int) -> bool:
+        return not self._player.audio_set_volume(volume)
+
+    def set_mute(self, muted: bool):
+        self._player.audio_set_mute(muted)
+
+    def toggle_mute(self):
+        self._player.audio_toggle_mute()
+
+    def add_media(self, media):
+        self._medialist.add_media(media)
+
+    def count(self) -> int:
+        return self._medialist.count()
+
+    def item_at_index(self, index):
+        return self._medialist.item_at_index(index)
+
+    def reset_playlist(self):
+        self._medialist = vlc.MediaList()
+        self._medialistplayer.set_media_list(self._medialist)
+
+    def play(self):
+        self._medialistplayer.play()
+
+    def stop(self):
+        self._medialistplayer.stop()
+
+    def pause(self):
+        self._medialistplayer.pause()
+
+    def next(self):
+        self._medialistplayer.next()
+
+    def previous(self):
+        self._medialistplayer.previous()
+
+    def play_item_at_index(self, index: int):
+        self._medialistplayer.play_item_at_index(index)
+
+    def is_playing(self) -> bool:
+        return bool(self._player.is_playing())
+
+    def set_loop(self, loopmode: str):
+        if loopmode == "loop":
+            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.loop)
+        elif loopmode == "repeat":
+            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.repeat)
+        else:
+            self._medialistplayer.set_playback_mode(vlc.PlaybackMode.default)
+
+    def length(self) -> float:
+        # The length is only known once VLC has started decoding the media, use the parsed duration until then
+        length = self._player.get_length()
+        if length <= 0 and self._player.get_media() is not None:
+            length = self._player.get_media().get_duration()
+        return max(length, 0) / 1000
+
+    def position(self) -> float:
+        return max(self._player.get_time(), 0) / 1000
+
+    def set_transition_callback(self, callback):
+        event_manager = self._player.event_manager()
+        if self._transition_callback is not None:
+            for event in self._START_EVENTS + self._STOP_EVENTS:
+                event_manager.event_detach(getattr(vlc.EventType, event))
+        self._transition_callback = callback
+        if callback is None:
+            return
+        for event in self._START_EVENTS:
+            event_manager.event_attach(getattr(vlc.EventType, event), self._event, True)
+        for event in self._STOP_EVENTS:
+            event_manager.event_attach(getattr(vlc.EventType, event), self._event, False)
+
+    def _event(self, _event, started: bool):
+        if self._transition_callback is not None:
+            self._transition_callback(started)
+
+
+class VLCBackend(AudioBackend):
+    """Backend creating a libVLC player (with its own threads and audio output) per MediaPlayer"""
+
+    def parse(self, filename: str):
+        media = vlc.Media(filename)
+        media.parse()
+        return media, max(media.get_duration(), 0) / 1000
+
+    def create_player(self):
+        return VLCPlayer()
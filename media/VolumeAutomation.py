@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+from runtime.runtime import get_runtime
+
+__all__ = ['VolumeAutomation', 'Ramp', 'automation']
+
+
+class Ramp:
+    """Volume ramp of one player, from a start volume to a target volume"""
+
+    CURVES = ("linear", "equal_power")
+
+    def __init__(self, player, start: int, target: int, duration: float, curve: str = "linear", on_done=None):
+        if curve not in self.CURVES:
+            raise ValueError(f"Unknown fade curve {curve}")
+        self.player = player
+        self.start = start
+        self.target = target
+        self.duration = duration
+        self.curve = curve
+        self.on_done = on_done
+        self.start_time = time.monotonic()
+
+    def progress(self, now: float) -> float:
+        """Progress of the ramp at monotonic time `now`, between 0 and 1"""
+        if self.duration <= 0:
+            return 1.
+        return min(1., (now - self.start_time) / self.duration)
+
+    def volume_at(self, now: float) -> int:
+        """Volume at monotonic time `now`"""
+        progress = self.progress(now)
+        if self.curve == "equal_power":
+            # Sine shaped fade in and cosine shaped fade out keep the sum of powers constant in crossfades
+            if self.target > self.start:
+                progress = math.sin(progress * math.pi / 2)
+            else:
+                progress = 1 - math.cos(progress * math.pi / 2)
+        return round(self.start + (self.target - self.start) * progress)
+
+
+class VolumeAutomation:
+    """
+    Drive the volume ramps of all players from a single ticker, run by the runtime at a fixed control rate.
+    Starting a ramp on a player cancels the ramp it had (its on_done callback is not called).
+    """
+
+    def __init__(self, rate: float = 50):
+        # Control rate, in ticks per second
+        self.rate = rate
+        self.ramps = {}
+        self._lock = threading.Lock()
+        self._tick_handle = None
+
+    def ramp(self, player, target: int, duration: float, curve: str = "linear", on_done=None):
+        """
+        Ramp the volume of `player` from its current volume to `target` in `duration` seconds,
+        then call `on_done` if given
+        """
+        new_ramp = Ramp(player, player.volume, target, duration, curve, on_done)
+        with self._lock:
+            self.ramps[id(player)] = new_ramp
+            if self._tick_handle is None:
+                self._tick_handle = get_runtime().call_soon(self._tick)
+        return new_ramp
+
+    def cancel(self, player):
+        """
+        Cancel the ramp of `player`, leaving its volume where it is. Return True if there was a ramp
+        """
+        with self._lock:
+            return self.ramps.pop(id(player), None) is not None
+
+    def target(self, player):
+        """Target volume of `player`: the target of its ramp if any, its volume otherwise"""
+        current_ramp = self.ramps.get(id(player))
+        return current_ramp.target if current_ramp else player.volume
+
+    def is_ramping(self, player) -> bool:
+        """True if the volume of `player` is being ramped"""
+        return id(player) in self.ramps
+
+    def _tick(self):
+        now = time.monotonic()
+        with self._lock:
+            ramps = list(self.ramps.items())
+        finished = []
+        for key, current_ramp in ramps:
+            volume = current_ramp.volume_at(now)
+            if volume != current_ramp.player.volume:
+                current_ramp.player.set_volume(volume)
+            if current_ramp.progress(now) >= 1:
+                finished.append((key, current_ramp))
+        with self._lock:
+            finished = [current_ramp for key, current_ramp in finished if self.ramps.get(key) is current_ramp]
+            for current_ramp in finished:
+                del self.ramps[id(current_ramp.player)]
+            self._tick_handle = get_runtime().call_later(1 / self.rate, self._tick) if self.ramps else None
+        for current_ramp in finished:
+            if current_ramp.on_done:
+                current_ramp.on_done()
+
+    def __len__(self):
+        return len(self.ramps)
+
+
+# Automation engine shared by all the players
+automation = VolumeAutomation()
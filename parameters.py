@@ -1,10 +1,50 @@
+import socket
 from dotenv import dotenv_values
 
 PARAMETERS = dotenv_values("parameters.env")
 PARAMETERS.update({
     "DELAY": int(PARAMETERS['DELAY']) if 'DELAY' in PARAMETERS else 10,
+    "HANDSHAKE_DELAY": float(PARAMETERS['HANDSHAKE_DELAY']) if 'HANDSHAKE_DELAY' in PARAMETERS else 2,
+    "HANDSHAKE_TIMEOUT": float(PARAMETERS['HANDSHAKE_TIMEOUT']) if 'HANDSHAKE_TIMEOUT' in PARAMETERS else 30,
     "BAUDRATE": int(PARAMETERS['BAUDRATE']) if 'BAUDRATE' in PARAMETERS else 9600,
-    "IGNORE_PORTS": PARAMETERS['IGNORE_PORTS'].split(',') if 'IGNORE_PORTS' in PARAMETERS else []
+    "IGNORE_PORTS": PARAMETERS['IGNORE_PORTS'].split(',') if 'IGNORE_PORTS' in PARAMETERS else [],
+    "SERIAL_READER": PARAMETERS['SERIAL_READER'] if 'SERIAL_READER' in PARAMETERS else "selector",
+    "SERIAL_PROTOCOL": PARAMETERS['SERIAL_PROTOCOL'] if 'SERIAL_PROTOCOL' in PARAMETERS else "binary",
+    "HOTPLUG_INTERVAL": float(PARAMETERS['HOTPLUG_INTERVAL']) if 'HOTPLUG_INTERVAL' in PARAMETERS else 1,
+    "WRITE_WINDOW": float(PARAMETERS['WRITE_WINDOW']) if 'WRITE_WINDOW' in PARAMETERS else .005,
+    "SCENARIO_CACHE": PARAMETERS['SCENARIO_CACHE'] if 'SCENARIO_CACHE' in PARAMETERS else None,
+    "HOT_RELOAD": PARAMETERS['HOT_RELOAD'].lower() in ("1", "true", "yes") if 'HOT_RELOAD' in PARAMETERS else False,
+    "TRACING": PARAMETERS['TRACING'].lower() in ("1", "true", "yes") if 'TRACING' in PARAMETERS else False,
+    "TRACE_FILE": PARAMETERS['TRACE_FILE'] if 'TRACE_FILE' in PARAMETERS else None,
+    "TRACE_INTERVAL": float(PARAMETERS['TRACE_INTERVAL']) if 'TRACE_INTERVAL' in PARAMETERS else 60,
+    "LOG_LEVEL": PARAMETERS['LOG_LEVEL'] if 'LOG_LEVEL' in PARAMETERS else "INFO",
+    "LOG_LEVELS": dict(level.strip().split('=') for level in PARAMETERS['LOG_LEVELS'].split(',') if '=' in level)
+    if 'LOG_LEVELS' in PARAMETERS else {},
+    "LOG_RATE": float(PARAMETERS['LOG_RATE']) if 'LOG_RATE' in PARAMETERS else 20,
+    "LOG_JSONL": PARAMETERS['LOG_JSONL'] if 'LOG_JSONL' in PARAMETERS else None,
+    "MEDIA_BACKEND": PARAMETERS['MEDIA_BACKEND'] if 'MEDIA_BACKEND' in PARAMETERS else "vlc",
+    "MIXER_RATE": int(PARAMETERS['MIXER_RATE']) if 'MIXER_RATE' in PARAMETERS else 44100,
+    "MIXER_BLOCK": int(PARAMETERS['MIXER_BLOCK']) if 'MIXER_BLOCK' in PARAMETERS else 512,
+    "LEDS_FILE": PARAMETERS['LEDS_FILE'] if 'LEDS_FILE' in PARAMETERS else None,
+    "LEDS_ARDUINO": PARAMETERS['LEDS_ARDUINO'] if 'LEDS_ARDUINO' in PARAMETERS else "leds",
+    "LEDS_FPS": float(PARAMETERS['LEDS_FPS']) if 'LEDS_FPS' in PARAMETERS else 30,
+    "RECORD_FILE": PARAMETERS['RECORD_FILE'] if 'RECORD_FILE' in PARAMETERS else None,
+    "REPLAY_FILE": PARAMETERS['REPLAY_FILE'] if 'REPLAY_FILE' in PARAMETERS else None,
+    "REPLAY_SPEED": float(PARAMETERS['REPLAY_SPEED']) if 'REPLAY_SPEED' in PARAMETERS else 1,
+    "RUNTIME": PARAMETERS['RUNTIME'] if 'RUNTIME' in PARAMETERS else "thread",
+    "HISTORY_SIZE": int(PARAMETERS['HISTORY_SIZE']) if 'HISTORY_SIZE' in PARAMETERS else 3600,
+    "HISTORY_DIRECTORY": PARAMETERS['HISTORY_DIRECTORY'] if 'HISTORY_DIRECTORY' in PARAMETERS else None,
+    "HISTORY_INTERVAL": float(PARAMETERS['HISTORY_INTERVAL']) if 'HISTORY_INTERVAL' in PARAMETERS else 60,
+    "HISTORY_SEGMENT_SIZE": int(PARAMETERS['HISTORY_SEGMENT_SIZE']) if 'HISTORY_SEGMENT_SIZE' in PARAMETERS else 131072,
+    "HISTORY_SEGMENTS": int(PARAMETERS['HISTORY_SEGMENTS']) if 'HISTORY_SEGMENTS' in PARAMETERS else 8,
+    "CONTROL_ADDRESS": PARAMETERS['CONTROL_ADDRESS'] if 'CONTROL_ADDRESS' in PARAMETERS else None,
+    "CONTROL_INTERVAL": float(PARAMETERS['CONTROL_INTERVAL']) if 'CONTROL_INTERVAL' in PARAMETERS else .25,
+    "CONTROL_TOKEN": PARAMETERS['CONTROL_TOKEN'] if 'CONTROL_TOKEN' in PARAMETERS else None,
+    "CLUSTER_ROLE": PARAMETERS['CLUSTER_ROLE'] if 'CLUSTER_ROLE' in PARAMETERS else None,
+    "CLUSTER_ADDRESS": PARAMETERS['CLUSTER_ADDRESS'] if 'CLUSTER_ADDRESS' in PARAMETERS else "localhost:7700",
+    "CLUSTER_NODE": PARAMETERS.get('CLUSTER_NODE') or socket.gethostname(),
+    "CLUSTER_LATENCY": float(PARAMETERS['CLUSTER_LATENCY']) if 'CLUSTER_LATENCY' in PARAMETERS else .02,
+    "CLUSTER_SYNC_INTERVAL": float(PARAMETERS['CLUSTER_SYNC_INTERVAL']) if 'CLUSTER_SYNC_INTERVAL' in PARAMETERS else 1,
 })
 
 for parameter, value in PARAMETERS.items():
@@ -0,0 +1,129 @@
+"""
+Runtime running serial I/O, delayed calls and step sequences on a single asyncio event loop
+"""
+
+import asyncio
+import threading
+import time
+from arduinomanager.AsyncSerialReader import AsyncSerialReader
+from runtime.Handle import Handle
+from runtime.Scheduler import DriftStats
+
+__all__ = ['AsyncRuntime']
+
+
+class AsyncRuntime():
+    """
+    Runtime based on one asyncio event loop, running in its own thread.
+    Delayed calls are loop timers and step sequences (such as volume fades) are tasks,
+    so the number of threads stays the same whatever the scenario does. As on any event loop,
+    the calls and steps must not block.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.serial_reader = AsyncSerialReader(self.loop)
+        self.stats = DriftStats()
+        # Calls not run yet: added by the threads calling call_later, removed by the loop
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True if the event loop is running"""
+        return self.loop.is_running()
+
+    def start(self):
+        """
+        Start the event loop in a new thread. Non blocking.
+        """
+        self._thread = threading.Thread(target=self.loop.run_forever, name="AsyncRuntimeThread")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the event loop
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def wait(self):
+        """
+        Wait until the event loop is stopped. Blocking.
+        """
+        if self._thread:
+            self._thread.join()
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call_in_loop(self, callback, *args):
+        if self._in_loop():
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` on the loop in `delay` seconds. Return a Handle to cancel the call
+        """
+        handle = Handle(callback, args, kwargs, when=time.monotonic() + delay)
+        handle.add_cancel_callback(self._forget)
+        with self._pending_lock:
+            self._pending.add(handle)
+        self._call_in_loop(self._schedule, handle)
+        return handle
+
+    def call_soon(self, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` on the loop as soon as possible
+        """
+        return self.call_later(0, callback, *args, **kwargs)
+
+    def _schedule(self, handle):
+        if handle.cancelled:
+            return
+        timer = self.loop.call_at(self.loop.time() + max(0, handle.when - time.monotonic()), self._run, handle)
+        handle.add_cancel_callback(lambda handle: self._call_in_loop(timer.cancel))
+
+    def _forget(self, handle):
+        with self._pending_lock:
+            self._pending.discard(handle)
+
+    def _run(self, handle):
+        self._forget(handle)
+        if not handle.cancelled:
+            self.stats.record(time.monotonic() - handle.when)
+        handle()
+
+    def run_steps(self, steps):
+        """
+        Run a sequence of steps as a task of the loop.
+        `steps` is a generator yielding the time (in seconds) to wait before the next step.
+        """
+        if self._in_loop():
+            return self.loop.create_task(self._run_steps(steps))
+        return asyncio.run_coroutine_threadsafe(self._run_steps(steps), self.loop)
+
+    @staticmethod
+    async def _run_steps(steps):
+        for delay in steps:
+            await asyncio.sleep(delay)
+
+    def pending(self):
+        """
+        List of the Handles of the calls not run yet, sorted by due time
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        return sorted(pending, key=lambda handle: handle.when)
+
+    def cancel_all(self):
+        """
+        Cancel all the pending calls
+        """
+        for handle in self.pending():
+            handle.cancel()
@@ -0,0 +1,112 @@
+"""
+Watch a file for modifications, with inotify on Linux or by polling its modification time otherwise
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+__all__ = ['FileWatcher']
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1  # pylint: disable=pointless-statement
+        return libc
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+class FileWatcher():
+    """
+    Call `callback()` from a new thread every time `filename` is modified (written, replaced or recreated).
+    Modifications within `debounce` seconds are reported once.
+    """
+
+    def __init__(self, filename, callback, debounce=.2, poll_interval=1.):
+        self.filename = os.path.abspath(filename)
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _watch_inotify(self, libc):
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return False
+        directory, name = os.path.split(self.filename)
+        # Watch the directory, as editors often replace the file instead of writing it
+        if libc.inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY) < 0:
+            os.close(fd)
+            return False
+        try:
+            modified = False
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([fd], [], [], self.debounce if modified else self.poll_interval)
+                if not ready:
+                    if modified:
+                        modified = False
+                        self.callback()
+                    continue
+                data = os.read(fd, 4096)
+                offset = 0
+                while offset < len(data):
+                    _wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    if data[offset:offset + length].rstrip(b"\0").decode(errors="replace") == name:
+                        modified = True
+                    offset += length
+        finally:
+            os.close(fd)
+        return True
+
+    def _mtime(self):
+        try:
+            return os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return None
+
+    def _watch_polling(self):
+        mtime = self._mtime()
+        while not self._stop_event.wait(self.poll_interval):
+            new_mtime = self._mtime()
+            if new_mtime != mtime and new_mtime is not None:
+                # Wait for the writing to end
+                self._stop_event.wait(self.debounce)
+                mtime = self._mtime()
+                self.callback()
+
+    def watch(self):
+        """
+        Watch the file until stopped. Blocking
+        """
+        libc = _load_libc()
+        if libc is None or not self._watch_inotify(libc):
+            self._watch_polling()
+
+    def start(self):
+        """
+        Start watching the file in a new thread. Non blocking.
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.watch, name="FileWatcherThread", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the file
+        """
+        self._stop_event.set()
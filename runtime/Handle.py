@@ -0,0 +1,47 @@
+"""
+Handle on a delayed call scheduled by a runtime
+"""
+
+__all__ = ['Handle']
+
+
+class Handle():
+    """Handle on a delayed call, which can be cancelled as long as it has not been run"""
+
+    def __init__(self, callback, args=(), kwargs=None, when=None):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs or {}
+        # Monotonic time at which the call is due
+        self.when = when
+        self.cancelled = False
+        self.done = False
+        self._cancel_callbacks = []
+
+    def add_cancel_callback(self, callback):
+        """
+        Add a callback called with the handle when it is cancelled
+        """
+        self._cancel_callbacks.append(callback)
+
+    def cancel(self):
+        """
+        Cancel the call. Return True if the call was pending, False otherwise
+        """
+        if self.cancelled or self.done:
+            return False
+        self.cancelled = True
+        for callback in self._cancel_callbacks:
+            callback(self)
+        return True
+
+    def __call__(self):
+        if self.cancelled or self.done:
+            return None
+        self.done = True
+        return self.callback(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        name = getattr(self.callback, '__qualname__', repr(self.callback))
+        state = "cancelled" if self.cancelled else "done" if self.done else "pending"
+        return f"<Handle callback={name} when={self.when} {state}>"
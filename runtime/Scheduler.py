@@ -0,0 +1,184 @@
+"""
+Scheduler running all the delayed calls from a single thread
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from runtime.Handle import Handle
+from runtime.logs import get_logger
+
+__all__ = ['Scheduler', 'DriftStats']
+
+logger = get_logger("scheduler")
+
+
+class DriftStats():
+    """Statistics on the delay between the time a call was due and the time it was run"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = 0.
+
+    @property
+    def mean(self):
+        """Mean drift, in seconds"""
+        return self.total / self.count if self.count else 0.
+
+    def record(self, drift):
+        """
+        Record the drift (in seconds) of a call
+        """
+        self.count += 1
+        self.total += drift
+        self.last = drift
+        if drift > self.max:
+            self.max = drift
+
+    def reset(self):
+        """
+        Reset all the statistics
+        """
+        self.__init__()
+
+    def __repr__(self):
+        return f"<DriftStats count={self.count} mean={self.mean * 1000:.3f}ms max={self.max * 1000:.3f}ms>"
+
+
+class Scheduler():
+    """
+    Run delayed calls from a single thread, using a heap ordered by due time on the monotonic clock.
+    Cancelled calls are left in the heap and skipped when they are due.
+
+    All the calls share this thread, so a call must not block: a call waiting for serial or media I/O
+    delays every call due after it. Blocking work goes to the thread of its own subsystem (the writer
+    thread of each Arduino and of each cluster connection, the LED animator, the file watcher reading a
+    modified sketch), and the calls only hand it over. Calls running longer than `slow_call` seconds
+    are logged.
+    """
+
+    def __init__(self, name="SchedulerThread", idle_timeout=1., slow_call=.05):
+        self.name = name
+        self.slow_call = slow_call
+        # Like threading.Timer, the thread only lives while calls are pending, so that the program
+        # can exit when nothing is left to do. It stops after `idle_timeout` seconds without calls.
+        self.idle_timeout = idle_timeout
+        self.running = False
+        self.stats = DriftStats()
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def call_at(self, when, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` at monotonic time `when`. Return a Handle to cancel the call
+        """
+        handle = Handle(callback, args, kwargs, when=when)
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._counter), handle))
+            # Wake up the scheduler thread if the new call is the next one
+            if self._heap[0][2] is handle:
+                self._condition.notify()
+            if not self.running:
+                self._start()
+        return handle
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` in `delay` seconds. Return a Handle to cancel the call
+        """
+        return self.call_at(time.monotonic() + delay, callback, *args, **kwargs)
+
+    def pending(self):
+        """
+        List of the Handles of the calls not run yet, sorted by due time
+        """
+        with self._condition:
+            return [handle for _when, _count, handle in sorted(self._heap) if not handle.cancelled]
+
+    def cancel_all(self):
+        """
+        Cancel all the pending calls
+        """
+        with self._condition:
+            for _when, _count, handle in self._heap:
+                handle.cancel()
+            self._heap.clear()
+
+    def _pop_due(self):
+        """
+        Wait for the next due calls and remove them from the heap.
+        Return None if the thread must stop.
+        """
+        with self._condition:
+            while self.running and self._thread is threading.current_thread():
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    if not self._condition.wait(self.idle_timeout) and not self._heap:
+                        self.running = False
+                    continue
+                timeout = self._heap[0][0] - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._condition.wait(timeout)
+            else:
+                return None
+            now = time.monotonic()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+            return due
+
+    def run(self):
+        """
+        Run the calls when they are due. Blocking
+        """
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+            for handle in due:
+                if handle.cancelled:
+                    continue
+                start = time.monotonic()
+                self.stats.record(start - handle.when)
+                try:
+                    handle()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error in scheduled call %r", handle)
+                duration = time.monotonic() - start
+                if duration > self.slow_call:
+                    logger.warning("Scheduled call %r blocked the scheduler for %.1fms", handle, duration * 1000,
+                                   extra={"call": repr(handle), "duration": duration})
+
+    def _start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self.run, name=self.name)
+        self._thread.start()
+
+    def start(self):
+        """
+        Start the scheduler thread. Non blocking.
+        """
+        with self._condition:
+            if not self.running:
+                self._start()
+
+    def stop(self):
+        """
+        Stop the scheduler thread. Pending calls are kept.
+        """
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+
+    def __len__(self):
+        return len(self.pending())
+
+    def __repr__(self):
+        return f"<Scheduler pending={len(self)} running={self.running}>"
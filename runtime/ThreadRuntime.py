@@ -0,0 +1,58 @@
+"""
+Runtime running delayed calls and step sequences from a central scheduler thread
+"""
+
+from runtime.Scheduler import Scheduler
+
+__all__ = ['ThreadRuntime']
+
+
+class ThreadRuntime():
+    """
+    Runtime based on threads: all delayed calls and step sequences are run by one Scheduler thread,
+    instead of creating one thread per call. The calls and steps must not block (see Scheduler).
+    """
+
+    def __init__(self):
+        self.scheduler = Scheduler()
+
+    @property
+    def stats(self):
+        """Drift statistics of the scheduler"""
+        return self.scheduler.stats
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` in `delay` seconds. Return a Handle to cancel the call
+        """
+        return self.scheduler.call_later(delay, callback, *args, **kwargs)
+
+    def call_soon(self, callback, *args, **kwargs):
+        """
+        Call `callback(*args, **kwargs)` as soon as possible
+        """
+        return self.scheduler.call_later(0, callback, *args, **kwargs)
+
+    def run_steps(self, steps):
+        """
+        Run a sequence of steps from the scheduler thread.
+        `steps` is a generator yielding the time (in seconds) to wait before the next step.
+        """
+        return self.call_soon(self._next_step, steps)
+
+    def _next_step(self, steps):
+        delay = next(steps, None)
+        if delay is not None:
+            self.call_later(delay, self._next_step, steps)
+
+    def pending(self):
+        """
+        List of the Handles of the calls not run yet, sorted by due time
+        """
+        return self.scheduler.pending()
+
+    def cancel_all(self):
+        """
+        Cancel all the pending calls
+        """
+        self.scheduler.cancel_all()
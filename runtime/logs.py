@@ -0,0 +1,156 @@
+"""
+Structured logging: records are queued by the threads logging them and written by a background thread,
+to the console (colored) and optionally to a JSON lines file
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import colorama
+
+__all__ = ['get_logger', 'setup_logging', 'stop_logging', 'RateLimitFilter', 'ColorFormatter', 'JsonLinesFormatter']
+
+ROOT_LOGGER = "alice"
+
+# Attributes of every LogRecord, the other ones being the structured fields passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+_listener = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """Logger of a subsystem, such as "arduinos" or "arduinos.data\""""
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def _fields(record) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger: at most `rate` records per second (with bursts of `burst` records) go through
+    for the loggers in `loggers` (and their children). The next record that goes through tells how many were dropped.
+    """
+
+    def __init__(self, loggers, rate: float = 20, burst: int = 50):
+        super().__init__()
+        self.loggers = tuple(loggers)
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _limited(self, name: str) -> bool:
+        return any(name == logger or name.startswith(logger + ".") for logger in self.loggers)
+
+    def filter(self, record) -> bool:
+        if not self._limited(record.name):
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(record.name, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class ColorFormatter(logging.Formatter):
+    """Console formatter coloring the records by level"""
+
+    COLORS = {
+        logging.DEBUG: colorama.Fore.BLUE,
+        logging.INFO: colorama.Fore.GREEN,
+        logging.WARNING: colorama.Fore.YELLOW,
+        logging.ERROR: colorama.Back.RED,
+        logging.CRITICAL: colorama.Back.RED + colorama.Style.BRIGHT,
+    }
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(name)s %(message)s", "%H:%M:%S")
+
+    def format(self, record) -> str:
+        message = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            message += f" ({record.suppressed} similar messages suppressed)"
+        return f"{self.COLORS.get(record.levelno, '')}{message}{colorama.Style.RESET_ALL}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Compact JSON formatter, one object per line with the structured fields of the record"""
+
+    def format(self, record) -> str:
+        entry = {"t": round(record.created, 6), "level": record.levelname, "logger": record.name, "msg": record.getMessage()}
+        entry.update(_fields(record))
+        if getattr(record, 'suppressed', 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler keeping the structured fields, and dropping records when the queue is full"""
+
+    def prepare(self, record):
+        # Only merge the arguments in the message: formatting is done by the handlers of the background thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = logging.Formatter().formatException(record.exc_info) if record.exc_info else None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging(level: str = "INFO", levels: dict = None, jsonl_file: str = None,
+                  rate_limited=("alice.arduinos.data",), rate: float = 20, queue_size: int = 10000):
+    """
+    Configure the loggers of the program: `level` for all of them, `levels` as {subsystem: level} for some of them.
+    Records of the `rate_limited` loggers are limited to `rate` per second.
+    Records are written to the console, and to `jsonl_file` if given, by a background thread.
+    """
+    global _listener
+    stop_logging()
+    colorama.init()
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    for subsystem, subsystem_level in (levels or {}).items():
+        logging.getLogger(subsystem if subsystem.startswith(ROOT_LOGGER) else f"{ROOT_LOGGER}.{subsystem}").setLevel(subsystem_level)
+
+    console = logging.StreamHandler()
+    console.setFormatter(ColorFormatter())
+    handlers = [console]
+    if jsonl_file:
+        jsonl = logging.FileHandler(jsonl_file)
+        jsonl.setFormatter(JsonLinesFormatter())
+        handlers.append(jsonl)
+
+    queue_handler = _QueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(RateLimitFilter(rate_limited, rate))
+    root.handlers = [queue_handler]
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write the records still queued and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,26 @@
+"""
+Access to the runtime used by the whole program to schedule calls
+"""
+
+__all__ = ['get_runtime', 'set_runtime']
+
+_runtime = None
+
+
+def get_runtime():
+    """
+    Return the current runtime, creating a ThreadRuntime if none has been set
+    """
+    global _runtime
+    if _runtime is None:
+        from runtime.ThreadRuntime import ThreadRuntime
+        _runtime = ThreadRuntime()
+    return _runtime
+
+
+def set_runtime(runtime):
+    """
+    Set the runtime used to schedule calls (ThreadRuntime or AsyncRuntime)
+    """
+    global _runtime
+    _runtime = runtime
@@ -0,0 +1,167 @@
+"""
+Latency tracing from the reception of serial data to the outputs (serial writes, sounds played)
+"""
+
+import json
+import threading
+import time
+from array import array
+
+__all__ = ['LatencyHistogram', 'Tracer', 'tracer']
+
+# Bits of precision of the histogram buckets: values are recorded with a relative error below 1/2**(SUB_BITS - 1)
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in microseconds: buckets are linear up to 32 µs, then each power of two
+    is split in 16 buckets. Recording is O(1) and the memory is fixed.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * HALF_SUB_BUCKETS * 64))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        """Index of the bucket of `value`"""
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BITS
+        return (shift << (SUB_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def bucket_value(index: int) -> int:
+        """Lowest value of the bucket `index`"""
+        if index < SUB_BUCKETS:
+            return index
+        shift = index // HALF_SUB_BUCKETS - 1
+        return (index - shift * HALF_SUB_BUCKETS) << shift
+
+    def record(self, value: int):
+        """Record a latency, in microseconds"""
+        value = max(0, value)
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> int:
+        """Latency (in microseconds) below which `percentile` % of the recorded latencies are"""
+        if not self.count:
+            return 0
+        threshold = self.count * percentile / 100
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if count and cumulated >= threshold:
+                return self.bucket_value(index)
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, mean, percentiles and maximum, in microseconds"""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count) if self.count else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Tracer:
+    """
+    Record, for each stage of the processing of the data received from the Arduinos, the latency since
+    the data was read from serial. The start time is kept per thread: the reader thread calls begin(),
+    and the stages called synchronously from it (sensor dispatch, condition, event and action firing)
+    call mark(). Work deferred to another thread carries the start time with it (see current()).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._dump_handle = None
+
+    def begin(self, start: int = None):
+        """
+        Start tracing the data read by the current thread, now or at `start` (time.monotonic_ns()),
+        for data read earlier by another process of the cluster
+        """
+        if self.enabled:
+            self._local.start = time.monotonic_ns() if start is None else start
+
+    def end(self):
+        """Stop tracing in the current thread"""
+        self._local.start = None
+
+    def current(self):
+        """Start time of the trace of the current thread, or None"""
+        return getattr(self._local, 'start', None) if self.enabled else None
+
+    def mark(self, stage: str, key=None, start=None):
+        """
+        Record the latency of `stage` (for the event, action or Arduino `key`) since `start`,
+        or since the beginning of the trace of the current thread
+        """
+        if not self.enabled:
+            return
+        if start is None:
+            start = getattr(self._local, 'start', None)
+            if start is None:
+                return
+        histogram = self.histograms.get((stage, key))
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault((stage, key), LatencyHistogram())
+        histogram.record((time.monotonic_ns() - start) // 1000)
+
+    def snapshot(self) -> dict:
+        """Summary of all the histograms, as {stage: {key: summary}}"""
+        snapshot = {}
+        for (stage, key), histogram in list(self.histograms.items()):
+            snapshot.setdefault(stage, {})[str(key) if key is not None else "*"] = histogram.summary()
+        return snapshot
+
+    def reset(self):
+        """Forget all the recorded latencies"""
+        with self._lock:
+            self.histograms = {}
+
+    def dump(self, filename: str):
+        """Write the snapshot to `filename`, as JSON"""
+        with open(filename, 'w') as file:
+            json.dump({"time": time.time(), "latencies_us": self.snapshot()}, file, indent=2)
+
+    def start_dumping(self, filename: str, interval: float = 60):
+        """Dump the snapshot to `filename` every `interval` seconds, from the runtime's scheduler"""
+        from runtime.logs import get_logger
+        from runtime.runtime import get_runtime
+
+        def dump():
+            try:
+                self.dump(filename)
+            except OSError as error:
+                get_logger("tracing").error("Cannot write latencies to %s: %s", filename, error)
+            self._dump_handle = get_runtime().call_later(interval, dump)
+
+        self._dump_handle = get_runtime().call_later(interval, dump)
+
+    def stop_dumping(self):
+        if self._dump_handle:
+            self._dump_handle.cancel()
+            self._dump_handle = None
+
+
+# Tracer shared by the whole program
+tracer = Tracer()
@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+
+__all__ = ["Filter", "MedianFilter", "EMAFilter", "SampleRateFilter", "HysteresisFilter", "DwellFilter",
+           "FILTER_CLASSES", "build_filters"]
+
+
+class Filter(ABC):
+    """
+    Base class for sensor filters. A filter processes each sample of a sensor in place, and can drop it
+    so that the sensor events listening to the sensor are not evaluated. The samples are finite numbers
+    """
+
+    __slots__ = ('nbr_values',)
+
+    def __init__(self, nbr_values):
+        self.nbr_values = nbr_values
+
+    @abstractmethod
+    def process(self, values: array, now: float) -> bool:
+        """
+        Filter `values`, received at time `now` (in seconds), in place.
+        Return False if the sample must be dropped
+        """
+
+    def reset(self):
+        """Forget the samples received so far"""
+
+
+class MedianFilter(Filter):
+    """Moving median of the last `window` samples, to remove isolated spikes"""
+
+    __slots__ = ('window', '_ring', '_sorted', '_index', '_count')
+
+    def __init__(self, nbr_values, window=5):
+        super().__init__(nbr_values)
+        self.window = int(window)
+        if self.window < 1:
+            raise ValueError(f"median window must be at least 1, not {window!r}")
+        # Last samples of each value, in order of arrival then sorted
+        self._ring = [array('d', bytes(8 * self.window)) for _ in range(nbr_values)]
+        self._sorted = [array('d') for _ in range(nbr_values)]
+        self.reset()
+
+    def reset(self):
+        self._index = 0
+        self._count = 0
+        for sorted_values in self._sorted:
+            del sorted_values[:]
+
+    def process(self, values, now):
+        full = self._count == self.window
+        for channel in range(self.nbr_values):
+            ring, sorted_values = self._ring[channel], self._sorted[channel]
+            if full:
+                del sorted_values[bisect_left(sorted_values, ring[self._index])]
+            ring[self._index] = values[channel]
+            insort(sorted_values, values[channel])
+            middle = len(sorted_values) // 2
+            values[channel] = sorted_values[middle] if len(sorted_values) % 2 \
+                else (sorted_values[middle - 1] + sorted_values[middle]) / 2
+        self._index = (self._index + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+        return True
+
+
+class EMAFilter(Filter):
+    """Exponential smoothing: each new sample only moves the value by a fraction `alpha` of the difference"""
+
+    __slots__ = ('alpha', '_smoothed', '_started')
+
+    def __init__(self, nbr_values, alpha=.5):
+        super().__init__(nbr_values)
+        self.alpha = float(alpha)
+        if not 0 < self.alpha <= 1:
+            raise ValueError(f"ema alpha must be in ]0, 1], not {alpha!r}")
+        self._smoothed = array('d', bytes(8 * nbr_values))
+        self.reset()
+
+    def reset(self):
+        self._started = False
+
+    def process(self, values, now):
+        if not self._started:
+            self._smoothed[:] = values
+            self._started = True
+            return True
+        for channel in range(self.nbr_values):
+            self._smoothed[channel] += self.alpha * (values[channel] - self._smoothed[channel])
+            values[channel] = self._smoothed[channel]
+        return True
+
+
+class SampleRateFilter(Filter):
+    """Drop the samples received less than `interval` seconds after the last sample kept"""
+
+    __slots__ = ('interval', '_last')
+
+    def __init__(self, nbr_values, interval=.1):
+        super().__init__(nbr_values)
+        self.interval = float(interval)
+        if self.interval < 0:
+            raise ValueError(f"rate_limit interval must be positive, not {interval!r}")
+        self.reset()
+
+    def reset(self):
+        self._last = None
+
+    def process(self, values, now):
+        if self._last is not None and now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+
+class HysteresisFilter(Filter):
+    """
+    Only let a sample through when one of its values moved by more than `band` from the last sample kept,
+    so that a value jittering around a threshold does not cross it back and forth
+    """
+
+    __slots__ = ('band', '_kept', '_started')
+
+    def __init__(self, nbr_values, band=1.):
+        super().__init__(nbr_values)
+        self.band = float(band)
+        if self.band < 0:
+            raise ValueError(f"hysteresis band must be positive, not {band!r}")
+        self._kept = array('d', bytes(8 * nbr_values))
+        self.reset()
+
+    def reset(self):
+        self._started = False
+
+    def process(self, values, now):
+        if self._started and all(abs(values[channel] - self._kept[channel]) <= self.band
+                                 for channel in range(self.nbr_values)):
+            return False
+        self._kept[:] = values
+        self._started = True
+        return True
+
+
+class DwellFilter(Filter):
+    """
+    Only accept a new value once the samples have stayed away from the current value (by more than `band`)
+    for at least `time` seconds. Shorter changes are dropped
+    """
+
+    __slots__ = ('time', 'band', '_kept', '_changed_since', '_started')
+
+    def __init__(self, nbr_values, time=.5, band=0.):
+        super().__init__(nbr_values)
+        self.time = float(time)
+        self.band = float(band)
+        if self.time < 0 or self.band < 0:
+            raise ValueError(f"dwell time and band must be positive, not {time!r} and {band!r}")
+        self._kept = array('d', bytes(8 * nbr_values))
+        self.reset()
+
+    def reset(self):
+        self._started = False
+        self._changed_since = None
+
+    def process(self, values, now):
+        if not self._started:
+            self._kept[:] = values
+            self._started = True
+            return True
+        if all(abs(values[channel] - self._kept[channel]) <= self.band for channel in range(self.nbr_values)):
+            self._changed_since = None
+            return False
+        if self._changed_since is None:
+            self._changed_since = now
+        if now - self._changed_since < self.time:
+            return False
+        self._kept[:] = values
+        self._changed_since = None
+        return True
+
+
+# Filter classes by filter type, as used in sketches
+FILTER_CLASSES = {
+    "median": MedianFilter,
+    "ema": EMAFilter,
+    "rate_limit": SampleRateFilter,
+    "hysteresis": HysteresisFilter,
+    "dwell": DwellFilter,
+}
+
+
+def build_filters(filters_json, nbr_values):
+    """
+    Build the filter pipeline of a sensor from its JSON, a list of {"type": ..., parameters...}.
+    Raise ValueError if a filter is unknown or has invalid parameters
+    """
+    filters = []
+    for filter_json in filters_json:
+        parameters = dict(filter_json)
+        filter_type = parameters.pop('type', None)
+        if filter_type not in FILTER_CLASSES:
+            raise ValueError(f"unknown filter type {filter_type!r} (allowed: {', '.join(FILTER_CLASSES)})")
+        try:
+            filters.append(FILTER_CLASSES[filter_type](nbr_values, **parameters))
+        except TypeError as error:
+            raise ValueError(f"invalid parameters for filter {filter_type!r}: {error}") from error
+    return filters
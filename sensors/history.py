@@ -0,0 +1,340 @@
+"""
+History of the values of the sensors: a ring buffer per sensor in memory, written periodically to column files
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from runtime.logs import get_logger
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['SensorHistory', 'HistoryStore', 'load_history']
+
+logger = get_logger("sensors")
+
+# Size of an item of the column files (float64, native byte order)
+ITEM_SIZE = array('d').itemsize
+
+
+class SensorHistory:
+    """
+    Last `capacity` samples of a sensor, with their monotonic time: one array for the times and one array
+    per variable, written in place. Recording a sample is O(1) and allocates nothing; `total` counts all the
+    samples recorded, so that a reader in another thread knows which ones were overwritten meanwhile.
+    """
+
+    __slots__ = ('variables', 'capacity', 'times', 'columns', 'total')
+
+    def __init__(self, variables, capacity: int = 3600):
+        if capacity <= 0:
+            raise ValueError(f"History capacity must be positive, not {capacity!r}")
+        self.variables = tuple(variables)
+        self.capacity = capacity
+        self.times = array('d', bytes(ITEM_SIZE * capacity))
+        self.columns = [array('d', bytes(ITEM_SIZE * capacity)) for _ in self.variables]
+        self.total = 0
+
+    def record(self, now: float, values):
+        """
+        Add the sample `values` (one value per variable) received at monotonic time `now`
+        """
+        index = self.total % self.capacity
+        self.times[index] = now
+        for column, value in zip(self.columns, values):
+            column[index] = value
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def _first_since(self, since: float) -> int:
+        """Number of samples (from the oldest one kept) older than monotonic time `since`"""
+        count = len(self)
+        start = self.total - count
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[(start + middle) % self.capacity] < since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def window(self, seconds: float = None, now: float = None):
+        """
+        Times and values (as {variable: list}) of the samples of the last `seconds` seconds
+        (all the samples kept if None), oldest first
+        """
+        count = len(self)
+        start = self.total - count
+        if seconds is not None:
+            start += self._first_since((time.monotonic() if now is None else now) - seconds)
+        indices = [index % self.capacity for index in range(start, self.total)]
+        return ([self.times[index] for index in indices],
+                {variable: [column[index] for index in indices] for variable, column in zip(self.variables, self.columns)})
+
+    def stats(self, seconds: float = None, now: float = None) -> dict:
+        """
+        Number of samples of the last `seconds` seconds (all the samples kept if None), and the minimum,
+        maximum and mean of each variable over them, as {"count": n, variable: {"min", "max", "mean"}}
+        """
+        times, values = self.window(seconds, now)
+        stats = {"count": len(times)}
+        for variable, column in values.items():
+            stats[variable] = {
+                "min": min(column),
+                "max": max(column),
+                "mean": sum(column) / len(column),
+            } if column else None
+        return stats
+
+    def min(self, variable: str, seconds: float = None):
+        """Minimum of `variable` over the last `seconds` seconds, None if there is no sample"""
+        stats = self.stats(seconds)[variable]
+        return stats and stats["min"]
+
+    def max(self, variable: str, seconds: float = None):
+        """Maximum of `variable` over the last `seconds` seconds, None if there is no sample"""
+        stats = self.stats(seconds)[variable]
+        return stats and stats["max"]
+
+    def mean(self, variable: str, seconds: float = None):
+        """Mean of `variable` over the last `seconds` seconds, None if there is no sample"""
+        stats = self.stats(seconds)[variable]
+        return stats and stats["mean"]
+
+    def __repr__(self):
+        return f"<SensorHistory variables={self.variables} samples={len(self)}/{self.capacity}>"
+
+
+class HistoryStore:
+    """
+    Histories of the sensors, by sensor name. If `directory` is given, a thread of the store appends the samples
+    recorded every `interval` seconds to column files in directory/<sensor>/: "NNNNNN-time.f64" (wall-clock
+    times) and "NNNNNN-<variable>.f64", as float64, the variables of the segment NNNNNN being listed in
+    "NNNNNN-variables.json". Each flush writes each column once, so the SD card only sees a few large writes;
+    a segment holds at most `segment_size` samples, a new one is started when the variables of the sensor
+    change, and only the last `max_segments` segments of each sensor are kept. Samples overwritten in memory before being flushed
+    (more than `capacity` samples per interval) are counted in `samples_lost`.
+    """
+
+    def __init__(self, capacity: int = 3600, directory=None, interval: float = 60., segment_size: int = 1 << 17,
+                 max_segments: int = 8):
+        self.capacity = capacity
+        self.directory = directory
+        self.interval = interval
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.histories = {}
+        # Total of samples of each history already written, current segment and its number of samples
+        self._flushed = {}
+        self._segments = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        # Metrics
+        self.samples_written = 0
+        self.samples_lost = 0
+        self.writes = 0
+
+    def attach(self, sensor):
+        """
+        Record the samples of `sensor`. A sensor with the same name and variables keeps the history of the previous one,
+        otherwise its samples are written to a new segment
+        """
+        with self._lock:
+            history = self.histories.get(sensor.name)
+            if history is None or history.variables != sensor.variables:
+                if history is not None:
+                    try:
+                        self._flush(sensor.name)
+                    except OSError as error:
+                        logger.error("History of %s not written: %s", sensor.name, error, extra={"sensor": sensor.name})
+                    self._segments.pop(sensor.name, None)
+                history = self.histories[sensor.name] = SensorHistory(sensor.variables, self.capacity)
+                self._flushed[sensor.name] = 0
+            sensor.history = history
+
+    def __getitem__(self, name) -> SensorHistory:
+        return self.histories[name]
+
+    def start(self):
+        """
+        Write the samples every interval from a new thread, and when the program exits. Non blocking.
+        """
+        if not self.directory or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="HistoryWriterThread", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """
+        Stop writing periodically, and write the samples not written yet
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.stop)
+        self.flush()
+
+    def flush(self):
+        """
+        Write the samples recorded since the last flush to the files
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            for name in list(self.histories):
+                try:
+                    self._flush(name)
+                except OSError as error:
+                    logger.error("History of %s not written: %s", name, error, extra={"sensor": name})
+
+    def _flush(self, name):
+        if not self.directory:
+            return
+        history = self.histories[name]
+        total = history.total
+        first = max(self._flushed[name], total - history.capacity)
+        self.samples_lost += first - self._flushed[name]
+        # Wall-clock time of the monotonic times
+        offset = time.time() - time.monotonic()
+        while first < total:
+            segment, count = self._segment(name)
+            # Samples of this segment, without wrapping around the ring (at most two passes)
+            start = first % history.capacity
+            stop = min(start + (total - first), history.capacity, start + self.segment_size - count)
+            times = array('d', (value + offset for value in history.times[start:stop]))
+            columns = [column[start:stop] for column in history.columns]
+            # The reader may have overwritten the oldest samples meanwhile: drop them
+            overwritten = history.total - history.capacity - first
+            if overwritten > 0:
+                skip = min(overwritten, stop - start)
+                self.samples_lost += skip
+                first += skip
+                times, columns = times[skip:], [column[skip:] for column in columns]
+            if times:
+                path = os.path.join(self.directory, name, f"{segment:06d}")
+                self._append(f"{path}-time.f64", times)
+                for variable, column in zip(history.variables, columns):
+                    self._append(f"{path}-{variable}.f64", column)
+                self._segments[name] = (segment, count + len(times))
+                self.samples_written += len(times)
+                first += len(times)
+        self._flushed[name] = first
+
+    def _segment(self, name):
+        """
+        Current segment of the sensor `name` and its number of samples, starting a new segment if it is full
+        or was written with other variables
+        """
+        history = self.histories[name]
+        directory = os.path.join(self.directory, name)
+        if name not in self._segments:
+            os.makedirs(directory, exist_ok=True)
+            segments = _segments(directory)
+            segment = segments[-1] if segments else 0
+            path = os.path.join(directory, f"{segment:06d}-time.f64")
+            count = os.path.getsize(path) // ITEM_SIZE if os.path.exists(path) else 0
+            if count and _variables(directory, segment) != list(history.variables):
+                segment, count = segment + 1, 0
+            self._segments[name] = (segment, count)
+        segment, count = self._segments[name]
+        if count >= self.segment_size:
+            segment, count = segment + 1, 0
+            self._segments[name] = (segment, count)
+            self._remove_old_segments(name, segment)
+        if not count:
+            with open(os.path.join(directory, f"{segment:06d}-variables.json"), "w", encoding="utf-8") as file:
+                json.dump(list(history.variables), file)
+        return segment, count
+
+    def _remove_old_segments(self, name, segment):
+        directory = os.path.join(self.directory, name)
+        for filename in os.listdir(directory):
+            if filename[:6].isdigit() and int(filename[:6]) <= segment - self.max_segments:
+                os.remove(os.path.join(directory, filename))
+
+    def _append(self, filename, column):
+        with open(filename, "ab") as file:
+            column.tofile(file)
+        self.writes += 1
+
+    def __repr__(self):
+        return f"<HistoryStore sensors={len(self.histories)} directory={self.directory} written={self.samples_written}>"
+
+
+def _segments(directory):
+    """Numbers of the segments in `directory`, in order"""
+    return sorted({int(filename[:6]) for filename in os.listdir(directory)
+                   if filename[:6].isdigit() and filename.endswith("-time.f64")})
+
+
+def _variables(directory, segment):
+    """Variables of the segment `segment` in `directory` (from variables.json for the older segments)"""
+    path = os.path.join(directory, f"{segment:06d}-variables.json")
+    if not os.path.exists(path):
+        path = os.path.join(directory, "variables.json")
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _read_column(path, size):
+    """First `size` values of the column file `path`, memory-mapped with NumPy"""
+    if numpy is not None:
+        return numpy.memmap(path, dtype=numpy.float64, mode="r", shape=(size,))
+    part = array('d')
+    with open(path, "rb") as file:
+        part.fromfile(file, size)
+    return part
+
+
+def load_history(directory, name):
+    """
+    Load the history of the sensor `name` written by a HistoryStore in `directory`, as {column: values} with
+    the "time" column (wall-clock times) and one column per variable of any segment, NaN in the segments
+    written without it. With NumPy, each segment is memory-mapped rather than read, and the columns are arrays;
+    without it they are arrays of the array module.
+    """
+    directory = os.path.join(directory, name)
+    segments = [(segment, _variables(directory, segment)) for segment in _segments(directory)]
+    columns = ["time"]
+    for _segment, variables in segments:
+        columns.extend(variable for variable in variables if variable not in columns)
+    parts = {column: [] for column in columns}
+    for segment, variables in segments:
+        paths = {column: os.path.join(directory, f"{segment:06d}-{column}.f64") for column in ["time"] + variables}
+        # A flush interrupted between two columns leaves them with different lengths
+        size = min(os.path.getsize(path) // ITEM_SIZE if os.path.exists(path) else 0 for path in paths.values())
+        if not size:
+            continue
+        for column in columns:
+            if column in paths:
+                parts[column].append(_read_column(paths[column], size))
+            elif numpy is not None:
+                parts[column].append(numpy.full(size, numpy.nan))
+            else:
+                parts[column].append(array('d', [math.nan]) * size)
+    history = {}
+    for column, column_parts in parts.items():
+        if numpy is not None:
+            history[column] = numpy.concatenate(column_parts) if len(column_parts) > 1 else \
+                column_parts[0] if column_parts else numpy.empty(0)
+        else:
+            history[column] = sum(column_parts, array('d'))
+    return history
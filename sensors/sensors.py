@@ -1,27 +1,91 @@
-from pydispatch import Dispatcher, ListProperty
+import threading
+import time
+from array import array
+from math import isfinite
 
-__all__ = ["Sensor", "DistanceSensor", "MovementSensor", "ColorSensor"]
+__all__ = ["Sensor", "DistanceSensor", "MovementSensor", "ColorSensor", "SENSOR_CLASSES"]
 
 
-class Sensor(Dispatcher):
+class Sensor:
     """Base class for all sensors"""
 
-    values = ListProperty(copy_on_change=True)
+    __slots__ = ('name', 'nbr_values', 'values', 'variables_values', 'listeners', 'filters', 'history', '_sample',
+                 '_listeners_lock')
 
-    def __init__(self, name):
-        super().__init__()
+    # Names of the values, as used in sensor event conditions
+    variables = ()
+
+    def __init__(self, name, filters=()):
         self.name = name
-        self.nbr_values = None
+        self.nbr_values = len(self.variables)
+        # Last values received, converted to float and filtered
+        self.values = array('d', bytes(8 * self.nbr_values))
+        # Filters applied in order to each sample (see sensors.filters). A sample dropped by a filter
+        # does not update the values nor notify the listeners
+        self.filters = list(filters)
+        # SensorHistory the values are recorded to, if any (see sensors.history)
+        self.history = None
+        # Sample being filtered
+        self._sample = array('d', bytes(8 * self.nbr_values))
+        # Same values by variable name, updated in place and used to evaluate conditions
+        self.variables_values = dict.fromkeys(self.variables, 0.)
+        # Sensor events currently listening to the sensor. The list is replaced (never modified
+        # in place) when events subscribe or unsubscribe, so it can be iterated safely. The replacements
+        # are made under the lock: events subscribe from the scheduler and unsubscribe from the reader
+        self.listeners = []
+        self._listeners_lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """
+        Call `listener.sensor_updated(sensor)` every time new values are received
+        """
+        with self._listeners_lock:
+            if listener not in self.listeners:
+                self.listeners = self.listeners + [listener]
+
+    def unsubscribe(self, listener):
+        """
+        Stop calling `listener` when new values are received
+        """
+        with self._listeners_lock:
+            if listener in self.listeners:
+                self.listeners = [other for other in self.listeners if other is not listener]
 
     def data_received(self, data: list):
-        self.values = data
+        """
+        Handle a sample received from the Arduino. The values are converted to float: a sample with a value
+        that is not a finite number (or with too few values) is dropped, so conditions, filters and the history
+        only see numbers
+        """
+        if len(data) < self.nbr_values:
+            return
+        sample = self._sample
+        try:
+            for index in range(self.nbr_values):
+                value = sample[index] = float(data[index])
+                if not isfinite(value):
+                    return
+        except ValueError:
+            return
+        if self.filters or self.history is not None:
+            now = time.monotonic()
+            for sensor_filter in self.filters:
+                if not sensor_filter.process(sample, now):
+                    return
+        for index, value in enumerate(sample):
+            self.values[index] = value
+            self.variables_values[self.variables[index]] = value
+        if self.history is not None:
+            self.history.record(now, sample)
+        for listener in self.listeners:
+            listener.sensor_updated(self)
 
 
 class DistanceSensor(Sensor):
     """Class for the ultrasonic distance sensor"""
-    def __init__(self, name):
-        super().__init__(name)
-        self.nbr_values = 1
+
+    __slots__ = ()
+    variables = ("distance",)
 
     @property
     def distance(self):
@@ -31,9 +95,9 @@ class DistanceSensor(Sensor):
 
 class MovementSensor(Sensor):
     """Class for the movement sensor"""
-    def __init__(self, name):
-        super().__init__(name)
-        self.nbr_values = 1
+
+    __slots__ = ()
+    variables = ("movement",)
 
     @property
     def movement(self):
@@ -43,9 +107,9 @@ class MovementSensor(Sensor):
 
 class ColorSensor(Sensor):
     """Class for the color sensor"""
-    def __init__(self, name):
-        super().__init__(name)
-        self.nbr_values = 3
+
+    __slots__ = ()
+    variables = ("red", "green", "blue")
 
     @property
     def red(self):
@@ -59,3 +123,11 @@ class ColorSensor(Sensor):
     def blue(self):
         """blue value"""
         return self.values[2]
+
+
+# Sensor classes by sensor type, as used in sketches
+SENSOR_CLASSES = {
+    "distance": DistanceSensor,
+    "movement": MovementSensor,
+    "color": ColorSensor,
+}
@@ -0,0 +1,86 @@
+"""
+Fake Arduinos on pseudo-terminals, to test the serial code without boards
+"""
+
+import os
+import select
+import threading
+import time
+
+__all__ = ['FakeArduino', 'wait_until']
+
+
+def wait_until(predicate, timeout=2.):
+    """
+    Wait until `predicate()` is true or `timeout` seconds have passed. Return the last value of `predicate()`
+    """
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(.01)
+    return predicate()
+
+
+class FakeArduino():
+    """
+    Arduino on the master side of a pseudo-terminal: `port` is the device the serial code opens.
+    With an `identity`, a thread answers the "identify" commands, and keeps the other lines received in `commands`.
+    """
+
+    def __init__(self, identity=None):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.identity = identity
+        self.commands = []
+        self._thread = None
+        if identity is not None:
+            self._thread = threading.Thread(target=self._answer, daemon=True)
+            self._thread.start()
+
+    def _answer(self):
+        buffer = b""
+        while self.master is not None:
+            try:
+                ready, _, _ = select.select([self.master], [], [], .05)
+                if not ready:
+                    continue
+                buffer += os.read(self.master, 4096)
+            except (OSError, TypeError, ValueError):
+                return
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line = line.decode().strip()
+                if line == "identify":
+                    self.send_line(f"identity {self.identity}")
+                elif line:
+                    self.commands.append(line)
+
+    def send_line(self, line: str):
+        """Send a line, as the Arduino would"""
+        try:
+            os.write(self.master, (line + "\n").encode())
+        except (OSError, TypeError):
+            # Unplugged meanwhile
+            pass
+
+    def send_bytes(self, data: bytes):
+        os.write(self.master, data)
+
+    def read(self, size=4096, timeout=1.) -> bytes:
+        """Bytes written to the Arduino, empty if none were written within `timeout` seconds"""
+        ready, _, _ = select.select([self.master], [], [], timeout)
+        return os.read(self.master, size) if ready else b""
+
+    def unplug(self):
+        """Close the pseudo-terminal, as if the Arduino was unplugged"""
+        fds, self.master, self.slave = (self.master, self.slave), None, None
+        if self._thread is not None:
+            self._thread.join()
+        for fd in fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.master is not None:
+            self.unplug()
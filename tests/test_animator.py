@@ -0,0 +1,54 @@
+import threading
+import unittest
+import numpy
+from leds.Animation import Fade
+from leds.Animator import Animator
+from tests.pty_arduino import wait_until
+
+
+class FakeLeds:
+    """LedManager without an Arduino, whose first renders can fail"""
+
+    def __init__(self, nbr_leds=8, failures=0):
+        self.lock = threading.RLock()
+        self.base = numpy.zeros((nbr_leds, 3), dtype=numpy.uint8)
+        self.frames = []
+        self.failures = failures
+        self.bytes_written = 0
+        self.baudrate = 0
+
+    def render(self, frame):
+        if self.failures:
+            self.failures -= 1
+            raise ValueError("frame not sent")
+        self.frames.append(frame.copy())
+
+
+class AnimatorTest(unittest.TestCase):
+
+    def test_animations_played(self):
+        leds = FakeLeds()
+        animator = Animator(leds, rate=100)
+        animator.start(Fade(range(4), color="#ff0000", duration=.05))
+        self.assertTrue(animator.running)
+        self.assertTrue(wait_until(lambda: not animator.running))
+        # The fade persists
+        self.assertEqual(leds.base[:4].tolist(), [[255, 0, 0]] * 4)
+        self.assertEqual(leds.base[4:].tolist(), [[0, 0, 0]] * 4)
+
+    def test_error_while_rendering(self):
+        leds = FakeLeds(failures=1)
+        animator = Animator(leds, rate=100)
+        with self.assertLogs("alice.leds", "ERROR") as logs:
+            animator.start(Fade(range(4), duration=10))
+            self.assertTrue(wait_until(lambda: not animator.running))
+        self.assertIn("LED animations stopped", logs.output[0])
+        self.assertEqual(len(animator), 0)
+        # Animations can still be started
+        animator.start(Fade(range(4), duration=.05))
+        self.assertTrue(wait_until(lambda: leds.frames))
+        self.assertTrue(wait_until(lambda: not animator.running))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from arduinomanager import BinaryProtocol
+from arduinomanager.ArduinoLinker import ArduinoLinker
+from arduinomanager.SerialReader import SerialReader
+from tests.pty_arduino import FakeArduino, wait_until
+
+
+class BinaryProtocolTest(unittest.TestCase):
+
+    def test_frames_round_trip(self):
+        frames = (BinaryProtocol.encode_sensor_data(1, [-3, 512]) + BinaryProtocol.encode_text("hello")
+                  + BinaryProtocol.encode_leds(2, 5, bytes(range(6))))
+        payloads, rest = BinaryProtocol.decode_frames(bytearray(frames))
+        self.assertEqual(rest, b"")
+        self.assertEqual(BinaryProtocol.decode_sensor_data(payloads[0]), (1, (-3, 512)))
+        self.assertEqual(payloads[1], bytes((BinaryProtocol.TEXT,)) + b"hello")
+        self.assertEqual(BinaryProtocol.decode_leds(payloads[2]), (2, 5, bytes(range(6))))
+
+    def test_long_leds_split_in_frames(self):
+        colors = bytes(range(256)) * 3
+        payloads, _ = BinaryProtocol.decode_frames(bytearray(BinaryProtocol.encode_leds(0, 0, colors)))
+        decoded = [BinaryProtocol.decode_leds(payload) for payload in payloads]
+        self.assertEqual([start for _strip, start, _colors in decoded], list(range(0, 256, BinaryProtocol.MAX_LEDS)))
+        self.assertEqual(b"".join(chunk for _strip, _start, chunk in decoded), colors)
+
+    def test_resynchronisation(self):
+        valid = BinaryProtocol.encode_sensor_data(0, [7])
+        corrupted = bytearray(BinaryProtocol.encode_sensor_data(0, [8]))
+        corrupted[-1] ^= 0xFF
+        buffer = bytearray(b"sensor d 12\n" + bytes(corrupted) + valid + valid[:3])
+        payloads, rest = BinaryProtocol.decode_frames(buffer)
+        self.assertEqual([BinaryProtocol.decode_sensor_data(payload) for payload in payloads], [(0, (7,))])
+        # The truncated frame is kept until the rest of it is received
+        self.assertEqual(bytes(rest), valid[:3])
+        payloads, rest = BinaryProtocol.decode_frames(rest + valid[3:])
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(rest, b"")
+
+
+class BinaryNegotiationTest(unittest.TestCase):
+    """Arduino on a pseudo-terminal switched to binary frames"""
+
+    def setUp(self):
+        self.reader = SerialReader()
+        self.arduino = FakeArduino()
+        self.linker = ArduinoLinker(self.arduino.port, name="ttyA", protocol="binary", write_window=.001)
+        self.lines = []
+        self.sensors = []
+        self.linker.set_data_received_callback(lambda _name, line: self.lines.append(line))
+        self.linker.set_sensor_data_callback(lambda _name, sensor, values: self.sensors.append((sensor, values)))
+        self.linker.start_listening(reader=self.reader)
+
+    def tearDown(self):
+        self.reader.stop()
+        self.linker.stop_listening()
+        self.linker.close()
+        self.arduino.close()
+
+    def negotiate(self):
+        self.arduino.send_line("identity board binary distance movement")
+        self.assertTrue(wait_until(lambda: self.linker.binary))
+        self.assertEqual(self.linker.identity, "board")
+        self.assertEqual(self.linker.sensor_ids, ["distance", "movement"])
+        self.assertEqual(self.arduino.read(), b"binary\n")
+
+    def test_negotiation_and_frames(self):
+        self.negotiate()
+        self.arduino.send_bytes(BinaryProtocol.encode_sensor_data(1, [1, -2]) + BinaryProtocol.encode_text("ready"))
+        self.assertTrue(wait_until(lambda: self.sensors and self.lines))
+        self.assertEqual(self.sensors, [("movement", (1, -2))])
+        self.assertEqual(self.lines, ["ready"])
+        # LEDS frames sent to the Arduino
+        frame = BinaryProtocol.encode_leds(0, 0, b"\xff\x00\x00")
+        self.linker.send_bytes(frame)
+        self.assertEqual(self.arduino.read(), frame)
+
+    def test_text_protocol_kept_if_not_asked(self):
+        self.linker.protocol = "text"
+        self.arduino.send_line("identity board binary distance")
+        self.assertTrue(wait_until(lambda: self.linker.identity == "board"))
+        self.assertFalse(self.linker.binary)
+        self.arduino.send_line("sensor distance 12")
+        self.assertTrue(wait_until(lambda: self.lines == ["sensor distance 12"]))
+
+    def test_resynchronisation_after_the_switch(self):
+        self.negotiate()
+        corrupted = bytearray(BinaryProtocol.encode_sensor_data(0, [5]))
+        corrupted[-1] ^= 0xFF
+        valid = BinaryProtocol.encode_sensor_data(0, [6])
+        # Text sent before the Arduino received "binary", a corrupted frame, a valid one sent in two parts
+        self.arduino.send_bytes(b"sensor distance 4\n" + bytes(corrupted) + valid[:2])
+        self.arduino.send_bytes(valid[2:])
+        self.assertTrue(wait_until(lambda: self.sensors))
+        self.assertEqual(self.sensors, [("distance", (6,))])
+        self.arduino.send_bytes(BinaryProtocol.encode_sensor_data(0, [7]))
+        self.assertTrue(wait_until(lambda: len(self.sensors) == 2))
+        self.assertEqual(self.sensors[1], ("distance", (7,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
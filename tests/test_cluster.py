@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from arduinomanager.ArduinosManager import ArduinosManager
+from arduinomanager.SerialReader import SerialReader
+from cluster.ClusterCoordinator import ClusterCoordinator
+from cluster.ClusterProtocol import connect
+from tests.pty_arduino import wait_until
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Node playing its channels with the null backend, without Arduinos
+NODE = """
+import sys
+from cluster.ClusterNode import ClusterNode
+node = ClusterNode(sys.argv[1], sys.argv[2], media_backend="null", retry_interval=.05)
+node.start(autodiscover=False)
+node.wait()
+"""
+
+
+class ClusterTest(unittest.TestCase):
+    """Coordinator in this process, nodes in other processes of the same host"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.directory.name, "cluster.sock")
+        self.reader = SerialReader()
+        self.coordinator = ClusterCoordinator(ArduinosManager(reader=self.reader), self.address, latency=.01,
+                                              sync_interval=.1)
+        self.coordinator.start()
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            process.kill()
+            process.wait()
+        self.coordinator.stop()
+        self.reader.stop()
+        self.directory.cleanup()
+
+    def start_node(self, name):
+        process = subprocess.Popen([sys.executable, "-c", NODE, name, self.address], cwd=ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.processes.append(process)
+        return process
+
+    def test_channel_played_by_a_node(self):
+        self.start_node("node-a")
+        node = self.coordinator.node("node-a")
+        self.assertTrue(wait_until(lambda: node.clock.synchronized, timeout=10))
+        player = node.backend.create_player()
+        transitions = []
+        player.set_transition_callback(transitions.append)
+        player.add_media("sound.wav")
+        player.play()
+        self.assertTrue(wait_until(lambda: transitions == [True]))
+        self.assertTrue(player.is_playing())
+        player.stop()
+        self.assertTrue(wait_until(lambda: transitions == [True, False]))
+
+    def test_second_node_with_the_same_name(self):
+        first = self.start_node("node-a")
+        node = self.coordinator.node("node-a")
+        self.assertTrue(wait_until(lambda: node.connected, timeout=10))
+        connection = node.connection
+        with self.assertLogs("alice.cluster", "ERROR") as logs:
+            self.start_node("node-a")
+            self.assertTrue(wait_until(lambda: logs.output, timeout=10))
+        self.assertIn("already connected", logs.output[0])
+        self.assertIs(node.connection, connection)
+        # Once the first one is gone, the second one takes its place
+        first.kill()
+        first.wait()
+        self.assertTrue(wait_until(lambda: node.connection not in (None, connection), timeout=10))
+
+    def test_node_not_reading(self):
+        # Node connected from this process, which never reads its messages
+        connection = connect(self.address)
+        connection.send({"type": "hello", "node": "node-b"})
+        node = self.coordinator.node("node-b")
+        self.assertTrue(wait_until(lambda: node.connected))
+        start = time.monotonic()
+        with self.assertLogs("alice.cluster", "ERROR") as logs:
+            while node.connected and time.monotonic() - start < 10:
+                node.send_bytes("leds", bytes(4096))
+        # Sending never blocked: the node was disconnected once too many messages were waiting
+        self.assertFalse(node.connected)
+        self.assertIn("does not read", logs.output[0])
+        self.assertLess(time.monotonic() - start, 5)
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
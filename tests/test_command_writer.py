@@ -0,0 +1,109 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from arduinomanager.ArduinoLinker import ArduinoLinker
+from arduinomanager.CommandWriter import CommandWriter
+from arduinomanager.SerialReader import SerialReader
+from events import actions
+from tests.pty_arduino import FakeArduino, wait_until
+
+
+class CommandWriterTest(unittest.TestCase):
+
+    def test_batches_and_replaces_params(self):
+        written = []
+        writer = CommandWriter(written.append, window=.05, name="leds")
+        writer.put("led 1")
+        writer.put("strip_params 1", key="strip_params")
+        writer.put("strip_params 2", key="strip_params")
+        self.assertTrue(wait_until(lambda: written))
+        self.assertEqual(written, [b"led 1\nstrip_params 2\n"])
+        self.assertEqual(writer.stats["commands_dropped"], 1)
+        writer.close()
+
+    def test_params_of_two_actions(self):
+        written = []
+        writer = CommandWriter(written.append, window=.05, name="leds")
+        writer.put("strip_params 1 10", key="strip_params a1")
+        writer.put("led 1")
+        writer.put("strip_params 2 20", key="strip_params a2")
+        writer.put("strip_params 1 11", key="strip_params a1")
+        self.assertTrue(wait_until(lambda: written))
+        # The parameters of each action are kept, the last ones of a1 in the place of the first ones
+        self.assertEqual(written, [b"strip_params 1 11\nled 1\nstrip_params 2 20\n"])
+        self.assertEqual(writer.stats["commands_dropped"], 1)
+        writer.close()
+
+    def test_actions_with_the_same_command(self):
+        sent = []
+        sketch = SimpleNamespace(send=lambda *args, **kwargs: sent.append((args, kwargs["key"])))
+        first, second = (actions.ArduinoAction({
+            "id": action_id, "name": action_id, "action": "strip", "options": {"strip": strip, "color": "red"},
+            "options_order": ["strip", "color"]}) for action_id, strip in (("a1", 1), ("a2", 2)))
+        with mock.patch.object(actions, "sketch", sketch):
+            first.update_params()
+            second.update_params()
+        (first_args, first_key), (second_args, second_key) = sent
+        self.assertEqual((first_args, second_args), (("strip_params", 1, "red"), ("strip_params", 2, "red")))
+        self.assertNotEqual(first_key, second_key)
+
+    def test_bytes_keep_their_order(self):
+        written = []
+        writer = CommandWriter(written.append, window=.05, name="leds")
+        writer.put("led 1")
+        writer.put_bytes(b"\xa5\x01\x02")
+        writer.put("led 2")
+        self.assertTrue(wait_until(lambda: written))
+        self.assertEqual(written, [b"led 1\n\xa5\x01\x02led 2\n"])
+        writer.close()
+
+    def test_slow_arduino_does_not_delay_the_others(self):
+        unblock = threading.Event()
+        written = []
+        slow = CommandWriter(lambda data: unblock.wait(), window=.001, name="slow")
+        fast = CommandWriter(written.append, window=.001, name="fast")
+        slow.put("led 1")
+        fast.put("led 2")
+        self.assertTrue(wait_until(lambda: written == [b"led 2\n"]))
+        unblock.set()
+        slow.close()
+        fast.close()
+
+    def test_write_error(self):
+        errors = []
+
+        def write(_data):
+            raise OSError("Input/output error")
+
+        writer = CommandWriter(write, window=.001, name="leds", on_error=errors.append)
+        with self.assertLogs("alice.arduinos", "ERROR") as logs:
+            writer.put("led 1")
+            self.assertTrue(wait_until(lambda: errors))
+        self.assertIn("leds", logs.output[0])
+        self.assertEqual(writer.errors, 1)
+        writer.close()
+
+    def test_write_error_loses_the_connection(self):
+        reader = SerialReader()
+        arduino = FakeArduino()
+        linker = ArduinoLinker(arduino.port, name="ttyA", write_window=.001)
+        lost = []
+        linker.set_connection_lost_callback(lost.append)
+        linker.start_listening(reader=reader)
+
+        def write(_data):
+            raise OSError("Input/output error")
+
+        linker.writer._write = write
+        with self.assertLogs("alice.arduinos", "ERROR"):
+            linker.send_command("led", 1)
+            self.assertTrue(wait_until(lambda: lost == ["ttyA"]))
+        self.assertEqual(reader.linkers, [])
+        linker.close()
+        reader.stop()
+        arduino.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from events.conditions import Condition
+
+NAMES = ("distance", "light")
+
+
+class ConditionTest(unittest.TestCase):
+
+    def assertForbidden(self, source, message):
+        with self.assertRaises(ValueError) as context:
+            Condition(source, NAMES)
+        self.assertIn(message, str(context.exception))
+
+    def test_comparisons(self):
+        condition = Condition("distance < 50", NAMES)
+        self.assertTrue(condition({"distance": 49, "light": 0}))
+        self.assertFalse(condition({"distance": 50, "light": 0}))
+        self.assertTrue(Condition("20 <= distance <= 30", NAMES)({"distance": 20}))
+        self.assertFalse(Condition("20 <= distance <= 30", NAMES)({"distance": 30.5}))
+        self.assertTrue(Condition("distance != light", NAMES)({"distance": 1, "light": 2}))
+        self.assertTrue(Condition("distance == -light", NAMES)({"distance": -3, "light": 3}))
+
+    def test_boolean_logic(self):
+        condition = Condition("distance < 50 and not light > 100 or distance == 0", NAMES)
+        self.assertTrue(condition({"distance": 10, "light": 100}))
+        self.assertFalse(condition({"distance": 10, "light": 101}))
+        self.assertTrue(condition({"distance": 0, "light": 101}))
+        self.assertFalse(condition({"distance": 60, "light": 0}))
+
+    def test_arithmetic(self):
+        condition = Condition("(distance + light) / 2 > 10 if light else distance % 3 == 1", NAMES)
+        self.assertTrue(condition({"distance": 15, "light": 10}))
+        self.assertFalse(condition({"distance": 5, "light": 10}))
+        self.assertTrue(condition({"distance": 7, "light": 0}))
+
+    def test_failing_arithmetic_is_false(self):
+        self.assertFalse(Condition("100 / distance > 1", NAMES)({"distance": 0}))
+        self.assertFalse(Condition("100 // distance > 1", NAMES)({"distance": 0}))
+        self.assertFalse(Condition("100 % distance > 1", NAMES)({"distance": 0}))
+        # Integer too large to be converted to a float
+        self.assertFalse(Condition(f"1{'0' * 400} / distance > 1", NAMES)({"distance": 2.}))
+
+    def test_forbidden_syntax(self):
+        self.assertForbidden("distance.real > 1", "forbidden syntax Attribute")
+        self.assertForbidden("abs(distance) > 1", "forbidden syntax Call")
+        self.assertForbidden("distance[0] > 1", "forbidden syntax Subscript")
+        self.assertForbidden("(lambda: distance)", "forbidden syntax Lambda")
+        self.assertForbidden("[d for d in (1, 2)]", "forbidden syntax ListComp")
+        self.assertForbidden("distance ** 2 > 1", "forbidden syntax Pow")
+        self.assertForbidden("distance in (1, 2)", "forbidden syntax")
+
+    def test_forbidden_constants(self):
+        self.assertForbidden("'a' * 10 == distance", "forbidden constant 'a'")
+        self.assertForbidden("distance == b'a'", "forbidden constant b'a'")
+        self.assertForbidden("distance == None", "forbidden constant None")
+
+    def test_unknown_names(self):
+        self.assertForbidden("temperature > 1", "unknown name 'temperature'")
+        self.assertForbidden("__import__ == distance", "unknown name '__import__'")
+        # Only the names given are allowed
+        with self.assertRaises(ValueError):
+            Condition("distance > 1", ())
+
+    def test_malformed(self):
+        self.assertForbidden("distance >", "Malformed condition")
+        self.assertForbidden("distance = 1", "Malformed condition")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import http.client
+import json
+import socket
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from control.ControlServer import ControlServer
+from events.events import Event
+
+
+class ControlServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fired = []
+        self.sketch = SimpleNamespace(
+            events={"start": Event({"id": "start", "name": "start", "delay": 0})}, sensors={},
+            arduinos_manager=SimpleNamespace(arduinos={}), mediamanager=SimpleNamespace(players={}), runtime=None,
+            cluster=None, leds=None, history=None, fire_event=self.fired.append)
+        # Events fired at once rather than from the scheduler
+        patch = mock.patch("control.ControlServer.get_runtime",
+                           return_value=SimpleNamespace(call_soon=lambda callback, *args: callback(*args)))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+
+    def start(self, token=None):
+        self.server = ControlServer(self.sketch, "127.0.0.1:0", interval=.05, token=token)
+        self.server.start()
+        self.host = f"127.0.0.1:{self.server.port}"
+
+    def request(self, method, path, headers=()):
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        connection.request(method, path, headers=dict(headers))
+        response = connection.getresponse()
+        body = json.loads(response.read())
+        connection.close()
+        return response.status, body
+
+    def upgrade(self, path="/ws", headers=()):
+        """Status of the answer to a WebSocket handshake"""
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}", "Upgrade: websocket", "Connection: Upgrade",
+                 "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==", "Sec-WebSocket-Version: 13"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        with socket.create_connection(("127.0.0.1", self.server.port), timeout=5) as connection:
+            connection.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+            return int(connection.recv(4096).split(b" ", 2)[1])
+
+    def test_fire_without_origin(self):
+        self.start()
+        self.assertEqual(self.request("POST", "/events/start/fire"), (202, {"fired": "start"}))
+        self.assertEqual(self.request("POST", "/events/stop/fire")[0], 404)
+        self.assertEqual(self.fired, ["start"])
+
+    def test_fire_from_the_same_origin(self):
+        self.start()
+        status, _ = self.request("POST", "/events/start/fire", {"Origin": f"http://{self.host}"})
+        self.assertEqual(status, 202)
+        self.assertEqual(self.fired, ["start"])
+
+    def test_fire_from_another_origin(self):
+        self.start()
+        for origin in ("http://example.com", f"http://{self.host}.example.com", "null"):
+            with self.assertLogs("alice.control", "WARNING"):
+                status, body = self.request("POST", "/events/start/fire", {"Origin": origin})
+            self.assertEqual(status, 403)
+            self.assertIn("not allowed", body["error"])
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.server.requests_refused, 3)
+        # Reading the state is still allowed
+        self.assertEqual(self.request("GET", "/events", {"Origin": "http://example.com"})[0], 200)
+
+    def test_websocket_origin(self):
+        self.start()
+        self.assertEqual(self.upgrade(headers=[("Origin", f"http://{self.host}")]), 101)
+        with self.assertLogs("alice.control", "WARNING"):
+            self.assertEqual(self.upgrade(headers=[("Origin", "http://example.com")]), 403)
+
+    def test_token(self):
+        self.start(token="secret")
+        with self.assertLogs("alice.control", "WARNING"):
+            self.assertEqual(self.request("POST", "/events/start/fire")[0], 403)
+            self.assertEqual(self.request("POST", "/events/start/fire", {"Authorization": "Bearer wrong"})[0], 403)
+            self.assertEqual(self.upgrade(), 403)
+        self.assertEqual(self.request("POST", "/events/start/fire", {"Authorization": "Bearer secret"})[0], 202)
+        self.assertEqual(self.request("POST", "/events/start/fire?token=secret")[0], 202)
+        self.assertEqual(self.upgrade("/ws?token=secret"), 101)
+        self.assertEqual(self.fired, ["start", "start"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from array import array
+from sensors.filters import MedianFilter, EMAFilter, SampleRateFilter, HysteresisFilter, DwellFilter, build_filters
+
+
+def run(sensor_filter, samples):
+    """
+    Process `samples`, a list of (time, values), and return the values let through by `sensor_filter`,
+    or None for the samples dropped
+    """
+    output = []
+    for now, values in samples:
+        sample = array('d', values)
+        output.append(list(sample) if sensor_filter.process(sample, now) else None)
+    return output
+
+
+def timed(values, interval=.1):
+    """Single-value samples received every `interval` seconds"""
+    return [(index * interval, [value]) for index, value in enumerate(values)]
+
+
+class FilterTest(unittest.TestCase):
+
+    def test_median_odd_window(self):
+        output = run(MedianFilter(1, window=3), timed([10, 100, 12, 11, 0, 13]))
+        self.assertEqual(output, [[10], [55], [12], [12], [11], [11]])
+
+    def test_median_even_window(self):
+        output = run(MedianFilter(1, window=4), timed([10, 20, 30, 40, 0, 0]))
+        self.assertEqual(output, [[10], [15], [20], [25], [25], [15]])
+
+    def test_median_values_separately(self):
+        output = run(MedianFilter(2, window=3), [(0, [1, 30]), (.1, [3, 20]), (.2, [2, 10])])
+        self.assertEqual(output, [[1, 30], [2, 25], [2, 20]])
+
+    def test_median_reset(self):
+        median = MedianFilter(1, window=3)
+        run(median, timed([100, 100, 100]))
+        median.reset()
+        self.assertEqual(run(median, timed([1, 3])), [[1], [2]])
+
+    def test_ema(self):
+        output = run(EMAFilter(1, alpha=.5), timed([10, 20, 20, 0]))
+        self.assertEqual(output, [[10], [15], [17.5], [8.75]])
+        self.assertEqual(run(EMAFilter(1, alpha=1), timed([10, 20])), [[10], [20]])
+
+    def test_rate_limit(self):
+        rate_limit = SampleRateFilter(1, interval=.25)
+        output = run(rate_limit, [(0, [1]), (.1, [2]), (.2, [3]), (.25, [4]), (.3, [5]), (1, [6])])
+        self.assertEqual(output, [[1], None, None, [4], None, [6]])
+
+    def test_hysteresis(self):
+        hysteresis = HysteresisFilter(2, band=2)
+        output = run(hysteresis, [(0, [50, 0]), (.1, [51, 0]), (.2, [48, 0]), (.3, [47, 0]), (.4, [48, 0]),
+                                  (.5, [47, 3])])
+        # Compared with the last sample kept (47), not with the last one received
+        self.assertEqual(output, [[50, 0], None, None, [47, 0], None, [47, 3]])
+
+    def test_dwell(self):
+        dwell = DwellFilter(1, time=.5, band=1)
+        output = run(dwell, [(0, [10]), (.1, [20]), (.3, [11]), (.4, [20]), (.8, [20]), (.9, [21]), (1, [21])])
+        # The change at .1 does not last, the one from .4 lasts .5 seconds
+        self.assertEqual(output, [[10], None, None, None, None, [21], None])
+
+    def test_dwell_without_time(self):
+        self.assertEqual(run(DwellFilter(1, time=0), timed([1, 1, 2])), [[1], None, [2]])
+
+    def test_build_filters(self):
+        filters = build_filters([{"type": "median", "window": 3}, {"type": "rate_limit", "interval": 1}], 3)
+        self.assertEqual([type(sensor_filter) for sensor_filter in filters], [MedianFilter, SampleRateFilter])
+        self.assertEqual(filters[0].window, 3)
+        self.assertEqual(filters[0].nbr_values, 3)
+        self.assertEqual(build_filters([], 1), [])
+
+    def test_build_filters_errors(self):
+        errors = [
+            ([{"type": "kalman"}], "unknown filter type 'kalman' (allowed: median, ema, rate_limit, hysteresis, dwell)"),
+            ([{"window": 3}], "unknown filter type None"),
+            ([{"type": "median", "size": 3}], "invalid parameters for filter 'median'"),
+            ([{"type": "median", "window": 0}], "median window must be at least 1, not 0"),
+            ([{"type": "ema", "alpha": 0}], "ema alpha must be in ]0, 1], not 0"),
+            ([{"type": "ema", "alpha": 1.5}], "ema alpha must be in ]0, 1], not 1.5"),
+            ([{"type": "rate_limit", "interval": -1}], "rate_limit interval must be positive, not -1"),
+            ([{"type": "hysteresis", "band": -1}], "hysteresis band must be positive, not -1"),
+            ([{"type": "dwell", "time": -1}], "dwell time and band must be positive, not -1 and 0.0"),
+        ]
+        for filters_json, message in errors:
+            with self.subTest(filters=filters_json):
+                with self.assertRaises(ValueError) as context:
+                    build_filters(filters_json, 1)
+                self.assertIn(message, str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
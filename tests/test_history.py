@@ -0,0 +1,193 @@
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from sensors.history import SensorHistory, HistoryStore, load_history
+
+
+def sensor(name, variables):
+    return SimpleNamespace(name=name, variables=tuple(variables), history=None)
+
+
+class SensorHistoryTest(unittest.TestCase):
+
+    def test_ring_wrap_around(self):
+        history = SensorHistory(("distance",), capacity=4)
+        for index in range(6):
+            history.record(float(index), [index * 10])
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history.total, 6)
+        times, values = history.window()
+        self.assertEqual(times, [2, 3, 4, 5])
+        self.assertEqual(values, {"distance": [20, 30, 40, 50]})
+
+    def test_stats_window(self):
+        history = SensorHistory(("red", "green"), capacity=8)
+        for index in range(10):
+            history.record(float(index), [index, -index])
+        stats = history.stats(3, now=9.)
+        self.assertEqual(stats["count"], 4)
+        self.assertEqual(stats["red"], {"min": 6, "max": 9, "mean": 7.5})
+        self.assertEqual(stats["green"], {"min": -9, "max": -6, "mean": -7.5})
+        # Only the samples kept: 2 to 9
+        self.assertEqual(history.stats(now=9.)["count"], 8)
+        self.assertEqual(history.stats(100, now=9.)["red"]["min"], 2)
+        self.assertEqual(history.stats(.5, now=20.), {"count": 0, "red": None, "green": None})
+
+    def test_capacity(self):
+        with self.assertRaises(ValueError):
+            SensorHistory(("distance",), capacity=0)
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def files(self, name):
+        return sorted(os.listdir(os.path.join(self.directory.name, name)))
+
+    def test_flush_and_load(self):
+        store = HistoryStore(16, self.directory.name)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(5):
+            distance.history.record(float(index), [index])
+        store.flush()
+        distance.history.record(5., [5])
+        store.flush()
+        self.assertEqual(store.samples_written, 6)
+        self.assertEqual(store.writes, 4)
+        history = load_history(self.directory.name, "d1")
+        self.assertEqual(list(history), ["time", "distance"])
+        self.assertEqual(list(history["distance"]), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(len(history["time"]), 6)
+
+    def test_samples_lost(self):
+        store = HistoryStore(4, self.directory.name)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(10):
+            distance.history.record(float(index), [index])
+        store.flush()
+        self.assertEqual(store.samples_lost, 6)
+        self.assertEqual(list(load_history(self.directory.name, "d1")["distance"]), [6, 7, 8, 9])
+
+    def test_segment_rollover_and_pruning(self):
+        store = HistoryStore(16, self.directory.name, segment_size=3, max_segments=2)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(10):
+            distance.history.record(float(index), [index])
+        store.flush()
+        # Segments 0 to 3 were written, only the last two are kept
+        self.assertEqual(self.files("d1"), [
+            "000002-distance.f64", "000002-time.f64", "000002-variables.json",
+            "000003-distance.f64", "000003-time.f64", "000003-variables.json",
+        ])
+        self.assertEqual(list(load_history(self.directory.name, "d1")["distance"]), [6, 7, 8, 9])
+
+    def test_segment_continued_after_restart(self):
+        store = HistoryStore(16, self.directory.name, segment_size=4)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(3):
+            distance.history.record(float(index), [index])
+        store.flush()
+        # A new store appends to the last segment until it is full
+        store = HistoryStore(16, self.directory.name, segment_size=4)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(3, 5):
+            distance.history.record(float(index), [index])
+        store.flush()
+        self.assertEqual(self.files("d1")[:3], ["000000-distance.f64", "000000-time.f64", "000000-variables.json"])
+        self.assertEqual(os.path.getsize(os.path.join(self.directory.name, "d1", "000000-time.f64")), 4 * 8)
+        self.assertEqual(list(load_history(self.directory.name, "d1")["distance"]), [0, 1, 2, 3, 4])
+
+    def test_new_segment_when_the_variables_change(self):
+        store = HistoryStore(16, self.directory.name)
+        distance = sensor("s1", ("distance",))
+        store.attach(distance)
+        for index in range(3):
+            distance.history.record(float(index), [index])
+        color = sensor("s1", ("red", "green", "blue"))
+        store.attach(color)
+        self.assertIsNot(color.history, distance.history)
+        for index in range(2):
+            color.history.record(float(index), [index, 10 + index, 20 + index])
+        store.flush()
+        self.assertIn("000000-distance.f64", self.files("s1"))
+        self.assertIn("000001-red.f64", self.files("s1"))
+        self.assertNotIn("000001-distance.f64", self.files("s1"))
+        history = load_history(self.directory.name, "s1")
+        self.assertEqual(list(history), ["time", "distance", "red", "green", "blue"])
+        self.assertEqual(len(history["time"]), 5)
+        self.assertEqual(list(history["distance"][:3]), [0, 1, 2])
+        self.assertTrue(all(math.isnan(value) for value in history["distance"][3:]))
+        self.assertTrue(all(math.isnan(value) for value in history["red"][:3]))
+        self.assertEqual(list(history["green"][3:]), [10, 11])
+
+    def test_load_without_numpy(self):
+        store = HistoryStore(16, self.directory.name)
+        distance = sensor("s1", ("distance",))
+        store.attach(distance)
+        distance.history.record(0., [1])
+        movement = sensor("s1", ("movement",))
+        store.attach(movement)
+        movement.history.record(1., [2])
+        store.flush()
+        with mock.patch("sensors.history.numpy", None):
+            history = load_history(self.directory.name, "s1")
+        self.assertEqual(history["distance"][0], 1)
+        self.assertTrue(math.isnan(history["distance"][1]))
+        self.assertTrue(math.isnan(history["movement"][0]))
+        self.assertEqual(history["movement"][1], 2)
+
+    def test_new_segment_when_the_variables_change_after_restart(self):
+        store = HistoryStore(16, self.directory.name)
+        distance = sensor("s1", ("distance",))
+        store.attach(distance)
+        distance.history.record(0., [1])
+        store.flush()
+        store = HistoryStore(16, self.directory.name)
+        movement = sensor("s1", ("movement",))
+        store.attach(movement)
+        movement.history.record(1., [1])
+        store.flush()
+        history = load_history(self.directory.name, "s1")
+        self.assertEqual(list(history["distance"][:1]), [1])
+        self.assertTrue(math.isnan(history["distance"][1]))
+        self.assertTrue(math.isnan(history["movement"][0]))
+        self.assertEqual(list(history["movement"][1:]), [1])
+
+    def test_same_sensor_keeps_its_history(self):
+        store = HistoryStore(16, self.directory.name)
+        first = sensor("d1", ("distance",))
+        store.attach(first)
+        second = sensor("d1", ("distance",))
+        store.attach(second)
+        self.assertIs(second.history, first.history)
+
+    def test_interrupted_flush(self):
+        store = HistoryStore(16, self.directory.name)
+        distance = sensor("d1", ("distance",))
+        store.attach(distance)
+        for index in range(3):
+            distance.history.record(float(index), [index])
+        store.flush()
+        # A column written only partly: the samples missing from a column are ignored
+        with open(os.path.join(self.directory.name, "d1", "000000-time.f64"), "ab") as file:
+            file.write(bytes(8))
+        history = load_history(self.directory.name, "d1")
+        self.assertEqual(len(history["time"]), 3)
+        self.assertEqual(list(history["distance"]), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+from arduinomanager.ArduinosManager import ArduinosManager
+from arduinomanager.SerialReader import SerialReader
+from tests.pty_arduino import FakeArduino, wait_until
+
+
+@mock.patch("arduinomanager.ArduinosManager.HANDSHAKE_DELAY", 0)
+class HotplugTest(unittest.TestCase):
+    """Arduinos on pseudo-terminals plugged, unplugged and replugged while the ports are watched"""
+
+    def setUp(self):
+        self.reader = SerialReader()
+        self.manager = ArduinosManager(reader=self.reader)
+        self.ports = {}
+        self.arduinos = []
+
+    def tearDown(self):
+        self.manager.stop_supervisor()
+        for name in list(self.manager.arduinos):
+            self.manager.remove_arduino(name)
+        self.reader.stop()
+        for arduino in self.arduinos:
+            arduino.close()
+
+    def plug(self, name, identity):
+        arduino = FakeArduino(identity)
+        self.arduinos.append(arduino)
+        self.ports[name] = arduino.port
+        return arduino
+
+    def unplug(self, name, arduino):
+        del self.ports[name]
+        arduino.unplug()
+
+    def start(self, list_ports=None):
+        self.manager.start_supervisor(.02, list_ports=list_ports or (lambda: dict(self.ports)))
+
+    def test_plug_and_unplug(self):
+        self.start()
+        leds = self.plug("ttyACM0", "leds")
+        self.plug("ttyACM1", "sound")
+        self.assertTrue(self.manager.wait_for_identities(["leds", "sound"], timeout=2))
+        self.unplug("ttyACM0", leds)
+        self.assertTrue(wait_until(lambda: "ttyACM0" not in self.manager.arduinos))
+        self.assertEqual(set(self.manager.arduinos_by_identity), {"sound"})
+
+    def test_replugged_board_gets_its_parameters_back(self):
+        self.start()
+        leds = self.plug("ttyACM0", "leds")
+        self.assertTrue(self.manager.wait_for_identities(["leds"], timeout=2))
+        self.manager.send_command("leds", "strip_params", 10)
+        self.assertTrue(wait_until(lambda: leds.commands == ["strip_params 10"]))
+        # Reset: the connection is lost, and the board comes back on another device of the same port
+        self.ports.pop("ttyACM0")
+        leds.unplug()
+        self.assertTrue(wait_until(lambda: "ttyACM0" not in self.manager.arduinos))
+        leds = self.plug("ttyACM0", "leds")
+        self.assertTrue(wait_until(lambda: leds.commands == ["strip_params 10"]))
+        self.assertEqual(self.manager.arduinos["ttyACM0"].port, leds.port)
+
+    def test_replugged_board_gets_the_parameters_of_each_action(self):
+        self.start()
+        leds = self.plug("ttyACM0", "leds")
+        self.assertTrue(self.manager.wait_for_identities(["leds"], timeout=2))
+        # Two actions with the same command, on two strips
+        self.manager.send_command("leds", "strip_params", 1, 10, key="strip_params a1")
+        self.manager.send_command("leds", "strip_params", 2, 20, key="strip_params a2")
+        self.manager.send_command("leds", "strip_params", 1, 11, key="strip_params a1")
+        self.assertTrue(wait_until(lambda: "strip_params 1 11" in leds.commands))
+        self.ports.pop("ttyACM0")
+        leds.unplug()
+        self.assertTrue(wait_until(lambda: "ttyACM0" not in self.manager.arduinos))
+        leds = self.plug("ttyACM0", "leds")
+        self.assertTrue(wait_until(lambda: sorted(leds.commands) == ["strip_params 1 11", "strip_params 2 20"]))
+
+    def test_watcher_survives_errors(self):
+        failures = [RuntimeError("sysfs unavailable")]
+
+        def list_ports():
+            if failures:
+                raise failures.pop()
+            return dict(self.ports)
+
+        with self.assertLogs("alice.arduinos", "ERROR"):
+            self.start(list_ports)
+            self.assertTrue(wait_until(lambda: not failures))
+        self.plug("ttyACM0", "leds")
+        self.assertTrue(self.manager.wait_for_identities(["leds"], timeout=2))
+
+    def test_identified_after_removal(self):
+        arduino = self.plug("ttyACM0", "leds")
+        self.manager.add_arduino("ttyACM0", arduino.port, autoidentify=False)
+        linker = self.manager.arduinos["ttyACM0"]
+        self.manager.remove_arduino("ttyACM0")
+        # Identity read by the reader thread just before the board was removed
+        linker._line_received("identity leds")
+        self.assertEqual(self.manager.arduinos_by_identity, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
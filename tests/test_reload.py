@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from events.events import SensorEvent
+from events.scenario import load_scenario
+from runtime.FileWatcher import FileWatcher
+from Sketch import Sketch
+from tests.pty_arduino import wait_until
+
+
+def scenario():
+    return {
+        "sensors": [{"name": "d1", "type": "distance"}, {"name": "d2", "type": "distance"}],
+        "media_channels": [{"name": "music", "content": []}],
+        "actions": [
+            {"id": "led", "name": "led", "type": "arduino_action", "action": "led",
+             "options": {"red": 255}, "options_order": ["red"]},
+            {"id": "pause", "name": "pause", "type": "sound_action", "action": "pause",
+             "options": {"channel": "music"}},
+        ],
+        "events": [
+            {"id": "start", "name": "start", "delay": 0, "start_actions": ["led"],
+             "start_listening": ["near", "far"]},
+            {"id": "loop", "name": "loop", "delay": 10, "next": "again"},
+            {"id": "again", "name": "again", "delay": 0},
+        ],
+        "sensor_events": [
+            {"id": "near", "name": "near", "delay": 0, "sensor": "d1", "condition": "distance < 50"},
+            {"id": "far", "name": "far", "delay": 0, "sensor": "d2", "condition": "distance > 200"},
+        ],
+        "first_event": "start",
+    }
+
+
+class ReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "sketch.json")
+        self.write(scenario())
+        patches = [mock.patch(f"Sketch.{name}", value) for name, value in
+                   (("HISTORY_SIZE", 0), ("SCENARIO_CACHE", None), ("HOT_RELOAD", 0), ("LEDS_FILE", None))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # Replaying an empty stream: no Arduino is searched for
+        self.sketch = Sketch(self.filename, runtime="thread", media_backend="null", replay=[], coordinator=None,
+                             control=None)
+
+    def tearDown(self):
+        self.sketch.reset()
+        self.sketch.runtime.cancel_all()
+        self.sketch.runtime.scheduler.stop()
+        self.directory.cleanup()
+
+    def write(self, sketch_json):
+        with open(self.filename, "w", encoding="utf-8") as file:
+            json.dump(sketch_json, file)
+
+    def reload(self, sketch_json):
+        self.write(sketch_json)
+        return self.sketch.reload(verbose=False)
+
+    def test_unchanged_objects_are_kept(self):
+        sensors, actions, events = dict(self.sketch.sensors), dict(self.sketch.actions), dict(self.sketch.events)
+        changed = scenario()
+        changed["actions"][0]["options"]["red"] = 0
+        self.assertTrue(self.reload(changed))
+        self.assertIs(self.sketch.sensors["d1"], sensors["d1"])
+        self.assertIs(self.sketch.sensors["d2"], sensors["d2"])
+        self.assertIs(self.sketch.actions["pause"], actions["pause"])
+        self.assertIsNot(self.sketch.actions["led"], actions["led"])
+        self.assertEqual(self.sketch.actions["led"].parameters_list, [0])
+        self.assertIs(self.sketch.events["near"], events["near"])
+        self.assertIs(self.sketch.events["loop"], events["loop"])
+        # The event firing the changed action is kept, and fires the new one
+        self.assertIs(self.sketch.events["start"], events["start"])
+        self.assertEqual(self.sketch.events["start"].start_actions, [self.sketch.actions["led"]])
+
+    def test_changed_condition(self):
+        near = self.sketch.events["near"]
+        changed = scenario()
+        changed["sensor_events"][0]["condition"] = "distance < 10"
+        self.assertTrue(self.reload(changed))
+        self.assertIsNot(self.sketch.events["near"], near)
+        self.assertIsInstance(self.sketch.events["near"], SensorEvent)
+        self.assertIs(self.sketch.events["near"].sensor, self.sketch.sensors["d1"])
+        variables = {"distance": 30}
+        self.assertTrue(near.condition(variables))
+        self.assertFalse(self.sketch.events["near"].condition(variables))
+
+    def test_listening_events_restored(self):
+        self.sketch.events["near"].start_listening()
+        changed = scenario()
+        changed["sensor_events"][0]["condition"] = "distance < 10"
+        self.assertTrue(self.reload(changed))
+        near, far = self.sketch.events["near"], self.sketch.events["far"]
+        self.assertEqual(self.sketch.sensors["d1"].listeners, [near])
+        self.assertNotIn(far, self.sketch.sensors["d2"].listeners)
+
+    def test_pending_next_restored(self):
+        self.sketch.events["loop"].fire()
+        self.assertTrue(self.sketch.events["loop"].is_pending)
+        changed = scenario()
+        changed["events"][1]["delay"] = 20
+        self.assertTrue(self.reload(changed))
+        loop = self.sketch.events["loop"]
+        self.assertTrue(loop.is_pending)
+        # The delay left is kept, not restarted with the new delay
+        remaining = loop.cancel()
+        self.assertEqual(len(remaining), 1)
+        self.assertTrue(9 < remaining[0] <= 10)
+
+    def test_modified_file_read_off_the_runtime(self):
+        threads = []
+
+        def load(json_file, cache_directory=None):
+            threads.append(threading.current_thread().name)
+            return load_scenario(json_file, cache_directory)
+
+        with mock.patch("Sketch.load_scenario", load):
+            self.sketch.start_watching()
+            self.addCleanup(self.sketch.stop_watching)
+            # Let the watcher start watching before the file is saved
+            time.sleep(.1)
+            changed = scenario()
+            changed["actions"][0]["options"]["red"] = 0
+            self.write(changed)
+            self.assertTrue(wait_until(lambda: self.sketch.actions["led"].parameters_list == [0]))
+        self.assertEqual(threads, ["FileWatcherThread"])
+
+    def test_invalid_sketch_keeps_the_current_one(self):
+        graph, events = self.sketch.graph, dict(self.sketch.events)
+        missing_key = scenario()
+        del missing_key["actions"][0]["options_order"]
+        unknown_channel = scenario()
+        unknown_channel["actions"][1]["options"]["channel"] = "voices"
+        missing_sensor_type = scenario()
+        del missing_sensor_type["sensors"][0]["type"]
+        for sketch_json, message in ((missing_key, "'options_order'"), (unknown_channel, "unknown channel 'voices'"),
+                                     (missing_sensor_type, "Missing 'type'")):
+            with self.assertLogs("alice.sketch", "ERROR") as logs:
+                self.assertFalse(self.reload(sketch_json))
+            self.assertIn("not reloaded", logs.output[0])
+            self.assertIn(message, logs.output[0])
+            self.assertIs(self.sketch.graph, graph)
+            self.assertEqual(self.sketch.events, events)
+
+
+class FileWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "sketch.json")
+        with open(self.filename, "w", encoding="utf-8") as file:
+            file.write("{}")
+        self.calls = []
+        self.watcher = FileWatcher(self.filename, lambda: self.calls.append(time.monotonic()), debounce=.2,
+                                   poll_interval=.05)
+        self.watcher.start()
+        # Let the watcher start watching before the file is saved
+        time.sleep(.1)
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.directory.cleanup()
+
+    def save(self, content):
+        """Save the way editors do: write a temporary file, then rename it over the watched one"""
+        temporary = os.path.join(self.directory.name, ".sketch.json.swp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary, self.filename)
+
+    def test_atomic_save_reported_once(self):
+        start = time.monotonic()
+        for index in range(5):
+            self.save(json.dumps({"version": index}))
+            time.sleep(.02)
+        self.assertTrue(wait_until(lambda: self.calls))
+        time.sleep(.5)
+        self.assertEqual(len(self.calls), 1)
+        # Reported once the saves were over for `debounce` seconds
+        self.assertGreaterEqual(self.calls[0] - start, .2)
+
+    def test_other_files_ignored(self):
+        with open(os.path.join(self.directory.name, "other.json"), "w", encoding="utf-8") as file:
+            file.write("{}")
+        time.sleep(.5)
+        self.assertEqual(self.calls, [])
+        self.save("{}")
+        self.assertTrue(wait_until(lambda: len(self.calls) == 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
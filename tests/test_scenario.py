@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+from events.scenario import FrozenDict, compile_scenario, load_scenario
+from tests.test_reload import scenario
+
+
+class ScenarioGraphTest(unittest.TestCase):
+
+    def test_graph_is_frozen(self):
+        graph = compile_scenario(scenario())
+        action = graph.actions[0]
+        self.assertIsInstance(action, FrozenDict)
+        self.assertIsInstance(action["options"], FrozenDict)
+        self.assertEqual(action["options_order"], ("red",))
+        self.assertEqual(graph.media_channels[0]["content"], ())
+        for mutate in (lambda: action.__setitem__("id", "other"), lambda: action["options"].update(red=0),
+                       lambda: action.pop("name"), lambda: graph.event_index.clear()):
+            with self.assertRaises(TypeError):
+                mutate()
+        self.assertEqual(action["options"], {"red": 255})
+
+    def test_graph_equals_its_json(self):
+        sketch_json = scenario()
+        graph = compile_scenario(sketch_json)
+        self.assertEqual(json.loads(json.dumps(graph.actions)), sketch_json["actions"])
+        self.assertEqual(graph.sensors[0], sketch_json["sensors"][0])
+        # The JSON compiled is copied, not referenced
+        sketch_json["actions"][0]["options"]["red"] = 0
+        self.assertEqual(graph.actions[0]["options"]["red"], 255)
+
+    def test_cached_graph_is_frozen(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "sketch.json")
+            with open(filename, "w", encoding="utf-8") as file:
+                json.dump(scenario(), file)
+            cache = os.path.join(directory, "cache")
+            graph = load_scenario(filename, cache)
+            self.assertEqual(len(os.listdir(cache)), 1)
+            cached = load_scenario(filename, cache)
+            self.assertIsNot(cached, graph)
+            self.assertEqual(cached, graph)
+            self.assertIsInstance(cached.actions[0]["options"], FrozenDict)
+            with self.assertRaises(TypeError):
+                cached.actions[0]["options"]["red"] = 0
+
+
+if __name__ == '__main__':
+    unittest.main()
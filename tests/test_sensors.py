@@ -0,0 +1,53 @@
+import sys
+import threading
+import unittest
+from sensors.sensors import DistanceSensor
+
+
+class Listener:
+
+    def __init__(self):
+        self.updates = 0
+
+    def sensor_updated(self, _sensor):
+        self.updates += 1
+
+
+class SensorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        # Switch threads as often as possible to expose lost updates
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def test_concurrent_subscriptions(self):
+        sensor = DistanceSensor("distance")
+        kept = [Listener() for _ in range(2000)]
+        transient = [Listener() for _ in range(200)]
+
+        def subscribe_kept():
+            for listener in kept:
+                sensor.subscribe(listener)
+
+        def subscribe_transient():
+            for _ in range(10):
+                for listener in transient:
+                    sensor.subscribe(listener)
+                    sensor.unsubscribe(listener)
+
+        threads = [threading.Thread(target=subscribe_kept), threading.Thread(target=subscribe_transient)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sensor.listeners, kept)
+        sensor.data_received(["12"])
+        self.assertTrue(all(listener.updates == 1 for listener in kept))
+        self.assertTrue(all(listener.updates == 0 for listener in transient))
+
+
+if __name__ == '__main__':
+    unittest.main()
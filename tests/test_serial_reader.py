@@ -0,0 +1,86 @@
+import unittest
+from arduinomanager.ArduinoLinker import ArduinoLinker
+from arduinomanager.SerialReader import SerialReader
+from tests.pty_arduino import FakeArduino, wait_until
+
+
+class SerialReaderTest(unittest.TestCase):
+    """Several Arduinos on pseudo-terminals read by one SerialReader"""
+
+    def setUp(self):
+        self.reader = SerialReader()
+        self.received = []
+        self.lost = []
+        self.arduinos = {}
+        self.linkers = {}
+        for name in ("ttyA", "ttyB"):
+            arduino = self.arduinos[name] = FakeArduino()
+            linker = self.linkers[name] = ArduinoLinker(arduino.port, name=name)
+            linker.set_data_received_callback(self.data_received)
+            linker.set_connection_lost_callback(self.lost.append)
+            linker.start_listening(reader=self.reader)
+
+    def tearDown(self):
+        self.reader.stop()
+        for linker in self.linkers.values():
+            linker.stop_listening()
+            linker.close()
+        for arduino in self.arduinos.values():
+            arduino.close()
+
+    def data_received(self, name, line):
+        if line == "boom":
+            raise RuntimeError("callback failed")
+        self.received.append((name, line))
+
+    def test_reads_all_boards(self):
+        self.arduinos["ttyA"].send_line("sensor a 1")
+        self.arduinos["ttyB"].send_line("sensor b 2")
+        self.arduinos["ttyA"].send_line("sensor a 3")
+        self.assertTrue(wait_until(lambda: len(self.received) == 3))
+        self.assertEqual([line for name, line in self.received if name == "ttyA"], ["sensor a 1", "sensor a 3"])
+        self.assertIn(("ttyB", "sensor b 2"), self.received)
+
+    def test_callback_error_keeps_reading(self):
+        with self.assertLogs("alice.arduinos", "ERROR") as logs:
+            self.arduinos["ttyA"].send_line("boom")
+            self.assertTrue(wait_until(lambda: logs.records))
+        self.arduinos["ttyA"].send_line("after")
+        self.arduinos["ttyB"].send_line("other")
+        self.assertTrue(wait_until(lambda: len(self.received) == 2))
+        self.assertTrue(self.reader._thread.is_alive())
+
+    def test_callback_error_keeps_the_batch(self):
+        with self.assertLogs("alice.arduinos", "ERROR") as logs:
+            # Read in a single batch
+            self.arduinos["ttyA"].send_bytes(b"boom\nb\nc\n")
+            self.assertTrue(wait_until(lambda: len(self.received) == 2))
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(self.received, [("ttyA", "b"), ("ttyA", "c")])
+        self.assertEqual(self.linkers["ttyA"]._buffer, b"")
+
+    def test_callback_error_in_a_listening_thread(self):
+        arduino = FakeArduino()
+        linker = ArduinoLinker(arduino.port, name="ttyC")
+        linker.set_data_received_callback(self.data_received)
+        linker.start_listening()
+        with self.assertLogs("alice.arduinos", "ERROR"):
+            arduino.send_bytes(b"boom\nb\n")
+            self.assertTrue(wait_until(lambda: self.received == [("ttyC", "b")]))
+        arduino.send_line("c")
+        self.assertTrue(wait_until(lambda: self.received == [("ttyC", "b"), ("ttyC", "c")]))
+        self.assertTrue(linker._listening_thread.is_alive())
+        linker.stop_listening()
+        linker.close()
+        arduino.close()
+
+    def test_unplugged_board(self):
+        self.arduinos["ttyA"].unplug()
+        self.assertTrue(wait_until(lambda: self.lost == ["ttyA"]))
+        self.assertEqual(self.reader.linkers, [self.linkers["ttyB"]])
+        self.arduinos["ttyB"].send_line("still there")
+        self.assertTrue(wait_until(lambda: self.received == [("ttyB", "still there")]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+from control.snapshot import take_snapshot
+from events.events import Event
+from tests.pty_arduino import wait_until
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def test_snapshots_while_events_fire(self):
+        fired = []
+        first = Event({"id": "first", "name": "first", "delay": .001})
+        first.next = lambda: fired.append(True)
+        sketch = SimpleNamespace(
+            events={"first": first}, sensors={}, arduinos_manager=SimpleNamespace(arduinos={}),
+            mediamanager=SimpleNamespace(players={}), runtime=None, cluster=None, leds=None, history=None)
+        stop = threading.Event()
+        errors = []
+
+        def snapshots():
+            while not stop.is_set():
+                try:
+                    take_snapshot(sketch)
+                except Exception as error:  # pylint: disable=broad-except
+                    errors.append(error)
+                    return
+
+        thread = threading.Thread(target=snapshots)
+        thread.start()
+        for _ in range(2000):
+            first.fire()
+        self.assertTrue(wait_until(lambda: len(fired) == 2000))
+        stop.set()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(take_snapshot(sketch)["events"]["first"]["pending"])
+        first.schedule_next(10)
+        self.assertTrue(take_snapshot(sketch)["events"]["first"]["pending"])
+        self.assertEqual(len(first.cancel()), 1)
+        self.assertFalse(first.is_pending)
+
+
+if __name__ == '__main__':
+    unittest.main()